@@ -0,0 +1,260 @@
+'''
+######
+
+This file provides a Dynamic Window Approach local planner, an alternative to the heading control of the VFH.
+
+Instead of reducing the map to a Polar Histogram, it samples (turn rate, speed) pairs reachable from the current ones
+within the acceleration limits, the dynamic window, rolls each of them out as a circular arc over a short horizon and
+scores them against the full map of the Histogram Grid for clearance, progress towards the goal and speed. Every sample
+is evaluated at once, as a single NumPy batch.
+
+Time is counted in decisions: speeds are in cells per decision, turn rates in deg per decision, and accelerations in
+those per decision. The planner keeps the last command it returned as the current velocity, unless *setVelocity* is fed
+the measured one.
+
+Headings share the frame of *HeadingControl*: 0 deg points along the map rows and -90 deg along the map columns, so
+both engines can be swapped on the *ObstacleAvoidanceWrapper*.
+'''
+
+import numpy as np
+from backend.algorithms.VFH import HistogramGrid
+
+
+class DynamicWindowControl:
+	def __init__(self,
+	             histogrid: HistogramGrid,
+	             threshold: float = 0,
+	             headingStep: int = 5,
+	             maxTurn: int = 45,
+	             acceleration: int = 2,
+	             turnAcceleration: int = 30,
+	             horizon: float = 2.0,
+	             lookahead: int = 20,
+	             headingWeight: float = 1.0,
+	             clearanceWeight: float = 1.0,
+	             speedWeight: float = 0.5
+	             ):
+		'''
+		Constructor method for the Dynamic Window Approach planner.
+
+		:param histogrid: The HistogramGrid whose full map is checked for obstacles.
+		:type histogrid: HistogramGrid
+		:param threshold: Map values over it are taken as obstacles. Defaults to 0, as positive values stand for occupancy.
+		:type threshold: float
+		:param headingStep: Angular distance, in deg per decision, between sampled turn rates. Defaults to 5.
+		:type headingStep: int
+		:param maxTurn: Highest turn rate, in deg per decision. Defaults to 45.
+		:type maxTurn: int
+		:param acceleration: Largest change of speed between decisions. Defaults to 2.
+		:type acceleration: int
+		:param turnAcceleration: Largest change of turn rate, in deg per decision, between decisions. Defaults to 30.
+		:type turnAcceleration: int
+		:param horizon: Length of the rollouts, in decisions. Defaults to 2.
+		:type horizon: float
+		:param lookahead: Distance, in cells, the clearance is measured up to. Defaults to 20.
+		:type lookahead: int
+		:param headingWeight: Weight of the progress towards the goal on the score. Defaults to 1.
+		:type headingWeight: float
+		:param clearanceWeight: Weight of the clearance on the score. Defaults to 1.
+		:type clearanceWeight: float
+		:param speedWeight: Weight of the speed on the score. Defaults to 0.5.
+		:type speedWeight: float
+		'''
+
+		self._histogrid = histogrid
+		self._threshold = threshold
+		self._headingStep = headingStep
+		self._maxTurn = maxTurn
+		self._acceleration = acceleration
+		self._turnAcceleration = turnAcceleration
+		self._horizon = horizon
+		self._lookahead = lookahead
+		self._weights = np.array([headingWeight, clearanceWeight, speedWeight])
+		self._steps = np.arange(1, lookahead + 1)
+		self._speed = 0
+		self._turnRate = 0
+
+	def getHistogrid(self) -> HistogramGrid:
+		return self._histogrid
+
+	def getVelocity(self) -> (int, int):
+		return self._speed, self._turnRate
+
+	def setVelocity(self, speed: int, turnRate: int):
+		'''
+		Sets the current velocity, the dynamic window of the next decision is centered at.
+
+		:param speed: The speed, in cells per decision.
+		:type speed: int
+		:param turnRate: The turn rate, in deg per decision.
+		:type turnRate: int
+		'''
+
+		self._speed = speed
+		self._turnRate = turnRate
+
+	def computeWindow(self, Vmax: int = 8) -> (np.ndarray, np.ndarray):
+		'''
+		Samples the turn rates and speeds reachable from the current ones within a decision, the dynamic window.
+
+		:param Vmax: the maximum speed for the agent.
+		:type Vmax: int
+		:return: The turn rates, in deg per decision, and the speeds, in cells per decision.
+		'''
+
+		low = max(self._turnRate - self._turnAcceleration, -self._maxTurn)
+		high = min(self._turnRate + self._turnAcceleration, self._maxTurn)
+		turns = np.arange(
+			np.ceil(low / self._headingStep) * self._headingStep, high + 1, self._headingStep
+		)
+		speeds = np.arange(max(self._speed - self._acceleration, 0), min(self._speed + self._acceleration, Vmax) + 1)
+		return turns, speeds
+
+	def computeRollouts(self, droneHeading: int, turns: np.ndarray, speeds: np.ndarray,
+	                    location: np.ndarray) -> np.ndarray:
+		'''
+		Rolls every (turn rate, speed) sample out as a circular arc over the horizon, one point per cell travelled, and
+		straight along the heading it ends with up to the lookahead, so slow tight turns don't circle back in place. The
+		heading turns by *turn / speed* deg per cell, taken at the middle of every cell.
+
+		:param droneHeading: the heading of the drone.
+		:type droneHeading: int
+		:param turns: The turn rates, in deg per decision.
+		:type turns: np.ndarray
+		:param speeds: The speeds, every one of them above 0.
+		:type speeds: np.ndarray
+		:param location: the position of the drone on the full map.
+		:type location: np.ndarray
+		:return: A (turns * speeds * lookahead * 2) matrix of points.
+		'''
+
+		curvature = turns[:, None] / speeds[None, :]
+		travelled = np.minimum(self._steps - 0.5, (speeds * self._horizon)[:, None])
+		headings = droneHeading + curvature[..., None] * travelled[None, :, :]
+		radians = np.deg2rad(headings)
+		directions = np.stack([np.cos(radians), -np.sin(radians)], axis=-1)
+		return location + np.cumsum(directions, axis=-2)
+
+	def computeArcClearance(self, points: np.ndarray) -> np.ndarray:
+		'''
+		Finds the distance travelled along every rollout before the first obstacle, or the map border.
+
+		:param points: The points of the rollouts, as given by *computeRollouts*.
+		:type points: np.ndarray
+		:return: The amount of free cells along each rollout, up to the lookahead.
+		'''
+
+		full_map = self._histogrid.getFullMap()
+		points = np.round(points).astype(np.int64)
+		inside = np.all((points >= 0) & (points < np.array(full_map.shape)), axis=-1)
+		rows = np.where(inside, points[..., 0], 0)
+		cols = np.where(inside, points[..., 1], 0)
+		blocked = np.logical_not(inside) | (full_map[rows, cols] > self._threshold)
+
+		first_hit = np.where(blocked.any(axis=-1), blocked.argmax(axis=-1), self._lookahead)
+		return first_hit.astype(float)
+
+	def computeClearance(self, headings: np.ndarray, location: np.ndarray) -> np.ndarray:
+		'''
+		Marches along every heading and finds the distance to the first obstacle, or the map border.
+
+		:param headings: The absolute headings, in deg.
+		:type headings: np.ndarray
+		:param location: the position of the drone on the full map.
+		:type location: np.ndarray
+		:return: The amount of free cells along each heading, up to the lookahead.
+		'''
+
+		radians = np.deg2rad(headings)
+		directions = np.stack([np.cos(radians), -np.sin(radians)], axis=-1)
+		return self.computeArcClearance(location + directions[:, None, :] * self._steps[None, :, None])
+
+	def computeMisalignment(self, headings: np.ndarray, target: np.ndarray, location: np.ndarray) -> np.ndarray:
+		'''
+		Computes the angular distance between every heading and the direction to the target.
+
+		:param headings: The absolute headings, in deg.
+		:type headings: np.ndarray
+		:param target: the position of the target on the full map.
+		:type target: np.ndarray
+		:param location: the position of the drone on the full map.
+		:type location: np.ndarray
+		:return: The angular distances, in [0, 180] deg.
+		'''
+
+		direction = target - location
+		goal_heading = np.rad2deg(np.arctan2(direction[0], direction[1])) - 90
+		return np.abs((headings - goal_heading + 180) % 360 - 180)
+
+	def computeScores(self, droneHeading: int, turns: np.ndarray, speeds: np.ndarray, target: np.ndarray,
+	                  location: np.ndarray, Vmax: int = 8) -> np.ndarray:
+		'''
+		Scores every (turn rate, speed) sample, by the heading reached after a decision, the clearance of its rollout and
+		its speed.
+		Samples whose rollout would run into an obstacle before the end of the horizon are not admissible and score
+		-inf. Rollouts longer than the lookahead are only checked up to it.
+
+		:param droneHeading: the heading of the drone.
+		:type droneHeading: int
+		:param turns: The turn rates, in deg per decision.
+		:type turns: np.ndarray
+		:param speeds: The speeds, every one of them above 0.
+		:type speeds: np.ndarray
+		:param target: the position of the target on the full map.
+		:type target: np.ndarray
+		:param location: the position of the drone on the full map.
+		:type location: np.ndarray
+		:param Vmax: the maximum speed for the agent.
+		:type Vmax: int
+		:return: A (turns * speeds) matrix of scores.
+		'''
+
+		misalignment = self.computeMisalignment(droneHeading + turns, target, location)
+		clearance = self.computeArcClearance(self.computeRollouts(droneHeading, turns, speeds, location))
+		terms = np.broadcast_arrays(
+			(1 - misalignment / 180)[:, None],
+			clearance / self._lookahead,
+			(speeds / max(Vmax, 1))[None, :]
+		)
+		scores = np.tensordot(self._weights, np.stack(terms), axes=1)
+
+		admissible = clearance >= np.minimum(speeds * self._horizon, self._lookahead)[None, :]
+		return np.where(admissible, scores, -np.inf)
+
+	def computeHeading(self, droneHeading: int, target: np.ndarray, location: np.ndarray, hm: int = 8,
+	                   Vmax: int = 8) -> (int, int):
+		'''
+		Computes the new heading the robot should take to avoid collision, as *HeadingControl.computeHeading* does.
+		If no sample of the dynamic window is admissible, the agent stops and turns, within the window, towards the
+		clearest heading, the one closest to the target among the equally clear ones.
+
+		:param droneHeading: the heading of the drone.
+		:type droneHeading: int
+		:param target: the position of the target on the full map.
+		:type target: np.ndarray
+		:param location: the position of the drone on the full map.
+		:type location: np.ndarray
+		:param hm: Unused, kept for compatibility with *HeadingControl*.
+		:type hm: int
+		:param Vmax: the maximum speed for the agent.
+		:type Vmax: int
+		:return: The new heading, relative to the current one, this decision's turn, and the speed
+		'''
+
+		turns, speeds = self.computeWindow(Vmax)
+		moving = speeds[speeds > 0]
+		scores = self.computeScores(droneHeading, turns, moving, target, location, Vmax) \
+			if moving.size else np.empty((turns.shape[0], 0))
+
+		if np.isfinite(scores).any():
+			t, v = np.unravel_index(np.argmax(scores), scores.shape)
+			turn, speed = turns[t], moving[v]
+		else:
+			headings = droneHeading + turns
+			turn = turns[np.lexsort((
+				self.computeMisalignment(headings, target, location), -self.computeClearance(headings, location)
+			))[0]]
+			speed = 0
+
+		self.setVelocity(int(speed), int(round(turn)))
+		return int(round(turn)), int(speed)
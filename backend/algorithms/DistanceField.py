@@ -0,0 +1,160 @@
+'''
+######
+
+This file provides an unsigned, truncated, Euclidean distance field over the full map of a Histogram Grid, so the
+distance from any cell to the nearest obstacle can be looked up instead of scanning the map. Obstacle cells are at 0.
+
+The field is built once with a distance transform and, from then on, only recomputed around the regions of the full
+map the Histogram Grid wrote. Distances are truncated at a maximum one, so a change on a cell can only reach that far,
+and every update stays local and exact.
+'''
+
+from typing import Tuple
+import numpy as np
+from scipy import ndimage
+from backend.algorithms.VFH import HistogramGrid
+
+
+class DistanceField:
+	def __init__(self, histogrid: HistogramGrid, threshold: float = 0, maxDistance: float = 20):
+		'''
+		Constructor method for the distance field.
+
+		:param histogrid: The HistogramGrid whose full map the field is computed over.
+		:type histogrid: HistogramGrid
+		:param threshold: Map values over it are taken as obstacles. Defaults to 0, as positive values stand for occupancy.
+		:type threshold: float
+		:param maxDistance: Distance, in cells, the field is truncated at. Defaults to 20.
+		:type maxDistance: float
+		'''
+
+		self._histogrid = histogrid
+		self._threshold = threshold
+		self._maxDistance = float(maxDistance)
+		self._margin = int(np.ceil(maxDistance))
+		self._occupied = None
+		self._distances = None
+		self._updates = 0
+		self._dirtyBounds = None
+		self.build()
+		histogrid.addMapListener(self.markDirtyRegion)
+
+	def getMaxDistance(self) -> float:
+		return self._maxDistance
+
+	def getUpdates(self) -> int:
+		return self._updates
+
+	def computeDistances(self, occupied: np.ndarray) -> np.ndarray:
+		'''
+		Computes the truncated distance from every cell to the nearest occupied one.
+
+		:param occupied: The occupied cells.
+		:type occupied: np.ndarray
+		:return: The distances, in cells.
+		'''
+
+		if not occupied.any():
+			return np.full(occupied.shape, self._maxDistance, dtype=np.float32)
+		distances = ndimage.distance_transform_edt(np.logical_not(occupied))
+		return np.minimum(distances, self._maxDistance).astype(np.float32)
+
+	def build(self):
+		'''
+		Computes the whole field from the full map, discarding any pending dirty region.
+		'''
+
+		full_map = self._histogrid.getFullMap()
+		self._occupied = full_map[:, :] > self._threshold
+		self._distances = self.computeDistances(self._occupied)
+		self._dirtyBounds = None
+
+	def markDirtyRegion(self, begin: np.ndarray, end: np.ndarray):
+		'''
+		Records a region of the full map was written, growing the bounding box of every region pending an update.
+
+		:param begin: Begin point of the region on the full map.
+		:type begin: np.ndarray
+		:param end: End point of the region on the full map.
+		:type end: np.ndarray
+		'''
+
+		if self._dirtyBounds is None:
+			self._dirtyBounds = (np.array(begin), np.array(end))
+		else:
+			self._dirtyBounds = (np.minimum(self._dirtyBounds[0], begin), np.maximum(self._dirtyBounds[1], end))
+
+	def update(self) -> bool:
+		'''
+		Brings the field up to date with the regions the Histogram Grid wrote since the last update. Only the area
+		within the maximum distance of the cells that changed is recomputed.
+
+		:return: Whether the field changed.
+		'''
+
+		if self._dirtyBounds is None:
+			return False
+
+		(begin, end), self._dirtyBounds = self._dirtyBounds, None
+		occupied = self._histogrid.getFullMap()[begin[0]:end[0], begin[1]:end[1]] > self._threshold
+		changed = np.argwhere(occupied != self._occupied[begin[0]:end[0], begin[1]:end[1]])
+		if changed.size == 0:
+			return False
+		self._occupied[begin[0]:end[0], begin[1]:end[1]] = occupied
+
+		# Cells farther than the margin from a change keep their distance. Those within it need every obstacle
+		#  within the margin of them, so the transform runs over twice the margin
+		shape = np.array(self._occupied.shape)
+		changed_begin, changed_end = begin + changed.min(axis=0), begin + changed.max(axis=0) + 1
+		inner_begin = np.maximum(changed_begin - self._margin, 0)
+		inner_end = np.minimum(changed_end + self._margin, shape)
+		outer_begin = np.maximum(inner_begin - self._margin, 0)
+		outer_end = np.minimum(inner_end + self._margin, shape)
+
+		distances = self.computeDistances(self._occupied[outer_begin[0]:outer_end[0], outer_begin[1]:outer_end[1]])
+		inner = inner_begin - outer_begin
+		self._distances[inner_begin[0]:inner_end[0], inner_begin[1]:inner_end[1]] = \
+			distances[inner[0]:inner[0] + inner_end[0] - inner_begin[0], inner[1]:inner[1] + inner_end[1] - inner_begin[1]]
+		self._updates += 1
+		return True
+
+	def getDistances(self) -> np.ndarray:
+		'''
+		Returns the whole, up to date, field.
+
+		:return: The distances, in cells.
+		'''
+
+		self.update()
+		return self._distances
+
+	def getClearance(self, rows, cols) -> np.ndarray:
+		'''
+		Looks up the distance to the nearest obstacle from a cell, or a batch of them.
+
+		:param rows: The rows of the cells.
+		:param cols: The columns of the cells.
+		:return: The distances, in cells, truncated at the maximum distance.
+		'''
+
+		self.update()
+		return self._distances[rows, cols]
+
+	def getGradient(self, rows, cols) -> Tuple:
+		'''
+		Computes the gradient of the field on a batch of cells, through central differences, or one-sided ones at the
+		map borders. It points away from the nearest obstacle.
+
+		:param rows: The rows of the cells.
+		:param cols: The columns of the cells.
+		:return: The gradient along the rows and along the columns.
+		'''
+
+		self.update()
+		rows, cols = np.asarray(rows), np.asarray(cols)
+		last_row, last_col = self._distances.shape[0] - 1, self._distances.shape[1] - 1
+		up, down = np.maximum(rows - 1, 0), np.minimum(rows + 1, last_row)
+		left, right = np.maximum(cols - 1, 0), np.minimum(cols + 1, last_col)
+		gradient_rows = (self._distances[down, cols] - self._distances[up, cols]) / np.maximum(down - up, 1)
+		gradient_cols = (self._distances[rows, right] - self._distances[rows, left]) / np.maximum(right - left, 1)
+		return gradient_rows, gradient_cols
@@ -0,0 +1,170 @@
+'''
+######
+
+This file provides the frontiers of the full map of a Histogram Grid, the known free cells next to unknown ones, so an
+agent can explore the area by heading to them.
+
+The map holds occupancy as positive values and emptiness as negative ones, so cells never sensed stay at 0. Frontier
+cells are kept as a boolean map, updated only around the regions the Histogram Grid writes, and counted on square
+blocks. Frontiers are clustered as the connected groups of blocks holding frontier cells, which keeps clustering cheap
+no matter the size of the map.
+'''
+
+from typing import List
+import numpy as np
+from scipy import ndimage
+from backend.algorithms.VFH import HistogramGrid
+
+
+class FrontierMap:
+	def __init__(self, histogrid: HistogramGrid, freeThreshold: float = 0, blockSize: int = 16, minSize: int = 3):
+		'''
+		Constructor method for the frontier map.
+
+		:param histogrid: The HistogramGrid whose full map the frontiers are found on.
+		:type histogrid: HistogramGrid
+		:param freeThreshold: Map values under its negative are taken as free. Defaults to 0.
+		:type freeThreshold: float
+		:param blockSize: Side length, in cells, of the blocks frontiers are clustered by. Defaults to 16.
+		:type blockSize: int
+		:param minSize: Amount of frontier cells a cluster needs to be taken as a target. Defaults to 3.
+		:type minSize: int
+		'''
+
+		self._histogrid = histogrid
+		self._freeThreshold = freeThreshold
+		self._blockSize = blockSize
+		self._minSize = minSize
+		self._shape = np.array(histogrid.getFullMap().shape)
+		blocks = tuple(-(-self._shape // blockSize))
+		self._counts = np.zeros(blocks, dtype=np.int64)
+		self._rowSums = np.zeros(blocks, dtype=np.int64)
+		self._colSums = np.zeros(blocks, dtype=np.int64)
+		self._frontier = np.zeros(tuple(self._shape), dtype=bool)
+		self._dirtyBounds = (np.array([0, 0]), self._shape.copy())
+		histogrid.addMapListener(self.markDirtyRegion)
+		self.update()
+
+	def getFrontier(self) -> np.ndarray:
+		'''
+		Returns the, up to date, frontier cells.
+
+		:return: A boolean map of the frontier cells.
+		'''
+
+		self.update()
+		return self._frontier
+
+	def markDirtyRegion(self, begin: np.ndarray, end: np.ndarray):
+		'''
+		Records a region of the full map was written, growing the bounding box of every region pending an update.
+
+		:param begin: Begin point of the region on the full map.
+		:type begin: np.ndarray
+		:param end: End point of the region on the full map.
+		:type end: np.ndarray
+		'''
+
+		if self._dirtyBounds is None:
+			self._dirtyBounds = (np.array(begin), np.array(end))
+		else:
+			self._dirtyBounds = (np.minimum(self._dirtyBounds[0], begin), np.maximum(self._dirtyBounds[1], end))
+
+	def computeFrontier(self, values: np.ndarray) -> np.ndarray:
+		'''
+		Finds the free cells with an unknown cell among their 8 neighbours.
+
+		:param values: A region of the full map. Cells off the map are NaN, neither free nor unknown.
+		:type values: np.ndarray
+		:return: The frontier cells of the region, its outermost ring excluded.
+		'''
+
+		free = values < -self._freeThreshold
+		unknown = values == 0
+		near_unknown = ndimage.binary_dilation(unknown, structure=np.ones((3, 3), dtype=bool))
+		return (free & near_unknown)[1:-1, 1:-1]
+
+	def update(self) -> int:
+		'''
+		Brings the frontiers up to date with the regions the Histogram Grid wrote since the last update. Only the cells
+		within the regions, and their neighbours, are checked again.
+
+		:return: The amount of cells that joined or left the frontier.
+		'''
+
+		if self._dirtyBounds is None:
+			return 0
+
+		(begin, end), self._dirtyBounds = self._dirtyBounds, None
+		begin = np.maximum(begin - 1, 0)
+		end = np.minimum(end + 1, self._shape)
+		# One more ring of context around the checked cells, padded with NaN off the map
+		outer_begin, outer_end = begin - 1, end + 1
+		values = np.full(tuple(outer_end - outer_begin), np.nan)
+		source_begin, source_end = np.maximum(outer_begin, 0), np.minimum(outer_end, self._shape)
+		values[
+			source_begin[0] - outer_begin[0]:source_end[0] - outer_begin[0],
+			source_begin[1] - outer_begin[1]:source_end[1] - outer_begin[1]
+		] = self._histogrid.getFullMap()[source_begin[0]:source_end[0], source_begin[1]:source_end[1]]
+
+		frontier = self.computeFrontier(values)
+		old = self._frontier[begin[0]:end[0], begin[1]:end[1]]
+		changed = np.argwhere(frontier != old)
+		if changed.size == 0:
+			return 0
+
+		signs = np.where(frontier[changed[:, 0], changed[:, 1]], 1, -1)
+		rows, cols = changed[:, 0] + begin[0], changed[:, 1] + begin[1]
+		blocks = (rows // self._blockSize, cols // self._blockSize)
+		np.add.at(self._counts, blocks, signs)
+		np.add.at(self._rowSums, blocks, signs * rows)
+		np.add.at(self._colSums, blocks, signs * cols)
+		self._frontier[begin[0]:end[0], begin[1]:end[1]] = frontier
+		return len(changed)
+
+	def computeClusters(self) -> List[tuple]:
+		'''
+		Clusters the frontier cells by the connected groups of blocks holding them.
+
+		:return: A list of (size, centroid, target) per cluster, where the target is the frontier cell of the cluster
+		 closest to its centroid.
+		'''
+
+		self.update()
+		labels, amount = ndimage.label(self._counts > 0, structure=np.ones((3, 3), dtype=bool))
+		if amount == 0:
+			return []
+		ids = np.arange(1, amount + 1)
+		sizes = ndimage.sum(self._counts, labels, ids)
+		centroids = np.stack([
+			ndimage.sum(self._rowSums, labels, ids), ndimage.sum(self._colSums, labels, ids)
+		], axis=1) / sizes[:, None]
+
+		boxes = ndimage.find_objects(labels)
+		clusters = []
+		for label, size, centroid in zip(ids, sizes, centroids):
+			if size < self._minSize:
+				continue
+			block_rows, block_cols = boxes[label - 1]
+			begin = np.array([block_rows.start, block_cols.start]) * self._blockSize
+			end = np.minimum(np.array([block_rows.stop, block_cols.stop]) * self._blockSize, self._shape)
+			cells = np.argwhere(self._frontier[begin[0]:end[0], begin[1]:end[1]]) + begin
+			cells = cells[labels[cells[:, 0] // self._blockSize, cells[:, 1] // self._blockSize] == label]
+			target = cells[np.argmin(np.sum((cells - centroid) ** 2, axis=1))]
+			clusters.append((int(size), centroid, target))
+		return clusters
+
+	def getBestFrontier(self, location: np.ndarray) -> np.ndarray:
+		'''
+		Picks the frontier to explore next, the one with the most frontier cells per unit of distance to the agent.
+
+		:param location: the position of the agent on the full map.
+		:type location: np.ndarray
+		:return: The target cell of the best frontier, or None if there are no frontiers left.
+		'''
+
+		clusters = self.computeClusters()
+		if not clusters:
+			return None
+		utilities = [size / (1.0 + np.linalg.norm(target - location)) for size, _, target in clusters]
+		return clusters[int(np.argmax(utilities))][2]
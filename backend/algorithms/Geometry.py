@@ -125,6 +125,101 @@ def segIntersections(rays_o: np.ndarray, rays_d: np.ndarray, obstacles: np.ndarr
 	return np.array(intersections)
 
 
+def rayNearestHits(rays_o: np.ndarray, rays_d: np.ndarray, obstacles: np.ndarray, chunk_size: int = None) -> np.ndarray:
+	'''
+	Computes, for every ray, the distance from its origin to the closest obstacle segment it hits.
+	All the rays are tested against all the segments at once, as parametric segments: being a ray A + t·(B - A) and an
+	obstacle C + u·(D - C), they hit where both t and u lay in [0, 1], found through cross products.
+
+	:param rays_o: Origin of the rays, one per particle.
+	:type rays_o: np.ndarray
+	:param rays_d: Destination of the rays, as given by *getRays*.
+	:type rays_d: np.ndarray
+	:param obstacles: Obstacle segments, as init points and end points.
+	:type obstacles: np.ndarray
+	:param chunk_size: Amount of particles to process at once, to bound the memory used. Defaults to all of them.
+	:type chunk_size: int
+	:return: A (particles * rays) matrix of distances. Rays hitting nothing read their whole length, as a sensor reads
+	 its maximum range.
+	:rtype: np.ndarray
+	'''
+
+	rays_o = np.asarray(rays_o, dtype=float)
+	rays_d = np.asarray(rays_d, dtype=float)
+	b1, b2 = np.asarray(obstacles, dtype=float)
+	db = b2 - b1
+	chunk_size = chunk_size or rays_o.shape[0]
+
+	distances = np.empty(rays_d.shape[:2])
+	for begin in range(0, rays_o.shape[0], chunk_size):
+		a1 = rays_o[begin:begin + chunk_size, np.newaxis, np.newaxis, :]
+		da = rays_d[begin:begin + chunk_size, :, np.newaxis, :] - a1
+		dp = b1 - a1
+		denom = da[..., 0] * db[:, 1] - da[..., 1] * db[:, 0]
+		with np.errstate(divide='ignore', invalid='ignore'):
+			t = (dp[..., 0] * db[:, 1] - dp[..., 1] * db[:, 0]) / denom
+			u = (dp[..., 0] * da[..., 1] - dp[..., 1] * da[..., 0]) / denom
+		hits = (denom != 0) & (t >= 0) & (t <= 1) & (u >= 0) & (u <= 1)
+		t = np.where(hits, t, 1).min(axis=2)
+		distances[begin:begin + chunk_size] = t * np.linalg.norm(da[:, :, 0, :], axis=2)
+
+	return distances
+
+
+def marchRays(grid_map: np.ndarray, origins: np.ndarray, angles: np.ndarray, max_range: float,
+              threshold: float = 0) -> np.ndarray:
+	'''
+	Casts rays through the cells of a grid map, all at once, with the Amanatides & Woo DDA: every step moves each ray to
+	the next cell it crosses, through the closest cell border along the rows or the columns.
+	Cells are centered at integer coordinates, and a ray leaving the map stops at its border.
+
+	:param grid_map: The map. Cells over *threshold* are occupied.
+	:type grid_map: np.ndarray
+	:param origins: The origin of each ray, as (row, column).
+	:type origins: np.ndarray
+	:param angles: The angle of each ray, in rad, 0 pointing along the rows.
+	:type angles: np.ndarray
+	:param max_range: Distance, in cells, a ray stops at if it hits nothing.
+	:type max_range: float
+	:param threshold: Value over which a cell is occupied. Defaults to 0.
+	:type threshold: float
+	:return: The distance from each origin to the border of the first occupied cell, capped at *max_range*.
+	:rtype: np.ndarray
+	'''
+
+	origins = np.asarray(origins, dtype=float).reshape(-1, 2) + 0.5
+	directions = np.stack([np.cos(angles), np.sin(angles)], axis=-1).reshape(-1, 2)
+	cells = np.floor(origins).astype(np.int64)
+	steps = np.where(directions < 0, -1, 1)
+	with np.errstate(divide='ignore'):
+		deltas = np.abs(1.0 / directions)
+		borders = np.where(directions < 0, cells - origins, cells + 1 - origins) / directions
+	borders[directions == 0] = np.inf
+
+	ranges = np.full(origins.shape[0], float(max_range))
+	entries = np.zeros(origins.shape[0])
+	active = np.arange(origins.shape[0])
+	shape = np.array(grid_map.shape)
+	while active.size:
+		rows, cols = cells[active, 0], cells[active, 1]
+		outside = (rows < 0) | (rows >= shape[0]) | (cols < 0) | (cols >= shape[1])
+		hit = outside.copy()
+		inside = ~outside
+		hit[inside] = grid_map[rows[inside], cols[inside]] > threshold
+		ranges[active[hit]] = np.minimum(entries[active[hit]], max_range)
+		active = active[~hit]
+
+		# Crossing into the next cell, along the axis whose border is the closest
+		axis = (borders[active, 1] < borders[active, 0]).astype(np.int64)
+		entries[active] = borders[active, axis]
+		active = active[entries[active] < max_range]
+		axis = (borders[active, 1] < borders[active, 0]).astype(np.int64)
+		cells[active, axis] += steps[active, axis]
+		borders[active, axis] += deltas[active, axis]
+
+	return ranges
+
+
 if __name__ == '__main__':
 
 	obstacles = np.array([
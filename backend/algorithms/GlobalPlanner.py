@@ -0,0 +1,360 @@
+'''
+######
+
+This file provides a global planner for the full map of a Histogram Grid, so the local steering of the VFH can be fed
+with intermediate waypoints instead of a far away goal it may never reach around a dead end.
+
+It implements D* Lite (Koenig & Likhachev, 2002) over the 8-connected grid of cells. The search runs backwards, from the
+goal to the agent, so when the agent moves or some cells change only the part of the search they affect is repaired,
+instead of planning again from scratch.
+
+Cells are kept as flat indexes on the map surrounded by a ring of obstacle cells, so neighbours are just fixed offsets
+away and never need to be checked against the map borders. Expansions follow the optimized D* Lite of the same paper: a
+cell whose cost drops only lowers the cost of its neighbours, and only the neighbours that got their cost through a cell
+whose cost rises are computed again from their own neighbours. Costs are integers, in units of 1 / COST_SCALE cells, so
+ties between keys are exact and the repairs never stop short on a rounding error.
+'''
+
+from typing import List
+import heapq
+import math
+import numpy as np
+from backend.algorithms.VFH import HistogramGrid
+
+INF = float('inf')
+# Cost of a straight move, and of a diagonal one
+COST_SCALE = 10000
+DIAGONAL_COST = int(round(COST_SCALE * math.sqrt(2)))
+
+
+class DStarLite:
+
+	def __init__(self, histogrid: HistogramGrid, goal: np.ndarray, start: np.ndarray, threshold: float = 0,
+	             maxExpansions: int = None):
+		'''
+		Constructor method for the D* Lite planner. The first plan, the longest one, is computed here, so the agent
+		only repairs it while moving.
+
+		:param histogrid: The HistogramGrid whose full map is planned over.
+		:type histogrid: HistogramGrid
+		:param goal: The cell to reach.
+		:type goal: np.ndarray
+		:param start: The cell of the agent.
+		:type start: np.ndarray
+		:param threshold: Map values over it are taken as obstacles. Defaults to 0, as positive values stand for occupancy.
+		:type threshold: float
+		:param maxExpansions: Most cells expanded by the first plan. Defaults to None, the plan is completed.
+		:type maxExpansions: int
+		'''
+
+		self._histogrid = histogrid
+		self._threshold = threshold
+		self._shape = histogrid.getFullMap().shape
+		self._width = self._shape[1] + 2
+		self._occupied = np.asarray(histogrid.getFullMap()[:, :] > threshold)
+		self._blocked = bytearray(np.pad(self._occupied, 1, mode='constant', constant_values=True).tobytes())
+		# Moves to the 8 neighbours of a cell, as (flat offset, cost)
+		self._moves = [
+			(dr * self._width + dc, DIAGONAL_COST if dr and dc else COST_SCALE)
+			for dr in (-1, 0, 1) for dc in (-1, 0, 1) if dr or dc
+		]
+		self._dirtyBounds = None
+		self._expanded = 0
+		self._complete = False
+		histogrid.addMapListener(self.markDirtyRegion)
+		self.setGoal(goal, start, maxExpansions)
+
+	def getGoal(self) -> np.ndarray:
+		return self.toLocation(self._goal)
+
+	def getStart(self) -> np.ndarray:
+		return self.toLocation(self._start)
+
+	def getExpanded(self) -> int:
+		'''
+		Returns the amount of cells expanded since the goal was set.
+
+		:return: the amount of expansions.
+		'''
+
+		return self._expanded
+
+	def isComplete(self) -> bool:
+		'''
+		Returns whether the last search reached the agent, or stopped short on its expansion budget.
+
+		:return: True if the cost from the agent to the goal is known.
+		'''
+
+		return self._complete
+
+	def toCell(self, location: np.ndarray) -> int:
+		'''
+		Translates a location on the full map to the flat index of its cell, clipped to the map.
+
+		:param location: The location.
+		:type location: np.ndarray
+		:return: The flat index.
+		'''
+
+		row = min(max(int(round(location[0])), 0), self._shape[0] - 1)
+		col = min(max(int(round(location[1])), 0), self._shape[1] - 1)
+		return (row + 1) * self._width + col + 1
+
+	def toLocation(self, cell: int) -> np.ndarray:
+		'''
+		Translates the flat index of a cell to its location on the full map.
+
+		:param cell: The flat index.
+		:type cell: int
+		:return: The location.
+		'''
+
+		return np.array(divmod(cell, self._width)) - 1
+
+	def setGoal(self, goal: np.ndarray, start: np.ndarray, maxExpansions: int = None):
+		'''
+		Sets a new goal, dropping the previous search, and plans from *start* at once.
+
+		:param goal: The cell to reach.
+		:type goal: np.ndarray
+		:param start: The cell of the agent.
+		:type start: np.ndarray
+		:param maxExpansions: Most cells to expand. Defaults to None, the plan is completed.
+		:type maxExpansions: int
+		'''
+
+		size = (self._shape[0] + 2) * self._width
+		self._g = [INF] * size
+		self._rhs = [INF] * size
+		self._queue = []
+		self._km = 0
+		self._expanded = 0
+		self._goal = self.toCell(goal)
+		self._start = self.toCell(start)
+		self._last = self._start
+		self._rhs[self._goal] = 0
+		heapq.heappush(self._queue, (self.computeKey(self._goal), self._goal))
+		self.updateCells()
+		self._complete = self.computeShortestPath(maxExpansions)
+
+	def heuristic(self, a: int, b: int) -> float:
+		'''
+		Octile distance between two cells, a lower bound of the cost of any path joining them.
+		'''
+
+		row_a, col_a = divmod(a, self._width)
+		row_b, col_b = divmod(b, self._width)
+		dr, dc = abs(row_a - row_b), abs(col_a - col_b)
+		return COST_SCALE * (dr + dc) + (DIAGONAL_COST - 2 * COST_SCALE) * min(dr, dc)
+
+	def computeKey(self, cell: int) -> tuple:
+		best = min(self._g[cell], self._rhs[cell])
+		return best + self.heuristic(self._start, cell) + self._km, best
+
+	def getNeighbours(self, cell: int) -> List[int]:
+		'''
+		Returns the neighbours of a cell, the ones on the ring around the map included.
+
+		:param cell: The flat index of the cell.
+		:type cell: int
+		:return: The flat indexes of the neighbours.
+		'''
+
+		return [cell + offset for offset, _ in self._moves]
+
+	def updateVertex(self, cell: int):
+		'''
+		Computes again the cost to the goal of a cell through its neighbours, queueing it if it's not consistent. Moves
+		from or to an obstacle cost infinite.
+
+		:param cell: The flat index of the cell.
+		:type cell: int
+		'''
+
+		g = self._g
+		if cell != self._goal:
+			blocked = self._blocked
+			rhs = INF
+			if not blocked[cell]:
+				for offset, cost in self._moves:
+					neighbour = cell + offset
+					if not blocked[neighbour]:
+						value = g[neighbour] + cost
+						if value < rhs:
+							rhs = value
+			self._rhs[cell] = rhs
+		if g[cell] != self._rhs[cell]:
+			heapq.heappush(self._queue, (self.computeKey(cell), cell))
+
+	def computeShortestPath(self, maxExpansions: int = None) -> bool:
+		'''
+		Expands cells until the cost from the agent to the goal is known. Queue entries are not removed when a cell gets
+		a new key, so entries not matching the current key of their cell are skipped. Keys and costs are computed
+		inline, as this loop holds most of the planning time.
+
+		:param maxExpansions: Most cells to expand. Defaults to None, no limit.
+		:type maxExpansions: int
+		:return: True if the cost from the agent is known, False if the budget ran out first.
+		'''
+
+		queue, g, rhs, blocked, moves = self._queue, self._g, self._rhs, self._blocked, self._moves
+		start, goal, km, width = self._start, self._goal, self._km, self._width
+		start_row, start_col = divmod(start, width)
+		diagonal = DIAGONAL_COST - 2 * COST_SCALE
+		budget = INF if maxExpansions is None else maxExpansions
+		push, pop = heapq.heappush, heapq.heappop
+
+		def computeKey(cell):
+			row, col = divmod(cell, width)
+			dr, dc = abs(row - start_row), abs(col - start_col)
+			best = g[cell] if g[cell] < rhs[cell] else rhs[cell]
+			return best + COST_SCALE * (dr + dc) + diagonal * (dr if dr < dc else dc) + km, best
+
+		while queue:
+			key, cell = queue[0]
+			best = g[start] if g[start] < rhs[start] else rhs[start]
+			if key >= (best + km, best) and rhs[start] <= g[start]:
+				return True
+			if budget <= 0:
+				return False
+			pop(queue)
+			cost_g, cost_rhs = g[cell], rhs[cell]
+			if cost_g == cost_rhs:
+				continue
+			new_key = computeKey(cell)
+			if key < new_key:
+				push(queue, (new_key, cell))
+				continue
+			if key > new_key:
+				continue
+
+			self._expanded += 1
+			budget -= 1
+			if cost_g > cost_rhs:
+				g[cell] = cost_rhs
+				if blocked[cell]:
+					continue
+				for offset, cost in moves:
+					neighbour = cell + offset
+					value = cost_rhs + cost
+					if value < rhs[neighbour] and neighbour != goal and not blocked[neighbour]:
+						rhs[neighbour] = value
+						if g[neighbour] != value:
+							push(queue, (computeKey(neighbour), neighbour))
+			else:
+				g[cell] = INF
+				self.updateVertex(cell)
+				for offset, cost in moves:
+					neighbour = cell + offset
+					if rhs[neighbour] == cost_g + cost:
+						self.updateVertex(neighbour)
+		return True
+
+	def markDirtyRegion(self, begin: np.ndarray, end: np.ndarray):
+		'''
+		Records a region of the full map was written, growing the bounding box of every region pending an update.
+
+		:param begin: Begin point of the region on the full map.
+		:type begin: np.ndarray
+		:param end: End point of the region on the full map.
+		:type end: np.ndarray
+		'''
+
+		if self._dirtyBounds is None:
+			self._dirtyBounds = (np.array(begin), np.array(end))
+		else:
+			self._dirtyBounds = (np.minimum(self._dirtyBounds[0], begin), np.maximum(self._dirtyBounds[1], end))
+
+	def updateCells(self) -> int:
+		'''
+		Takes the cells that changed between free and obstacle on the regions written since the last call, and updates
+		the cells whose moves they affect.
+
+		:return: The amount of cells that changed.
+		'''
+
+		if self._dirtyBounds is None:
+			return 0
+
+		(begin, end), self._dirtyBounds = self._dirtyBounds, None
+		occupied = np.asarray(self._histogrid.getFullMap()[begin[0]:end[0], begin[1]:end[1]] > self._threshold)
+		changed = np.argwhere(occupied != self._occupied[begin[0]:end[0], begin[1]:end[1]])
+		if changed.size == 0:
+			return 0
+		self._occupied[begin[0]:end[0], begin[1]:end[1]] = occupied
+
+		cells = (changed[:, 0] + begin[0] + 1) * self._width + changed[:, 1] + begin[1] + 1
+		for cell in cells.tolist():
+			self._blocked[cell] ^= 1
+		for cell in cells.tolist():
+			self.updateVertex(cell)
+			for neighbour in self.getNeighbours(cell):
+				self.updateVertex(neighbour)
+		return len(cells)
+
+	def plan(self, start: np.ndarray, maxExpansions: int = None) -> float:
+		'''
+		Moves the agent to *start*, takes the changes on the map, and repairs the search.
+
+		:param start: The cell of the agent.
+		:type start: np.ndarray
+		:param maxExpansions: Most cells to expand. Defaults to None, the search is completed. Otherwise, it goes on
+		 from where it stopped on the next call.
+		:type maxExpansions: int
+		:return: The cost of the path to the goal, in cells, infinite if it can't be reached or isn't reached yet.
+		'''
+
+		start = self.toCell(start)
+		if start != self._start:
+			self._start = start
+			self._km += self.heuristic(self._last, start)
+			self._last = start
+		self.updateCells()
+		self._complete = self.computeShortestPath(maxExpansions)
+		return self._rhs[self._start] / COST_SCALE
+
+	def getPath(self, maxLength: int = None) -> List[np.ndarray]:
+		'''
+		Follows the search from the agent to the goal, picking the cheapest move on every cell.
+
+		:param maxLength: Amount of cells to follow at most. Defaults to the whole path.
+		:type maxLength: int
+		:return: The cells of the path, the one of the agent excluded. Empty if the goal can't be reached.
+		'''
+
+		path = []
+		cell = self._start
+		limit = maxLength if maxLength is not None else self._shape[0] * self._shape[1]
+		if self._rhs[cell] == INF:
+			return path
+		while cell != self._goal and len(path) < limit:
+			cell = min(
+				(self._g[cell + offset] + cost, cell + offset)
+				for offset, cost in self._moves if not self._blocked[cell + offset]
+			)[1]
+			path.append(self.toLocation(cell))
+		return path
+
+	def getWaypoint(self, start: np.ndarray, lookahead: int = 10, maxExpansions: int = None) -> np.ndarray:
+		'''
+		Repairs the search from *start* and returns the cell the agent should head to, *lookahead* cells ahead on the
+		path. If the budget runs out before the agent is reached, the best partial plan is taken: the cell next on the
+		queue, whose cost to the goal plus the distance to the agent is the lowest estimate of a path through it.
+
+		:param start: The cell of the agent.
+		:type start: np.ndarray
+		:param lookahead: Amount of cells ahead on the path. Defaults to 10.
+		:type lookahead: int
+		:param maxExpansions: Most cells to expand. Defaults to None, the search is completed.
+		:type maxExpansions: int
+		:return: The waypoint, or the goal itself if it can't be reached.
+		'''
+
+		self.plan(start, maxExpansions)
+		path = self.getPath(lookahead)
+		if path:
+			return path[-1]
+		if not self._complete and self._queue[0][0][0] < INF:
+			return self.toLocation(self._queue[0][1])
+		return self.getGoal()
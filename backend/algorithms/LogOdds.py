@@ -0,0 +1,94 @@
+'''
+######
+
+This file provides a compact log-odds representation of the Histogram Grid, as saturating fixed-point integers.
+
+Maps hold a signed certainty on every cell: positive values stand for occupancy and negative ones for emptiness. Such a
+certainty *c* is stored as the fixed-point log-odds *round(2·atanh(c)·scale)*, so fusing readings is just a saturating
+integer add, and reading it back is a lookup on a precomputed table of *tanh(l / (2·scale))*.
+'''
+
+import numpy as np
+
+# Largest certainty taken into account. Certainties of 1 would become infinite log-odds.
+MAX_CERTAINTY = 1 - 1e-6
+
+
+def getLogOddsScale(dtype) -> int:
+	'''
+	Returns the default scale for an integer type, so that it saturates at ±16 log-odds.
+
+	:param dtype: The integer type, np.int8 or np.int16.
+	:return: The amount of steps per unit of log-odds.
+	:rtype: int
+	'''
+
+	return 2 ** (np.iinfo(dtype).bits - 5)
+
+
+def toLogOdds(certainty: np.ndarray, dtype=np.int16, scale: int = None) -> np.ndarray:
+	'''
+	Converts signed certainties into fixed-point log-odds.
+
+	:param certainty: Certainties in [-1, 1], positive for occupancy and negative for emptiness.
+	:type certainty: np.ndarray
+	:param dtype: The integer type to use. Defaults to np.int16.
+	:param scale: Amount of steps per unit of log-odds. Defaults to *getLogOddsScale(dtype)*.
+	:type scale: int
+	:return: The log-odds.
+	:rtype: np.ndarray
+	'''
+
+	scale = scale or getLogOddsScale(dtype)
+	limits = np.iinfo(dtype)
+	log_odds = 2 * np.arctanh(np.clip(certainty, -MAX_CERTAINTY, MAX_CERTAINTY)) * scale
+	return np.clip(np.round(log_odds), limits.min, limits.max).astype(dtype)
+
+
+def getReadoutTable(dtype=np.int16, scale: int = None) -> np.ndarray:
+	'''
+	Computes the signed certainty of every value the integer type can hold.
+
+	:param dtype: The integer type. Defaults to np.int16.
+	:param scale: Amount of steps per unit of log-odds. Defaults to *getLogOddsScale(dtype)*.
+	:type scale: int
+	:return: A table of certainties, to be indexed by *log_odds - iinfo(dtype).min*.
+	:rtype: np.ndarray
+	'''
+
+	scale = scale or getLogOddsScale(dtype)
+	limits = np.iinfo(dtype)
+	return np.tanh(np.arange(limits.min, limits.max + 1) / (2.0 * scale)).astype(np.float32)
+
+
+def readLogOdds(logOdds: np.ndarray, table: np.ndarray) -> np.ndarray:
+	'''
+	Converts fixed-point log-odds back to signed certainties.
+
+	:param logOdds: The log-odds.
+	:type logOdds: np.ndarray
+	:param table: A readout table, as given by *getReadoutTable*.
+	:type table: np.ndarray
+	:return: The certainties, in [-1, 1].
+	:rtype: np.ndarray
+	'''
+
+	return table[logOdds.astype(np.int32) - np.iinfo(logOdds.dtype).min]
+
+
+def updateLogOdds(logOdds: np.ndarray, idx: np.ndarray, delta: np.ndarray):
+	'''
+	Adds inplace *delta* to the flat indexes *idx* of *logOdds*, saturating at the limits of its type.
+
+	:param logOdds: The log-odds to update.
+	:type logOdds: np.ndarray
+	:param idx: Flat, unique, indexes of the cells to update.
+	:type idx: np.ndarray
+	:param delta: The log-odds to add.
+	:type delta: np.ndarray
+	:rtype: None
+	'''
+
+	limits = np.iinfo(logOdds.dtype)
+	cells = logOdds.reshape(-1)
+	cells[idx] = np.clip(cells[idx].astype(np.int32) + delta, limits.min, limits.max)
@@ -0,0 +1,356 @@
+'''
+######
+
+This file provides a tiled map store, so maps bigger than the available memory can be used as the full map of the
+Histogram Grid and the area map of the Particle Filter.
+
+The map is split on square tiles of a fixed size, kept on a memory mapped file. Only the most recently used tiles are
+held in memory, and tiles never written are not created at all, reading as the fill value.
+
+Occupancy, the positive values, can optionally fade with time, so obstacles no longer there don't stay as phantom walls.
+The decay is lazy: every tile keeps the time it was last decayed at, and the decay due is only applied when the tile is
+read or written, so no pass over the whole map is ever needed. Copies of the map held elsewhere, as the window of a
+Histogram Grid, don't decay with the tiles: the Histogram Grid decays its window itself, through *decayValues*.
+'''
+
+from collections import OrderedDict
+from typing import Tuple
+import tempfile
+import time
+import numpy as np
+
+
+class TiledMap:
+	def __init__(self,
+	             shape: Tuple,
+	             tileSize: int = 64,
+	             dtype=np.float32,
+	             fillValue: float = 0,
+	             path: str = None,
+	             cachedTiles: int = 64,
+	             decayFactor: float = None,
+	             decayPeriod: float = 1.0,
+	             clock=time.monotonic
+	             ):
+		'''
+		Constructor method for the tiled map.
+
+		:param shape: The size of the map, in cells.
+		:type shape: Tuple
+		:param tileSize: Side length of each tile, in cells. Defaults to 64.
+		:type tileSize: int
+		:param dtype: Type of the cells. Defaults to float32.
+		:param fillValue: Value of the cells never written. Defaults to 0.
+		:type fillValue: float
+		:param path: File backing the map. A temporary file is used if none is given.
+		:type path: str
+		:param cachedTiles: Amount of tiles held in memory. Defaults to 64.
+		:type cachedTiles: int
+		:param decayFactor: Factor occupancy is multiplied by every decay period. Defaults to None, no decay. The cells
+		 under the window of a Histogram Grid decay along with it, as it decays its own copy of them.
+		:type decayFactor: float
+		:param decayPeriod: Length of the decay period, in seconds of *clock*. Defaults to 1. Decay is applied on whole
+		 periods only, so values held as integers don't lose steps to rounding however often they're read.
+		:type decayPeriod: float
+		:param clock: Callable returning the current time. Defaults to *time.monotonic*.
+		'''
+
+		self._shape = (int(shape[0]), int(shape[1]))
+		self._tileSize = tileSize
+		self._dtype = np.dtype(dtype)
+		self._fillValue = fillValue
+		self._tiles = (-(-self._shape[0] // tileSize), -(-self._shape[1] // tileSize))
+		if path is None:
+			self._tmpFile = tempfile.NamedTemporaryFile(suffix='.map')
+			path = self._tmpFile.name
+		self._path = path
+		self._store = np.memmap(path, dtype=self._dtype, mode='w+', shape=self._tiles + (tileSize, tileSize))
+		self._created = np.zeros(self._tiles, dtype=bool)
+		self._cachedTiles = cachedTiles
+		self._cache = OrderedDict()
+		self._dirty = set()
+		self._decayFactor = decayFactor
+		self._decayPeriod = decayPeriod
+		self._clock = clock
+		self._stamps = np.zeros(self._tiles) if decayFactor is not None else None
+
+	@property
+	def shape(self) -> Tuple:
+		return self._shape
+
+	@property
+	def dtype(self):
+		return self._dtype
+
+	@property
+	def ndim(self) -> int:
+		return 2
+
+	def getTileSize(self) -> int:
+		return self._tileSize
+
+	def getPath(self) -> str:
+		return self._path
+
+	def getCreatedTiles(self) -> int:
+		return int(self._created.sum())
+
+	def getCachedTiles(self) -> int:
+		return len(self._cache)
+
+	def isDecaying(self) -> bool:
+		return self._decayFactor is not None
+
+	def decayValues(self, data: np.ndarray, stamp: float = None) -> Tuple:
+		'''
+		Applies inplace the decay due on some values since *stamp*, on whole decay periods, the same way tiles decay.
+
+		:param data: The values.
+		:type data: np.ndarray
+		:param stamp: The time the values were last decayed at. Defaults to None, they start decaying now.
+		:type stamp: float
+		:return: The time the values are decayed up to, and whether any of them changed.
+		'''
+
+		now = self._clock()
+		if stamp is None:
+			return now, False
+		periods = int((now - stamp) // self._decayPeriod)
+		if periods <= 0:
+			return stamp, False
+		occupied = data > 0
+		if np.any(occupied):
+			decayed = data[occupied] * self._decayFactor ** periods
+			data[occupied] = np.round(decayed) if np.issubdtype(data.dtype, np.integer) else decayed
+		return stamp + periods * self._decayPeriod, bool(np.any(occupied))
+
+	def decayTile(self, tile: Tuple, data: np.ndarray):
+		'''
+		Applies inplace the decay due on a tile since it was last decayed, on whole decay periods.
+
+		:param tile: The tile coordinates.
+		:type tile: Tuple
+		:param data: The tile.
+		:type data: np.ndarray
+		'''
+
+		self._stamps[tile], changed = self.decayValues(data, self._stamps[tile])
+		if changed:
+			self._dirty.add(tile)
+
+	def readTile(self, tile: Tuple) -> np.ndarray:
+		'''
+		Returns a tile, loading it in memory if needed.
+
+		:param tile: The tile coordinates.
+		:type tile: Tuple
+		:return: The tile, or None if it was never written.
+		'''
+
+		data = self._cache.get(tile)
+		if data is not None:
+			self._cache.move_to_end(tile)
+		elif not self._created[tile]:
+			return None
+		else:
+			data = np.array(self._store[tile])
+			self.cacheTile(tile, data)
+
+		if self._stamps is not None:
+			self.decayTile(tile, data)
+		return data
+
+	def writableTile(self, tile: Tuple) -> np.ndarray:
+		'''
+		Returns a tile to be written, creating it if it was never written before.
+
+		:param tile: The tile coordinates.
+		:type tile: Tuple
+		:return: The tile.
+		'''
+
+		data = self.readTile(tile)
+		if data is None:
+			data = np.full((self._tileSize, self._tileSize), self._fillValue, dtype=self._dtype)
+			self._created[tile] = True
+			if self._stamps is not None:
+				self._stamps[tile] = self._clock()
+			self.cacheTile(tile, data)
+		self._dirty.add(tile)
+		return data
+
+	def cacheTile(self, tile: Tuple, data: np.ndarray):
+		'''
+		Keeps a tile in memory, writing back the least recently used one if the cache is full.
+
+		:param tile: The tile coordinates.
+		:type tile: Tuple
+		:param data: The tile.
+		:type data: np.ndarray
+		'''
+
+		self._cache[tile] = data
+		if len(self._cache) > self._cachedTiles:
+			old_tile, old_data = self._cache.popitem(last=False)
+			if old_tile in self._dirty:
+				self._store[old_tile] = old_data
+				self._dirty.discard(old_tile)
+
+	def flush(self):
+		'''
+		Writes every modified tile to the backing file.
+		'''
+
+		for tile in self._dirty:
+			self._store[tile] = self._cache[tile]
+		self._dirty.clear()
+		self._store.flush()
+
+	def getBounds(self, key: Tuple) -> Tuple:
+		'''
+		Translates a pair of slices, or integers, to begin and end points on the map.
+
+		:param key: The pair of slices.
+		:type key: Tuple
+		:return: The begin and end points.
+		'''
+
+		begin, end = [], []
+		for k, size in zip(key, self._shape):
+			if isinstance(k, slice):
+				start, stop, step = k.indices(size)
+				if step != 1:
+					raise IndexError('TiledMap only supports contiguous slices')
+				stop = max(start, stop)
+			else:
+				start = int(k) + size if k < 0 else int(k)
+				if not 0 <= start < size:
+					raise IndexError('index {} is out of bounds for size {}'.format(k, size))
+				stop = start + 1
+			begin.append(start)
+			end.append(stop)
+		return np.array(begin), np.array(end)
+
+	def getTilesOn(self, begin: np.ndarray, end: np.ndarray):
+		'''
+		Iterates over the tiles overlapping a region of the map.
+
+		:param begin: Begin point of the region.
+		:type begin: np.ndarray
+		:param end: End point of the region.
+		:type end: np.ndarray
+		:return: A generator of (tile, slices on the tile, slices on the region)
+		'''
+
+		ts = self._tileSize
+		for tr in range(begin[0] // ts, -(-end[0] // ts)):
+			r0, r1 = max(begin[0], tr * ts), min(end[0], (tr + 1) * ts)
+			for tc in range(begin[1] // ts, -(-end[1] // ts)):
+				c0, c1 = max(begin[1], tc * ts), min(end[1], (tc + 1) * ts)
+				yield (tr, tc), \
+					(slice(r0 - tr * ts, r1 - tr * ts), slice(c0 - tc * ts, c1 - tc * ts)), \
+					(slice(r0 - begin[0], r1 - begin[0]), slice(c0 - begin[1], c1 - begin[1]))
+
+	def isGather(self, key: Tuple) -> bool:
+		return any(isinstance(k, (np.ndarray, list)) for k in key)
+
+	def getCellsTiles(self, key: Tuple) -> Tuple:
+		'''
+		Groups a set of cells by the tile they lay on.
+
+		:param key: The rows and the columns of the cells.
+		:type key: Tuple
+		:return: The broadcasted rows and columns, the tile of each cell and the unique tiles.
+		'''
+
+		rows, cols = np.broadcast_arrays(np.asarray(key[0], dtype=np.int64), np.asarray(key[1], dtype=np.int64))
+		if np.any((rows < 0) | (rows >= self._shape[0]) | (cols < 0) | (cols >= self._shape[1])):
+			raise IndexError('cells out of the map bounds')
+		tile_ids = (rows // self._tileSize) * self._tiles[1] + cols // self._tileSize
+		return rows, cols, tile_ids, np.unique(tile_ids)
+
+	def __getitem__(self, key: Tuple) -> np.ndarray:
+		'''
+		Reads a region of the map, given by a pair of slices, or a set of cells, given by a pair of index arrays.
+		'''
+
+		if not isinstance(key, tuple):
+			key = (key, slice(None))
+
+		if self.isGather(key):
+			rows, cols, tile_ids, tiles = self.getCellsTiles(key)
+			values = np.full(rows.shape, self._fillValue, dtype=self._dtype)
+			for tile_id in tiles:
+				data = self.readTile(divmod(int(tile_id), self._tiles[1]))
+				if data is not None:
+					mask = tile_ids == tile_id
+					values[mask] = data[rows[mask] % self._tileSize, cols[mask] % self._tileSize]
+			return values
+
+		begin, end = self.getBounds(key)
+		region = np.full(end - begin, self._fillValue, dtype=self._dtype)
+		for tile, tile_slices, region_slices in self.getTilesOn(begin, end):
+			data = self.readTile(tile)
+			if data is not None:
+				region[region_slices] = data[tile_slices]
+
+		if not isinstance(key[0], slice):
+			region = region[0]
+		if not isinstance(key[1], slice):
+			region = region[..., 0]
+		return region
+
+	def __setitem__(self, key: Tuple, value):
+		'''
+		Writes a region of the map, given by a pair of slices, or a set of cells, given by a pair of index arrays.
+		'''
+
+		if not isinstance(key, tuple):
+			key = (key, slice(None))
+
+		if self.isGather(key):
+			rows, cols, tile_ids, tiles = self.getCellsTiles(key)
+			value = np.broadcast_to(value, rows.shape)
+			for tile_id in tiles:
+				mask = tile_ids == tile_id
+				data = self.writableTile(divmod(int(tile_id), self._tiles[1]))
+				data[rows[mask] % self._tileSize, cols[mask] % self._tileSize] = value[mask]
+			return
+
+		begin, end = self.getBounds(key)
+		value = np.broadcast_to(value, tuple(end - begin))
+		for tile, tile_slices, region_slices in self.getTilesOn(begin, end):
+			self.writableTile(tile)[tile_slices] = value[region_slices]
+
+	def findValue(self, value: float) -> Tuple:
+		'''
+		Finds every cell holding *value*, as *np.where(map == value)* would do. Tiles never written are only checked
+		against the fill value.
+
+		:param value: The value to look for.
+		:type value: float
+		:return: The rows and columns of the cells, in row-major order.
+		'''
+
+		rows, cols = [], []
+		full = np.indices((self._tileSize, self._tileSize)).reshape(2, -1)
+		for tr in range(self._tiles[0]):
+			for tc in range(self._tiles[1]):
+				data = self.readTile((tr, tc))
+				if data is None:
+					if self._fillValue != value:
+						continue
+					tile_rows, tile_cols = full
+				else:
+					tile_rows, tile_cols = np.nonzero(data == value)
+				tile_rows = tile_rows + tr * self._tileSize
+				tile_cols = tile_cols + tc * self._tileSize
+				inside = (tile_rows < self._shape[0]) & (tile_cols < self._shape[1])
+				rows.append(tile_rows[inside])
+				cols.append(tile_cols[inside])
+
+		if not rows:
+			return np.array([], dtype=np.int64), np.array([], dtype=np.int64)
+		rows, cols = np.concatenate(rows), np.concatenate(cols)
+		order = np.lexsort((cols, rows))
+		return rows[order], cols[order]
@@ -7,6 +7,11 @@ This file aims to provide an implementation of a Particle Filter method for loca
 '''
 
 import numpy as np
+from scipy import ndimage
+from scipy.stats import norm
+from backend.algorithms.MapStore import TiledMap
+from backend.algorithms import Geometry
+from backend.algorithms.RangeTable import RangeTable
 
 
 class ParticleFilter:
@@ -15,16 +20,61 @@ class ParticleFilter:
 	             turn_noise: float,
 	             forward_noise: float,
 	             sense_noise: float,
-	             heading_coverage: int = 12
+	             heading_coverage: int = 12,
+	             range_table: RangeTable = None,
+	             sensor_model: str = 'beam',
+	             random_weight: float = 0.05,
+	             threshold: float = 0,
+	             max_particles: int = None,
+	             min_particles: int = 100
 	             ):
+		'''
+		Constructor method for the Particle Filter.
+
+		:param areaMap: The map. Cells equal to 0 are free, the ones over *threshold* are obstacles.
+		:type areaMap: np.ndarray
+		:param turn_noise: Error when turning.
+		:type turn_noise: float
+		:param forward_noise: Error when moving forward.
+		:type forward_noise: float
+		:param sense_noise: Error of the sensors, in cells.
+		:type sense_noise: float
+		:param heading_coverage: Amount of headings every empty space is taken with. Defaults to 12.
+		:type heading_coverage: int
+		:param range_table: Table to look the expected ranges up on. Defaults to None, rays are cast.
+		:type range_table: RangeTable
+		:param sensor_model: 'beam' to weigh particles by the ranges they'd read, 'likelihood_field' to weigh them by
+		 how close to an obstacle the readings of the agent end from their pose. Defaults to 'beam'.
+		:type sensor_model: str
+		:param random_weight: Share of the likelihood field given to random readings, so a single beam ending far
+		 from any obstacle doesn't rule a particle out. Defaults to 0.05.
+		:type random_weight: float
+		:param threshold: Map values over it are obstacles. Defaults to 0.
+		:type threshold: float
+		:param max_particles: Most particles held at once. When the empty spaces times the heading coverage go over it,
+		 the first generation is a stratified sample of them. Defaults to None, as many as those poses.
+		:type max_particles: int
+		:param min_particles: Fewest particles *resampleKLD* keeps. Defaults to 100.
+		:type min_particles: int
+		'''
+
+		if sensor_model not in ('beam', 'likelihood_field'):
+			raise ValueError('Unknown sensor model {}, expected beam or likelihood_field'.format(sensor_model))
 
 		self._area_map = areaMap
-		self._empty_spaces = np.where(areaMap == 0)
+		self._empty_spaces = areaMap.findValue(0) if isinstance(areaMap, TiledMap) else np.where(areaMap == 0)
 		self._particle_number = (self._empty_spaces[0].shape[0], heading_coverage)
+		self._max_particles = max_particles
+		self._min_particles = min_particles
 		self._particle_map = self.generateParticles()
 		self._turn_noise = turn_noise
 		self._forward_noise = forward_noise
 		self._sense_noise = sense_noise
+		self.setRangeTable(range_table)
+		self._sensor_model = sensor_model
+		self._random_weight = random_weight
+		self._threshold = threshold
+		self._likelihood_field = self.computeLikelihoodField() if sensor_model == 'likelihood_field' else None
 
 	def getParticleNumber(self) -> tuple:
 		return self._particle_number
@@ -42,29 +92,79 @@ class ParticleFilter:
 		return self._turn_noise
 
 	def getSenseNoise(self) -> float:
-		return self._turn_noise
+		return self._sense_noise
+
+	def getSensorModel(self) -> str:
+		return self._sensor_model
+
+	def getLikelihoodField(self) -> np.ndarray:
+		return self._likelihood_field
 
 	def getParticleMap(self) -> np.ndarray:
 		return self._particle_map
 
+	def getParticleCount(self) -> int:
+		return self._particle_map.shape[1]
+
+	def getMaxParticles(self) -> int:
+		return self._max_particles
+
+	def getRangeTable(self) -> RangeTable:
+		return self._range_table
+
+	def setRangeTable(self, range_table: RangeTable):
+		'''
+		Sets the table to look the expected ranges up on. It's only used if it was built from this map and heading
+		coverage, which is checked here, once.
+
+		:param range_table: The table, or None to cast rays.
+		:type range_table: RangeTable
+		'''
+
+		self._range_table = range_table
+		self._range_table_fits = range_table is not None and \
+			range_table.fitsMap(self.getMap(), self.computeHeadings(self._particle_number[1]))
+
+	@staticmethod
+	def computeHeadings(heading_coverage: int) -> np.ndarray:
+		'''
+		Computes the headings every empty space is taken with on the first generation of particles.
+
+		:param heading_coverage: Amount of headings.
+		:type heading_coverage: int
+		:return: The headings, in rad.
+		:rtype: np.ndarray
+		'''
+
+		# To avoid having -180 and +180 as both are the same:
+		return np.linspace(-np.pi + np.pi/heading_coverage, np.pi, heading_coverage)
+
 	def generateParticles(self) -> np.ndarray:
 		'''
-		An init method used from the constructor to create the first generation of particles.
+		An init method used from the constructor to create the first generation of particles. Every empty space is
+		taken with every heading, unless that goes over the particle limit: then one particle is drawn on each of
+		*max_particles* equal strata of those poses, so they still cover the whole map without building them all.
 
 		:return: A 3D matrix containing particle position (x,y) and heading (rad).
 		:rtype: np.ndarray
 		'''
 
 		particle_number = self.getParticleNumber()
-		# To avoid having -180 and +180 as both are the same:
-		angles = np.linspace(-np.pi + np.pi/particle_number[1], np.pi, particle_number[1])
+		angles = self.computeHeadings(particle_number[1])
 		particles = self.getEmptySpaces()
+		total = particle_number[0] * particle_number[1]
+
+		if self._max_particles is not None and total > self._max_particles:
+			poses = ((np.arange(self._max_particles) + np.random.rand(self._max_particles)) *
+			         (total / self._max_particles)).astype(np.int64)
+			cells, headings = np.divmod(np.minimum(poses, total - 1), particle_number[1])
+			return np.stack([particles[0][cells], particles[1][cells], angles[headings]]).astype(float)
 
 		particles = np.r_[
 			np.repeat(particles, particle_number[1]),
 			np.tile(angles, particle_number[0])
 		].reshape(
-			3, particle_number[0] * particle_number[1]
+			3, total
 		)
 
 		return particles
@@ -87,8 +187,7 @@ class ParticleFilter:
 		'''
 
 		assert forward >= 0
-		particle_number = self.getParticleNumber()
-		particle_number = particle_number[0] * particle_number[1]
+		particle_number = self.getParticleCount()
 		self._particle_map[2] += yaw + np.random.normal(
 			0.0, self.getTurnNoise(), particle_number
 		)
@@ -100,6 +199,32 @@ class ParticleFilter:
 		Geometry.constraintToWorldSize(self._particle_map[0], world_shape[0])
 		Geometry.constraintToWorldSize(self._particle_map[1], world_shape[1])
 
+	def computeExpectedRanges(self, angle_offsets: np.ndarray, max_range: float, threshold: float = 0) -> np.ndarray:
+		'''
+		Computes the readings every particle would get from the map, casting a ray per sensor from its pose. If a range
+		table built from this map and heading coverage, for the same sensors and threshold, was set, the readings are
+		looked up on it instead.
+
+		:param angle_offsets: The angles of the sensors, in rad, relative to the particles heading.
+		:type angle_offsets: np.ndarray
+		:param max_range: The maximum distance, in cells, the sensors read.
+		:type max_range: float
+		:param threshold: Map values over it are obstacles. Defaults to 0.
+		:type threshold: float
+		:return: A (particles * sensors) matrix of distances, in cells.
+		:rtype: np.ndarray
+		'''
+
+		angle_offsets = np.atleast_1d(angle_offsets)
+		table = self.getRangeTable()
+		if self._range_table_fits and table.fitsSensors(angle_offsets, max_range, threshold):
+			return table.lookup(self._particle_map[:2].T, self.getOrientations())
+
+		origins = np.repeat(self._particle_map[:2].T, angle_offsets.shape[0], axis=0)
+		angles = (self.getOrientations()[:, np.newaxis] + angle_offsets).ravel()
+		ranges = Geometry.marchRays(self.getMap(), origins, angles, max_range, threshold)
+		return ranges.reshape(-1, angle_offsets.shape[0])
+
 	@staticmethod
 	def computeVectorizedGaussianProb(mu: np.ndarray, sigma: float, vector: np.ndarray) -> np.ndarray:
 		'''
@@ -139,6 +264,73 @@ class ParticleFilter:
 		)
 		return probs / np.sum(probs)
 
+	def computeLikelihoodField(self) -> np.ndarray:
+		'''
+		Computes, for every cell of the map, the log-likelihood of a reading ending on it: a Gaussian of its distance to
+		the closest obstacle, mixed with a uniform share for random readings.
+
+		:return: The log-likelihood field.
+		:rtype: np.ndarray
+		'''
+
+		occupied = np.asarray(self.getMap()[:, :] > self._threshold)
+		distances = ndimage.distance_transform_edt(np.logical_not(occupied))
+		hits = np.exp(-distances ** 2 / (2 * self.getSenseNoise() ** 2))
+		return np.log((1 - self._random_weight) * hits + self._random_weight)
+
+	def computeFieldProbabilities(self, agent_measurements: np.ndarray, angle_offsets: np.ndarray,
+	                              max_range: float) -> np.ndarray:
+		'''
+		Computes the normalized probability of every particle with the likelihood field: the readings of the agent are
+		projected from the pose of each particle, and the field is looked up at their endpoints. Readings at the
+		maximum range saw no obstacle, so they're left out, as are endpoints off the map, taken as random readings.
+
+		:param agent_measurements: The distances, in cells, from agent to obstacles.
+		:type agent_measurements: np.ndarray
+		:param angle_offsets: The angles of the sensors, in rad, relative to the heading.
+		:type angle_offsets: np.ndarray
+		:param max_range: The maximum distance, in cells, the sensors read.
+		:type max_range: float
+		:return: A vector of particle_number probabilities.
+		:rtype: np.ndarray
+		'''
+
+		field = self.getLikelihoodField()
+		if field is None:
+			field = self._likelihood_field = self.computeLikelihoodField()
+		hits = np.asarray(agent_measurements, dtype=float) < max_range
+		distances = np.asarray(agent_measurements, dtype=float)[hits]
+		angles = self.getOrientations()[:, np.newaxis] + np.atleast_1d(angle_offsets)[hits]
+		rows = np.round(self._particle_map[0][:, np.newaxis] + np.cos(angles) * distances).astype(np.int64)
+		cols = np.round(self._particle_map[1][:, np.newaxis] + np.sin(angles) * distances).astype(np.int64)
+
+		on_map = (rows >= 0) & (rows < field.shape[0]) & (cols >= 0) & (cols < field.shape[1])
+		log_probs = np.full(rows.shape, np.log(self._random_weight))
+		log_probs[on_map] = field[rows[on_map], cols[on_map]]
+		log_probs = np.sum(log_probs, axis=1)
+
+		probs = np.exp(log_probs - np.max(log_probs))
+		return probs / np.sum(probs)
+
+	def computeWeights(self, agent_measurements: np.ndarray, angle_offsets: np.ndarray, max_range: float) -> np.ndarray:
+		'''
+		Computes the normalized probability of every particle with the sensor model set on the constructor.
+
+		:param agent_measurements: The distances, in cells, from agent to obstacles.
+		:type agent_measurements: np.ndarray
+		:param angle_offsets: The angles of the sensors, in rad, relative to the heading.
+		:type angle_offsets: np.ndarray
+		:param max_range: The maximum distance, in cells, the sensors read.
+		:type max_range: float
+		:return: A vector of particle_number probabilities.
+		:rtype: np.ndarray
+		'''
+
+		if self.getSensorModel() == 'likelihood_field':
+			return self.computeFieldProbabilities(agent_measurements, angle_offsets, max_range)
+		particles_measurements = self.computeExpectedRanges(angle_offsets, max_range, self._threshold)
+		return self.computeProbabilities(particles_measurements, agent_measurements)
+
 	def resample(self, probabilities: np.ndarray, amount: int = None) -> np.ndarray:
 		'''
 		Creates a new generation of *amount* particles taken from the original population with a given *probabilities*
@@ -153,10 +345,74 @@ class ParticleFilter:
 			amount = int(probabilities.shape[0] * 0.25)
 		return np.random.choice(np.arange(probabilities.shape[0]), replace=True, p=probabilities, size=amount)
 
+	@staticmethod
+	def computeKLDBound(bins: np.ndarray, epsilon: float, delta: float) -> np.ndarray:
+		'''
+		Computes the amount of particles needed so the error between the sampled belief and the true one, measured as
+		their Kullback-Leibler divergence, is under *epsilon* with probability 1 - *delta* (Fox, 2003).
+
+		:param bins: Amount of histogram bins holding at least one particle.
+		:type bins: np.ndarray
+		:param epsilon: The largest divergence allowed.
+		:type epsilon: float
+		:param delta: The probability of going over it.
+		:type delta: float
+		:return: The amount of particles, 0 for a single bin.
+		:rtype: np.ndarray
+		'''
 
-if __name__ == '__main__':
+		k = np.maximum(np.asarray(bins, dtype=float) - 1, 1)
+		a = 2.0 / (9.0 * k)
+		bound = k / (2.0 * epsilon) * (1 - a + np.sqrt(a) * norm.ppf(1 - delta)) ** 3
+		return np.where(np.asarray(bins) > 1, np.ceil(bound), 0)
 
-	import backend.algorithms.Geometry as Geometry
+	def resampleKLD(self, probabilities: np.ndarray, epsilon: float = 0.05, delta: float = 0.01,
+	                bin_size: float = 2.0, heading_bins: int = None) -> np.ndarray:
+		'''
+		Creates a new generation of particles with KLD-sampling: particles are drawn with the given *probabilities*
+		until there are enough for the amount of (x, y, heading) bins they fall in, so the population shrinks as the
+		belief concentrates and grows as it spreads. The particle map is replaced by the new generation, which holds
+		between *min_particles* and *max_particles* of them, or as many as the empty spaces times the heading coverage
+		without a *max_particles*, so the population can grow back once the belief spreads.
+
+		:param probabilities: The probability of each particle.
+		:type probabilities: np.ndarray
+		:param epsilon: The largest divergence allowed. Defaults to 0.05.
+		:type epsilon: float
+		:param delta: The probability of going over it. Defaults to 0.01.
+		:type delta: float
+		:param bin_size: Side length, in cells, of the bins. Defaults to 2.
+		:type bin_size: float
+		:param heading_bins: Amount of heading bins. Defaults to the heading coverage.
+		:type heading_bins: int
+		:return: The indexes of the particles drawn.
+		:rtype: np.ndarray
+		'''
+
+		particle_number = self.getParticleNumber()
+		limit = self._max_particles if self._max_particles is not None else particle_number[0] * particle_number[1]
+		heading_bins = heading_bins or particle_number[1]
+		drawn = np.random.choice(np.arange(probabilities.shape[0]), replace=True, p=probabilities, size=limit)
+
+		particles = self._particle_map[:, drawn]
+		keys = np.stack([
+			np.floor(particles[0] / bin_size),
+			np.floor(particles[1] / bin_size),
+			np.floor((particles[2] % (2 * np.pi)) / (2 * np.pi) * heading_bins)
+		]).astype(np.int64)
+		_, first = np.unique(keys, axis=1, return_index=True)
+		new_bins = np.zeros(limit, dtype=np.int64)
+		new_bins[first] = 1
+
+		needed = np.maximum(self.computeKLDBound(np.cumsum(new_bins), epsilon, delta), self._min_particles)
+		enough = np.where(np.arange(1, limit + 1) >= needed)[0]
+		amount = enough[0] + 1 if enough.size else limit
+
+		self._particle_map = particles[:, :amount].copy()
+		return drawn[:amount]
+
+
+if __name__ == '__main__':
 
 	pFilter = ParticleFilter(np.eye(10), 0.02, 0.02, 0.02, 2)
 	particles = pFilter.getParticleMap().T
@@ -183,13 +439,10 @@ if __name__ == '__main__':
 		particles_rays.T
 	])
 
-	intersections = Geometry.segIntersections(pFilter.getPositions().T, particles_rays, obstacles)
-	particles_measurements = np.linalg.norm(
-		np.repeat(particles[:, :2], sensor_number * obstacles.shape[1], axis=0).reshape(
-			intersections.shape) - intersections, axis=2)
+	particles_measurements = Geometry.rayNearestHits(pFilter.getPositions().T, particles_rays, obstacles)
 
 	#print(particles_measurements)
-	agent_measurements = np.array([2.5822, 12.0415, 12.0415])
+	agent_measurements = np.array([2.5822, 12.0415, 12.0415, 12.0415, 12.0415])
 	particles_probabilities = pFilter.computeProbabilities(particles_measurements, agent_measurements)
 	next_gen_sample = pFilter.resample(particles_probabilities)
 	print(next_gen_sample)
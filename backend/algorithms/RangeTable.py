@@ -0,0 +1,284 @@
+'''
+######
+
+This file provides a lookup table of the ranges the sensors would read from every pose of the Particle Filter grid, so
+particles on a static map can be scored with plain lookups instead of casting rays every tick.
+
+Poses follow the layout of *ParticleFilter.generateParticles*: every free cell of the map, in row-major order, with
+every heading of the heading coverage. Ranges are stored as uint16 fractions of the maximum range, on a *.npy* file
+that can be memory-mapped, so the table persists between runs and is only loaded as it's used. The parameters the table
+was built with, and a hash of the map, are kept on a *.json* file next to it, so a table built for another map or other
+sensors is never reused.
+'''
+
+from multiprocessing import Pool
+import hashlib
+import json
+import os
+import numpy as np
+from numpy.lib.format import open_memmap
+from backend.algorithms import Geometry
+
+# Largest value a stored range can take, standing for the maximum range
+RANGE_STEPS = np.iinfo(np.uint16).max
+
+# Map and sensors shared by the workers of a process pool
+worker_state = {}
+
+
+def initWorker(area_map: np.ndarray, free_cells: np.ndarray, headings: np.ndarray, angle_offsets: np.ndarray,
+               max_range: float, threshold: float):
+	worker_state.update(
+		area_map=area_map, free_cells=free_cells, headings=headings, angle_offsets=angle_offsets,
+		max_range=max_range, threshold=threshold
+	)
+
+
+def computeChunk(bounds: tuple) -> np.ndarray:
+	'''
+	Computes the quantized ranges of a chunk of free cells, on the state given to *initWorker*.
+
+	:param bounds: The first and last (excluded) free cells of the chunk.
+	:type bounds: tuple
+	:return: A (cells * headings * sensors) matrix of quantized ranges.
+	:rtype: np.ndarray
+	'''
+
+	begin, end = bounds
+	cells = worker_state['free_cells'][begin:end]
+	headings, offsets = worker_state['headings'], worker_state['angle_offsets']
+	max_range = worker_state['max_range']
+	origins = np.repeat(cells, headings.shape[0] * offsets.shape[0], axis=0)
+	angles = np.tile((headings[:, np.newaxis] + offsets).ravel(), cells.shape[0])
+	ranges = Geometry.marchRays(worker_state['area_map'], origins, angles, max_range, worker_state['threshold'])
+	steps = np.round(ranges / max_range * RANGE_STEPS).astype(np.uint16)
+	return steps.reshape(cells.shape[0], headings.shape[0], offsets.shape[0])
+
+
+class RangeTable:
+	def __init__(self,
+	             area_map: np.ndarray,
+	             headings: np.ndarray,
+	             angle_offsets: np.ndarray,
+	             max_range: float,
+	             threshold: float = 0,
+	             path: str = None,
+	             processes: int = None,
+	             chunk_size: int = 4096
+	             ):
+		'''
+		Constructor method for the range table. If *path* already holds a table built with the same map and
+		parameters, it's memory-mapped instead of built again. Otherwise it's built, overwriting the file.
+
+		:param area_map: The map. Cells over *threshold* are obstacles, the ones equal to 0 are free.
+		:type area_map: np.ndarray
+		:param headings: The headings, in rad, every free cell is taken with.
+		:type headings: np.ndarray
+		:param angle_offsets: The angles of the sensors, in rad, relative to the heading.
+		:type angle_offsets: np.ndarray
+		:param max_range: The maximum distance, in cells, the sensors read.
+		:type max_range: float
+		:param threshold: Map values over it are obstacles. Defaults to 0.
+		:type threshold: float
+		:param path: *.npy* file to keep the table on. Defaults to None, the table is held in memory.
+		:type path: str
+		:param processes: Amount of processes building the table. Defaults to None, built on this process.
+		:type processes: int
+		:param chunk_size: Amount of free cells computed at once. Defaults to 4096.
+		:type chunk_size: int
+		'''
+
+		self._area_map = area_map
+		self._headings = np.asarray(headings, dtype=float)
+		self._angle_offsets = np.asarray(angle_offsets, dtype=float)
+		self._max_range = max_range
+		self._threshold = threshold
+		self._map_hash = self.computeMapHash(area_map)
+		self._free_cells = np.stack(np.where(area_map[:, :] == 0), axis=1)
+		self._cell_index = np.full(area_map.shape, -1, dtype=np.int64)
+		self._cell_index[self._free_cells[:, 0], self._free_cells[:, 1]] = np.arange(self._free_cells.shape[0])
+		self._path = path
+		self._table = None
+
+		shape = (self._free_cells.shape[0], self._headings.shape[0], self._angle_offsets.shape[0])
+		if path is not None and self.isPersisted():
+			table = np.load(path, mmap_mode='r')
+			if table.shape == shape and table.dtype == np.uint16:
+				self._table = table
+		if self._table is None:
+			self._table = self.build(shape, processes, chunk_size)
+
+	def getTable(self) -> np.ndarray:
+		return self._table
+
+	def getAngleOffsets(self) -> np.ndarray:
+		return self._angle_offsets
+
+	def getMaxRange(self) -> float:
+		return self._max_range
+
+	def getHeadings(self) -> np.ndarray:
+		return self._headings
+
+	def getThreshold(self) -> float:
+		return self._threshold
+
+	def getMapHash(self) -> str:
+		return self._map_hash
+
+	def getMetadataPath(self) -> str:
+		return self._path + '.json'
+
+	@staticmethod
+	def computeMapHash(area_map: np.ndarray) -> str:
+		'''
+		Hashes the values of a map, along with their type.
+
+		:param area_map: The map.
+		:type area_map: np.ndarray
+		:return: The hash.
+		:rtype: str
+		'''
+
+		area_map = np.ascontiguousarray(area_map[:, :])
+		return hashlib.sha1(area_map.tobytes()).hexdigest() + str(area_map.dtype)
+
+	def fitsMap(self, area_map: np.ndarray, headings: np.ndarray) -> bool:
+		'''
+		Checks whether the table was built from the same map, through its hash, and the same headings.
+
+		:param area_map: The map.
+		:type area_map: np.ndarray
+		:param headings: The headings, in rad.
+		:type headings: np.ndarray
+		:return: True if the table holds the poses of that map and headings.
+		:rtype: bool
+		'''
+
+		return tuple(area_map.shape) == tuple(self._area_map.shape) and \
+			np.array_equal(np.asarray(headings, dtype=float), self._headings) and \
+			self.computeMapHash(area_map) == self._map_hash
+
+	def fitsSensors(self, angle_offsets: np.ndarray, max_range: float, threshold: float) -> bool:
+		'''
+		Checks whether the table was built for the same sensors and obstacle threshold.
+
+		:param angle_offsets: The angles of the sensors, in rad, relative to the heading.
+		:type angle_offsets: np.ndarray
+		:param max_range: The maximum distance, in cells, the sensors read.
+		:type max_range: float
+		:param threshold: Map values over it are obstacles.
+		:type threshold: float
+		:return: True if the ranges of the table are the ones those sensors read.
+		:rtype: bool
+		'''
+
+		return max_range == self._max_range and threshold == self._threshold and \
+			np.array_equal(np.asarray(angle_offsets, dtype=float), self._angle_offsets)
+
+	def computeMetadata(self) -> dict:
+		'''
+		Describes what the table is built from: the map, through a hash of its values, and the sensors.
+
+		:return: The metadata, as a JSON serializable dictionary.
+		:rtype: dict
+		'''
+
+		return {
+			'map_shape': list(self._area_map.shape),
+			'map_hash': self._map_hash,
+			'headings': self._headings.tolist(),
+			'angle_offsets': self._angle_offsets.tolist(),
+			'max_range': float(self._max_range),
+			'threshold': float(self._threshold)
+		}
+
+	def isPersisted(self) -> bool:
+		'''
+		Checks whether *path* holds a table built from the same map and sensors as this one.
+
+		:return: True if the table on *path* can be reused.
+		:rtype: bool
+		'''
+
+		if not os.path.exists(self._path) or not os.path.exists(self.getMetadataPath()):
+			return False
+		with open(self.getMetadataPath()) as metadata:
+			try:
+				return json.load(metadata) == self.computeMetadata()
+			except ValueError:
+				return False
+
+	def build(self, shape: tuple, processes: int = None, chunk_size: int = 4096) -> np.ndarray:
+		'''
+		Computes the ranges of every pose, casting the rays of chunks of free cells at once.
+
+		:param shape: The shape of the table, as (free cells, headings, sensors).
+		:type shape: tuple
+		:param processes: Amount of processes computing the chunks. Defaults to None, computed on this process.
+		:type processes: int
+		:param chunk_size: Amount of free cells per chunk.
+		:type chunk_size: int
+		:return: The table.
+		:rtype: np.ndarray
+		'''
+
+		if self._path is not None:
+			if os.path.exists(self.getMetadataPath()):
+				os.remove(self.getMetadataPath())
+			table = open_memmap(self._path, mode='w+', dtype=np.uint16, shape=shape)
+		else:
+			table = np.empty(shape, dtype=np.uint16)
+
+		chunks = [(begin, min(begin + chunk_size, shape[0])) for begin in range(0, shape[0], chunk_size)]
+		state = (np.asarray(self._area_map[:, :]), self._free_cells, self._headings, self._angle_offsets,
+		         self._max_range, self._threshold)
+		if processes is not None and processes > 1:
+			with Pool(processes, initializer=initWorker, initargs=state) as pool:
+				for (begin, end), steps in zip(chunks, pool.imap(computeChunk, chunks)):
+					table[begin:end] = steps
+		else:
+			initWorker(*state)
+			for begin, end in chunks:
+				table[begin:end] = computeChunk((begin, end))
+
+		if self._path is not None:
+			table.flush()
+			with open(self.getMetadataPath(), 'w') as metadata:
+				json.dump(self.computeMetadata(), metadata)
+		return table
+
+	def lookup(self, positions: np.ndarray, orientations: np.ndarray) -> np.ndarray:
+		'''
+		Looks the ranges of a set of poses up, taking the closest cell and heading of the table. Poses out of the free
+		cells are not on the table, so their rays are cast instead.
+
+		:param positions: The positions, as (row, column) per pose.
+		:type positions: np.ndarray
+		:param orientations: The orientations, in rad.
+		:type orientations: np.ndarray
+		:return: A (poses * sensors) matrix of distances, in cells.
+		:rtype: np.ndarray
+		'''
+
+		positions = np.asarray(positions, dtype=float)
+		cells = np.round(positions).astype(np.int64)
+		shape = np.array(self._cell_index.shape)
+		on_map = np.all((cells >= 0) & (cells < shape), axis=1)
+		indexes = np.full(positions.shape[0], -1, dtype=np.int64)
+		indexes[on_map] = self._cell_index[cells[on_map, 0], cells[on_map, 1]]
+
+		gap = np.abs(np.angle(np.exp(1j * (np.asarray(orientations)[:, np.newaxis] - self._headings))))
+		headings = np.argmin(gap, axis=1)
+
+		ranges = np.empty((positions.shape[0], self._angle_offsets.shape[0]))
+		found = indexes >= 0
+		ranges[found] = self._table[indexes[found], headings[found]] * (self._max_range / RANGE_STEPS)
+		if not np.all(found):
+			missing = np.where(~found)[0]
+			origins = np.repeat(positions[missing], self._angle_offsets.shape[0], axis=0)
+			angles = (np.asarray(orientations)[missing, np.newaxis] + self._angle_offsets).ravel()
+			ranges[missing] = Geometry.marchRays(
+				self._area_map, origins, angles, self._max_range, self._threshold
+			).reshape(-1, self._angle_offsets.shape[0])
+		return ranges
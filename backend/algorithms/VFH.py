@@ -22,9 +22,145 @@ data representation are created:
 
 """
 
-from typing import Dict
+from typing import Dict, List, Tuple
+from collections import OrderedDict
+import time
 import numpy as np
-from scipy import signal
+from scipy import signal, ndimage
+from backend.algorithms import LogOdds
+from backend.algorithms.VoxelMap import VoxelMap
+from backend.algorithms.MapStore import TiledMap
+
+
+class SensorModelCache:
+	"""
+	A Least Recently Used cache of inverse sensor model kernels.
+	"""
+
+	def __init__(self, maxSize: int = 256):
+		"""
+		Each kernel holds only the cells of the active window laying inside a beam wedge, as flat indexes, together with
+		their emptiness and normalized occupancy values, so a reading can be stamped as a sparse patch.
+
+		:param maxSize: Maximum amount of kernels to keep.
+		:type maxSize: int
+		"""
+		self._maxSize = maxSize
+		self._kernels = OrderedDict()
+		self._hits = 0
+		self._misses = 0
+
+	def get(self, key: Tuple):
+		"""
+		Returns the kernel stored under *key*, refreshing it as the most recently used.
+
+		:param key: The kernel key.
+		:type key: Tuple
+		:return: The kernel, or None if it is not cached.
+		"""
+		kernel = self._kernels.get(key)
+		if kernel is None:
+			self._misses += 1
+		else:
+			self._hits += 1
+			self._kernels.move_to_end(key)
+		return kernel
+
+	def put(self, key: Tuple, kernel: Tuple):
+		"""
+		Stores a kernel, evicting the least recently used one if the cache is full.
+
+		:param key: The kernel key.
+		:type key: Tuple
+		:param kernel: The kernel, as (indexes, emptiness, occupancy).
+		:type kernel: Tuple
+		"""
+		self._kernels[key] = kernel
+		self._kernels.move_to_end(key)
+		if len(self._kernels) > self._maxSize:
+			self._kernels.popitem(last=False)
+
+	def clear(self):
+		"""
+		Removes every kernel and resets the counters.
+		"""
+		self._kernels.clear()
+		self._hits = 0
+		self._misses = 0
+
+	def getSize(self) -> int:
+		return len(self._kernels)
+
+	def getMaxSize(self) -> int:
+		return self._maxSize
+
+	def getHits(self) -> int:
+		return self._hits
+
+	def getMisses(self) -> int:
+		return self._misses
+
+	def getHitRate(self) -> float:
+		"""
+		Returns the ratio of lookups served from the cache.
+
+		:return: hits / lookups, 0 if there were no lookups yet.
+		"""
+		lookups = self._hits + self._misses
+		return self._hits / lookups if lookups else 0.0
+
+
+class HeadingMemo(SensorModelCache):
+	"""
+	A Least Recently Used cache of heading decisions, keyed by the quantized inputs they were computed from.
+	"""
+
+	def __init__(self, maxSize: int = 64, resolution: float = 5.0):
+		"""
+		Decisions are only valid for the map they were computed on, so the whole memo is dropped whenever the version of
+		the Histogram Grid changes.
+
+		:param maxSize: Maximum amount of decisions to keep.
+		:type maxSize: int
+		:param resolution: Size, in cm, of the bins the sensor readings are quantized to.
+		:type resolution: float
+		"""
+		super().__init__(maxSize)
+		self._resolution = resolution
+		self._mapVersion = None
+
+	def getResolution(self) -> float:
+		return self._resolution
+
+	def computeKey(self, readings: Dict, droneHeading: int, location: np.ndarray, target: np.ndarray,
+	               hm: int, Vmax: int) -> Tuple:
+		"""
+		Builds the key of a decision from its inputs.
+
+		:param readings: The sensor readings, as {angle: dst}.
+		:type readings: Dict
+		:param droneHeading: the heading of the drone.
+		:type droneHeading: int
+		:param location: the position of the drone on the full map.
+		:type location: np.ndarray
+		:param target: the position of the target on the full map.
+		:type target: np.ndarray
+		:return: The key.
+		"""
+		quantized = tuple(sorted((angle, int(distance // self._resolution)) for angle, distance in readings.items()))
+		return (quantized, int(round(droneHeading)), tuple(np.floor(location).astype(int)),
+		        tuple(np.asarray(target).tolist()), hm, Vmax)
+
+	def validate(self, mapVersion: int):
+		"""
+		Drops every decision if the map changed since they were computed. Counters are kept.
+
+		:param mapVersion: The current version of the Histogram Grid.
+		:type mapVersion: int
+		"""
+		if mapVersion != self._mapVersion:
+			self._kernels.clear()
+			self._mapVersion = mapVersion
 
 
 class HistogramGrid:
@@ -33,7 +169,9 @@ class HistogramGrid:
 	"""
 
 	def __init__(self, sensorsMeasurements: Dict, Rmax: int, Rmin: int, Ru: int, fullMap: np.ndarray, windowSize: int = 141, cellSize: int = 5,
-	             epsilon: float = 0.5, omega: int = 30):
+	             epsilon: float = 0.5, omega: int = 30, batched: bool = False, kernelCacheSize: int = 0,
+	             rangeResolution: float = 0.25, angleResolution: float = 1.0, scrolling: bool = False,
+	             logOdds=None, logOddsScale: int = None):
 		"""
 		Constructor method for Cartesian Histogram Grid.
 
@@ -45,7 +183,8 @@ class HistogramGrid:
 		:type Rmin: int
 		:param Ru: measurement threshold. Under it, is considered safe to navigate.
 		:type Ru: int
-		:param fullMap: The map representing the full area.
+		:param fullMap: The map representing the full area. A *TiledMap* can be used for areas too big for the memory,
+		 or to let stale occupancy decay. A *VoxelMap* keeps obstacles apart by altitude, see *setAltitude*.
 		:type fullMap: np.ndarray
 		:param windowSize: Size of the, square, window that *follows* the robot.
 		:type windowSize: int
@@ -55,6 +194,23 @@ class HistogramGrid:
 		:type epsilon: float, optional
 		:param omega: Optional, defaults to 30. Beam aperture in deg.
 		:type omega: int
+		:param batched: Optional, defaults to False. Computes every sensor reading at once on a single broadcast pass.
+		:type batched: bool
+		:param kernelCacheSize: Optional, defaults to 0 (disabled). Amount of inverse sensor model kernels to cache. When
+		 enabled, readings are stamped into the window as sparse patches.
+		:type kernelCacheSize: int
+		:param rangeResolution: Optional, defaults to 0.25. Size, in cells, of the range bins the kernels are keyed by.
+		:type rangeResolution: float
+		:param angleResolution: Optional, defaults to 1. Size, in deg, of the beam angle bins the kernels are keyed by.
+		:type angleResolution: float
+		:param scrolling: Optional, defaults to False. The window is kept as a circular buffer that scrolls along with the
+		 drone, so only the strips entering and leaving it are loaded from and flushed to the full map.
+		:type scrolling: bool
+		:param logOdds: Optional, defaults to None (disabled). Integer type, np.int8 or np.int16, to hold the window as
+		 saturating fixed-point log-odds instead of float emptiness and occupancy. The full map must hold log-odds too.
+		 Readings are then stamped from cached kernels as integer adds.
+		:param logOddsScale: Optional. Steps per unit of log-odds. Defaults to *LogOdds.getLogOddsScale(logOdds)*.
+		:type logOddsScale: int
 
 		"""
 		self._sensorsMeasurements = sensorsMeasurements
@@ -65,13 +221,42 @@ class HistogramGrid:
 		self._cellSize = cellSize
 		self._epsilon = epsilon
 		self._omega = omega
+		self._batched = batched
+		if logOdds is not None and kernelCacheSize <= 0:
+			kernelCacheSize = SensorModelCache().getMaxSize()
+		self._kernelCache = SensorModelCache(kernelCacheSize) if kernelCacheSize > 0 else None
+		self._rangeResolution = rangeResolution
+		self._angleResolution = angleResolution
 		self._windowDronePos = np.array([self._windowSize//2, self._windowSize//2])
 		self._fullMap = fullMap
 		self._window = self.getWindow()
-		self._deltas = self.computeDistances()
-		self._angles = self.computeAngles()
-		self._emptiness = self.resetWindow()
-		self._occupiness = self.resetWindow()
+		self._gridDeltas = self.computeDistances()
+		self._gridAngles = self.computeAngles()
+		self._deltas = self._gridDeltas
+		self._angles = self._gridAngles
+		self._logOdds = None
+		if logOdds is None:
+			self._emptiness = self.resetWindow()
+			self._occupiness = self.resetWindow()
+		else:
+			self._logOddsScale = logOddsScale or LogOdds.getLogOddsScale(logOdds)
+			self._readoutTable = LogOdds.getReadoutTable(logOdds, self._logOddsScale)
+			self._logOdds = np.zeros((self._windowSize, self._windowSize), dtype=logOdds)
+			self._emptiness = None
+			self._occupiness = None
+		self._touchedCells = None
+		self._touchedCount = 0
+		self._decayStamp = None
+		self._scrolling = scrolling
+		self._windowLocation = None
+		self._scrollOffset = np.array([0, 0])
+		self._mapVersion = 0
+		self._lastLocation = None
+		self._mapListeners = []
+		self._band = None
+		if scrolling:
+			self._tiledDeltas = np.tile(self._gridDeltas, (2, 2))
+			self._tiledAngles = np.tile(self._gridAngles, (2, 2))
 
 	def resetWindow(self) -> np.ndarray:
 		return np.zeros((self._windowSize, self._windowSize))
@@ -144,6 +329,190 @@ class HistogramGrid:
 		"""
 		self._sensorsMeasurements = sensorMeasurements
 
+	def getSensorsArrays(self) -> (np.ndarray, np.ndarray):
+		"""
+		Returns the sensor measurements as a pair of arrays, so they can be broadcasted.
+
+		:return: the angles and the distances of the sensors, on the same order.
+		"""
+		measurements = self.getSensorsMeasurements()
+		angles = np.fromiter(measurements.keys(), dtype=float, count=len(measurements))
+		distances = np.fromiter(measurements.values(), dtype=float, count=len(measurements))
+		return angles, distances
+
+	def isBatched(self) -> bool:
+		"""
+		Returns whether the readings are computed all at once.
+
+		:return: True if the batched mode is on.
+		"""
+		return self._batched
+
+	def getKernelCache(self) -> SensorModelCache:
+		"""
+		Returns the inverse sensor model kernel cache.
+
+		:return: the cache, None if disabled.
+		"""
+		return self._kernelCache
+
+	def isScrolling(self) -> bool:
+		"""
+		Returns whether the window scrolls as a circular buffer.
+
+		:return: True if the scrolling mode is on.
+		"""
+		return self._scrolling
+
+	def getWindowLocation(self) -> np.ndarray:
+		"""
+		Returns the location on the full map the window is centered at, when scrolling.
+
+		:return: the location, None if the window has not been placed yet.
+		"""
+		return self._windowLocation
+
+	def getScrollOffset(self) -> np.ndarray:
+		"""
+		Returns the offset of the circular buffer. The cell (i, j) of the window is stored at
+		((i + offset[0]) % windowSize, (j + offset[1]) % windowSize).
+
+		:return: the offset
+		"""
+		return self._scrollOffset
+
+	def getMapVersion(self) -> int:
+		"""
+		Returns the version of the map. It changes whenever the map may have changed: *computeMap* fused readings or
+		moved the window, or *notifyMapChange* was called.
+
+		:return: The map version.
+		"""
+		return self._mapVersion
+
+	def notifyMapChange(self):
+		"""
+		Records the map changed, e.g. the full map was edited outside *computeMap*.
+		"""
+		self._mapVersion += 1
+
+	def addMapListener(self, listener):
+		"""
+		Registers a callable to be told about every region of the full map written, as *listener(begin, end)*.
+
+		:param listener: The callable.
+		"""
+		self._mapListeners.append(listener)
+
+	def markDirtyRegion(self, begin: np.ndarray, end: np.ndarray):
+		"""
+		Tells every map listener a region of the full map was written.
+
+		:param begin: Begin point of the region on the full map.
+		:type begin: np.ndarray
+		:param end: End point of the region on the full map.
+		:type end: np.ndarray
+		"""
+		for listener in self._mapListeners:
+			listener(begin, end)
+
+	def trackLocation(self, location: np.ndarray):
+		"""
+		Records the location the map is computed at, changing the map version if the window moved or there are readings
+		to fuse into it.
+
+		:param location: The location of the drone on the Histogram Grid.
+		:type location: np.ndarray
+		"""
+		moved = self._lastLocation is None or np.any(self._lastLocation != location)
+		if moved:
+			self._lastLocation = np.array(location)
+		if moved or self.getSensorsMeasurements():
+			self.notifyMapChange()
+
+	def decayWindow(self):
+		"""
+		Applies on the window the decay due on a decaying *TiledMap* full map. The window is a copy of the cells under
+		it, which is written back over them, so they would never decay while the drone stays over them otherwise. Cells
+		loaded later on are already decayed by the map, so it's applied before the window moves.
+		"""
+		if not isinstance(self._fullMap, TiledMap) or not self._fullMap.isDecaying():
+			return
+
+		window = self._logOdds if self._logOdds is not None else self._occupiness
+		self._decayStamp, changed = self._fullMap.decayValues(window, self._decayStamp)
+		if changed:
+			self.markTouchedCells()
+			self.notifyMapChange()
+
+	def setAltitude(self, altitude: float):
+		"""
+		Sets the altitude of the drone on a *VoxelMap* full map. The window is flushed to the layer it was loaded from
+		and loaded again from the new one, so its readings never end up on another layer. Other maps have no altitude.
+
+		:param altitude: The altitude, in cm.
+		:type altitude: float
+		"""
+		if not isinstance(self._fullMap, VoxelMap) or self._fullMap.getLayerAt(altitude) == self._fullMap.getLayer():
+			return
+
+		full = range(self._windowSize)
+		self.flushWindow()
+		self._fullMap.setAltitude(altitude)
+		if self._lastLocation is not None:
+			self.loadWindowRegion(full, full)
+		self.markTouchedCells()
+		self.updateBand()
+		self.notifyMapChange()
+		# The projection of the band changed all over the map
+		self.markDirtyRegion(np.array([0, 0]), np.array(self._fullMap.shape))
+
+	def hasBand(self) -> bool:
+		"""
+		Returns whether the occupancy read by the Polar Histogram takes into account a band of layers around the
+		current one, from a *VoxelMap* full map.
+
+		:return: True if the band holds more layers than the current one.
+		"""
+		return isinstance(self._fullMap, VoxelMap) and len(self._fullMap.getLayers()) > 1
+
+	def updateBand(self):
+		"""
+		Reads again the occupancy of the band around the window if the window moved, the altitude changed or any other
+		layer of the band was written since the last read. The whole window is then taken as touched.
+		"""
+		if not self.hasBand() or self._lastLocation is None:
+			self._band = None
+			return
+
+		layers = self._fullMap.getLayers()
+		layer = self._fullMap.getLayer()
+		key = (tuple(self._lastLocation), layer, layers.start, layers.stop,
+		       tuple(self._fullMap.getLayerVersion(other) for other in layers if other != layer))
+		if self._band is not None and self._band[0] == key:
+			return
+
+		band = np.zeros((self._windowSize, self._windowSize))
+		region = self.getWindowRegion(range(self._windowSize), range(self._windowSize))
+		if region is not None:
+			begin_map, end_map, _ = region
+			origin = self._lastLocation - self._windowSize // 2
+			values = self._fullMap.readBandOccupancy(begin_map, end_map)
+			if self._logOdds is not None:
+				values = LogOdds.readLogOdds(values.astype(self._logOdds.dtype), self._readoutTable)
+			band[begin_map[0] - origin[0]:end_map[0] - origin[0], begin_map[1] - origin[1]:end_map[1] - origin[1]] = \
+				np.maximum(values, 0)
+		self._band = (key, self.getBufferLayout(band))
+		self.markTouchedCells()
+
+	def getBandOccupancy(self) -> np.ndarray:
+		"""
+		Returns the occupancy of the band around the current layer, laid out as the window buffer.
+
+		:return: The occupancy, or None if there's no band.
+		"""
+		return None if self._band is None else self._band[1]
+
 	def getEpsilon(self) -> float:
 		"""
 		Returns the approximate deviance of the sonar readings in number of cells.
@@ -176,13 +545,112 @@ class HistogramGrid:
 		"""
 		return self._windowSize
 
+	def getFullMap(self) -> np.ndarray:
+		"""
+		Returns the map of the full area.
+
+		:return: the full map
+		"""
+		return self._fullMap
+
 	def getOcpWindow(self) -> np.ndarray:
 		"""
-		Returns the occupancy window
+		Returns the occupancy window. On log-odds mode it's read from the log-odds window.
 
 		:return: the occupancy window
 		"""
-		return self._occupiness
+		band = self.getBandOccupancy()
+		if self._logOdds is not None:
+			ocp_window = np.maximum(self.readLogOddsWindow(), 0)
+		else:
+			ocp_window = self._occupiness
+		return ocp_window if band is None else np.maximum(ocp_window, band)
+
+	def getEmptWindow(self) -> np.ndarray:
+		"""
+		Returns the emptiness window. On log-odds mode it's read from the log-odds window.
+
+		:return: the emptiness window
+		"""
+		if self._logOdds is not None:
+			return np.maximum(-self.readLogOddsWindow(), 0)
+		return self._emptiness
+
+	def isOcpWindowShared(self) -> bool:
+		"""
+		Returns whether *getOcpWindow* returns the occupancy window itself, so changes made on it are kept.
+
+		:return: True unless the log-odds mode is on, or the occupancy of a band of layers is added to the window.
+		"""
+		return self._logOdds is None and self._band is None
+
+	def getOcpCells(self, idx: np.ndarray) -> np.ndarray:
+		"""
+		Returns the occupancy of some cells of the window.
+
+		:param idx: Flat indexes of the cells on the buffer.
+		:type idx: np.ndarray
+		:return: the occupancy of the cells
+		"""
+		band = self.getBandOccupancy()
+		if self._logOdds is not None:
+			ocp = np.maximum(LogOdds.readLogOdds(self._logOdds.reshape(-1)[idx], self._readoutTable), 0)
+		else:
+			ocp = self._occupiness.reshape(-1)[idx]
+		return ocp if band is None else np.maximum(ocp, band.reshape(-1)[idx])
+
+	def markTouchedCells(self, idx: np.ndarray = None):
+		"""
+		Records the cells of the window changed since the last *popTouchedCells*. Once more cells than the window holds
+		are recorded, the whole window is taken as touched, so the record stays bounded.
+
+		:param idx: Flat indexes of the cells on the buffer. None marks the whole window.
+		:type idx: np.ndarray
+		"""
+		if idx is None or self._touchedCells is None:
+			self._touchedCells = None
+			return
+		self._touchedCells.append(idx)
+		self._touchedCount += idx.size
+		if self._touchedCount >= self._windowSize ** 2:
+			self._touchedCells = None
+
+	def popTouchedCells(self) -> np.ndarray:
+		"""
+		Returns the cells of the window changed since the last call, and starts a new record.
+
+		:return: Unique flat indexes of the cells on the buffer, or None if the whole window may have changed.
+		"""
+		touched = self._touchedCells
+		self._touchedCells = []
+		self._touchedCount = 0
+		if touched is None:
+			return None
+		return np.unique(np.concatenate(touched)) if touched else np.array([], dtype=np.intp)
+
+	def isLogOdds(self) -> bool:
+		"""
+		Returns whether the window is held as fixed-point log-odds.
+
+		:return: True if the log-odds mode is on.
+		"""
+		return self._logOdds is not None
+
+	def getLogOddsWindow(self) -> np.ndarray:
+		"""
+		Returns the log-odds window
+
+		:return: the log-odds window, None if the log-odds mode is off.
+		"""
+		return self._logOdds
+
+	def readLogOddsWindow(self) -> np.ndarray:
+		"""
+		Reads the log-odds window as signed certainties, positive for occupancy and negative for emptiness.
+
+		:return: the certainties window
+		"""
+		return LogOdds.readLogOdds(self._logOdds, self._readoutTable)
 
 	def computeEmptiness(self, droneHeading: int) -> np.ndarray:
 		"""
@@ -254,6 +722,393 @@ class HistogramGrid:
 
 		return ang_window
 
+	def computeBeamAngles(self, droneHeading: int, angles: np.ndarray) -> np.ndarray:
+		"""
+		Computes the angle from every beam bisector to each cell on the active window.
+
+		:param droneHeading: Heading of the drone.
+		:type droneHeading: int
+		:param angles: The angles of the sensors, in deg.
+		:type angles: np.ndarray
+		:return: A (sensors * windowSize * windowSize) matrix of angles.
+		"""
+
+		theta = self._angles - np.deg2rad(droneHeading) - np.deg2rad(angles)[:, np.newaxis, np.newaxis]
+		theta[theta >= np.pi] -= np.pi * 2
+		return theta
+
+	def computeBatchedAngularOccupancy(self, droneHeading: int, angles: np.ndarray) -> np.ndarray:
+		"""
+		Computes the vicinity to the center of the beam of every sensor, each one on its own layer.
+
+		:param droneHeading: Heading of the drone.
+		:type droneHeading: int
+		:param angles: The angles of the sensors, in deg.
+		:type angles: np.ndarray
+		:return: A (sensors * windowSize * windowSize) matrix containing vicinity to the center of the beam chances.
+		"""
+
+		theta = self.computeBeamAngles(droneHeading, angles)
+		effective_angle = np.deg2rad(self._omega/2.0)
+		return np.where(
+			(-effective_angle < theta) & (theta < effective_angle),
+			1 - (2 * theta / self._omega) ** 2,
+			0
+		)
+
+	def computeBatchedEmptiness(self, droneHeading: int) -> np.ndarray:
+		"""
+		Computes emptiness for every sensor reading on a single broadcast pass. Each reading is weighted only by its own
+		beam, and all of them are fused the same way *computeEmptiness* does, as p + q - p*q.
+
+		:param droneHeading: Heading of the drone.
+		:type droneHeading: int
+		:return: A Histogram Grid containing emptiness chances.
+		"""
+
+		angles, distances = self.getSensorsArrays()
+		if distances.size == 0:
+			return self._emptiness
+
+		R = (distances / self._cellSize)[:, np.newaxis, np.newaxis]
+		with np.errstate(divide='ignore', invalid='ignore'):
+			empt_windows = np.where(
+				(self._Rmin <= self._deltas) & (self._deltas <= R - self._epsilon),
+				1 - ((self._deltas - self._Rmin) / (R - self._epsilon - self._Rmin)) ** 2,
+				0
+			)
+		empt_windows *= self.computeBatchedAngularOccupancy(droneHeading, angles)
+		self._emptiness[...] = 1 - (1 - self._emptiness) * np.prod(1 - empt_windows, axis=0)
+
+		return self._emptiness
+
+	def computeBatchedOccupancy(self, droneHeading: int) -> np.ndarray:
+		"""
+		Computes occupancy for every sensor reading on a single broadcast pass. Each reading is weighted only by its own
+		beam, normalized and fused the same way *computeOccupancy* does.
+
+		:param droneHeading: Heading of the drone.
+		:type droneHeading: int
+		:return: A Histogram Grid containing occupancy chances.
+		"""
+
+		angles, distances = self.getSensorsArrays()
+		if distances.size == 0:
+			return self._occupiness
+
+		R = (distances / self._cellSize)[:, np.newaxis, np.newaxis]
+		ocp_windows = np.where(
+			(R - self._epsilon <= self._deltas) & (self._deltas <= R + self._epsilon),
+			1 - ((self._deltas - R) / self._epsilon) ** 2,
+			0
+		)
+		ocp_windows *= self.computeBatchedAngularOccupancy(droneHeading, angles)
+		norm = ocp_windows.sum(axis=(1, 2))
+		norm[norm == 0] = 1
+		ocp_windows *= (1 - self._emptiness) / norm[:, np.newaxis, np.newaxis]
+		self._occupiness[...] = 1 - (1 - self._occupiness) * np.prod(1 - ocp_windows, axis=0)
+
+		return self._occupiness
+
+	def toBufferIndexes(self, idx: np.ndarray) -> np.ndarray:
+		"""
+		Translates flat indexes of the window to flat indexes of the circular buffer holding it.
+
+		:param idx: Flat indexes on the window.
+		:type idx: np.ndarray
+		:return: Flat indexes on the buffer.
+		"""
+		if not np.any(self._scrollOffset):
+			return idx
+		rows, cols = np.divmod(idx, self._windowSize)
+		return ((rows + self._scrollOffset[0]) % self._windowSize) * self._windowSize \
+			+ (cols + self._scrollOffset[1]) % self._windowSize
+
+	def getBufferLayout(self, window: np.ndarray) -> np.ndarray:
+		"""
+		Lays a window out as the circular buffer holding it.
+
+		:param window: A (windowSize * windowSize) matrix.
+		:type window: np.ndarray
+		:return: The matrix, rolled by the scroll offset.
+		"""
+		if not np.any(self._scrollOffset):
+			return window
+		return np.roll(window, tuple(self._scrollOffset), axis=(0, 1))
+
+	def getWindowLayout(self, buffer: np.ndarray) -> np.ndarray:
+		"""
+		Lays a circular buffer out as the window it holds. It undoes *getBufferLayout*.
+
+		:param buffer: A (windowSize * windowSize) matrix laid out as the buffer.
+		:type buffer: np.ndarray
+		:return: The matrix, rolled back by the scroll offset.
+		"""
+		if not np.any(self._scrollOffset):
+			return buffer
+		return np.roll(buffer, tuple(-self._scrollOffset), axis=(0, 1))
+
+	def updateBufferLayout(self):
+		"""
+		Points the distances and angles at the layout of the circular buffer. It takes a view of the tiled geometry, so
+		no copy is made.
+		"""
+		begin = self._windowSize - self._scrollOffset
+		end = begin + self._windowSize
+		self._deltas = self._tiledDeltas[begin[0]:end[0], begin[1]:end[1]]
+		self._angles = self._tiledAngles[begin[0]:end[0], begin[1]:end[1]]
+
+	def getWindowRegion(self, rows: range, cols: range) -> Tuple:
+		"""
+		Locates a rectangular region of the window both on the full map and on the circular buffer. The region is
+		clipped to the full map bounds.
+
+		:param rows: Rows of the window.
+		:type rows: range
+		:param cols: Columns of the window.
+		:type cols: range
+		:return: The begin and end points on the full map and the cells of the buffer, or None if out of the map.
+		"""
+		location = self._windowLocation if self._windowLocation is not None else self._lastLocation
+		origin = location - self._windowSize // 2
+		begin_map = np.maximum(origin + [rows.start, cols.start], 0)
+		end_map = np.minimum(origin + [rows.stop, cols.stop], self._fullMap.shape[:2])
+		if np.any(end_map <= begin_map):
+			return None
+
+		cells = np.ix_(
+			(np.arange(begin_map[0], end_map[0]) - origin[0] + self._scrollOffset[0]) % self._windowSize,
+			(np.arange(begin_map[1], end_map[1]) - origin[1] + self._scrollOffset[1]) % self._windowSize
+		)
+		return begin_map, end_map, cells
+
+	def loadWindowRegion(self, rows: range, cols: range):
+		"""
+		Loads a region of the window from the full map. Positive values are read as occupancy and negative ones as
+		emptiness. Cells out of the map are left empty. On a *VoxelMap* only the current layer is read, the one the
+		window is flushed to.
+
+		:param rows: Rows of the window.
+		:type rows: range
+		:param cols: Columns of the window.
+		:type cols: range
+		"""
+		cells = np.ix_(
+			(np.array(rows) + self._scrollOffset[0]) % self._windowSize,
+			(np.array(cols) + self._scrollOffset[1]) % self._windowSize
+		)
+		if self._logOdds is not None:
+			self._logOdds[cells] = 0
+		else:
+			self._emptiness[cells] = 0
+			self._occupiness[cells] = 0
+
+		region = self.getWindowRegion(rows, cols)
+		if region is None:
+			return
+		begin_map, end_map, cells = region
+		if isinstance(self._fullMap, VoxelMap):
+			values = self._fullMap.readLayer(begin_map, end_map)
+		else:
+			values = self._fullMap[begin_map[0]:end_map[0], begin_map[1]:end_map[1]]
+		if self._logOdds is not None:
+			self._logOdds[cells] = values
+			return
+		values = np.asarray(values, dtype=float)
+		self._occupiness[cells] = np.maximum(values, 0)
+		self._emptiness[cells] = np.maximum(-values, 0)
+
+	def flushWindowRegion(self, rows: range, cols: range):
+		"""
+		Writes a region of the window on the full map, the same way *computeMap* does.
+
+		:param rows: Rows of the window.
+		:type rows: range
+		:param cols: Columns of the window.
+		:type cols: range
+		"""
+		region = self.getWindowRegion(rows, cols)
+		if region is None:
+			return
+		begin_map, end_map, cells = region
+		self.markDirtyRegion(begin_map, end_map)
+		if self._logOdds is not None:
+			self._fullMap[begin_map[0]:end_map[0], begin_map[1]:end_map[1]] = self._logOdds[cells]
+			return
+		ocp = self._occupiness[cells]
+		empt = self._emptiness[cells]
+		self._fullMap[begin_map[0]:end_map[0], begin_map[1]:end_map[1]] = np.where(ocp >= empt, ocp, -empt)
+
+	def flushWindow(self):
+		"""
+		Writes the whole scrolling window on the full map.
+		"""
+		if self._windowLocation is not None:
+			self.flushWindowRegion(range(self._windowSize), range(self._windowSize))
+
+	def scrollWindow(self, location: np.ndarray):
+		"""
+		Re-centers the scrolling window at **location**. The strips leaving the window are flushed to the full map and
+		the ones entering it are loaded from it, by moving the offset of the circular buffer. If the jump is as big as
+		the window, the whole window is flushed and reloaded.
+
+		:param location: The location of the drone on the Histogram Grid.
+		:type location: np.ndarray
+		"""
+
+		location = np.array(location, dtype=int)
+		full = range(self._windowSize)
+		if self._windowLocation is None or np.any(np.abs(location - self._windowLocation) >= self._windowSize):
+			self.flushWindow()
+			self.markTouchedCells()
+			self._windowLocation = location
+			self._scrollOffset[:] = 0
+			self.updateBufferLayout()
+			self.loadWindowRegion(full, full)
+			return
+
+		shift = location - self._windowLocation
+		if np.any(shift):
+			self.markTouchedCells()
+		for axis in (0, 1):
+			d = shift[axis]
+			if d == 0:
+				continue
+			leaving = range(0, d) if d > 0 else range(self._windowSize + d, self._windowSize)
+			entering = range(self._windowSize - d, self._windowSize) if d > 0 else range(0, -d)
+
+			self.flushWindowRegion(*((leaving, full) if axis == 0 else (full, leaving)))
+			self._windowLocation[axis] += d
+			self._scrollOffset[axis] = (self._scrollOffset[axis] + d) % self._windowSize
+			self.loadWindowRegion(*((entering, full) if axis == 0 else (full, entering)))
+
+		self.updateBufferLayout()
+
+	def computeKernel(self, R: float, beamAngle: float) -> Tuple:
+		"""
+		Computes the inverse sensor model of a single reading, keeping only the cells inside the beam wedge.
+
+		:param R: The reading, in cells.
+		:type R: float
+		:param beamAngle: The absolute angle of the beam bisector, in deg.
+		:type beamAngle: float
+		:return: The flat indexes of the cells on the window, their emptiness and their occupancy, already normalized.
+		"""
+
+		theta = (self._gridAngles - np.deg2rad(beamAngle) + np.pi) % (np.pi * 2) - np.pi
+		effective_angle = np.deg2rad(self._omega/2.0)
+		wedge = (-effective_angle < theta) & (theta < effective_angle) & (self._gridDeltas <= R + self._epsilon)
+		idx = np.flatnonzero(wedge)
+
+		deltas = self._gridDeltas.ravel()[idx]
+		ang = 1 - (2 * theta.ravel()[idx] / self._omega) ** 2
+		with np.errstate(divide='ignore', invalid='ignore'):
+			empt = np.where(
+				(self._Rmin <= deltas) & (deltas <= R - self._epsilon),
+				1 - ((deltas - self._Rmin) / (R - self._epsilon - self._Rmin)) ** 2,
+				0
+			) * ang
+		ocp = np.where(
+			R - self._epsilon <= deltas,
+			1 - ((deltas - R) / self._epsilon) ** 2,
+			0
+		) * ang
+		norm = ocp.sum()
+		ocp /= norm if norm != 0 else 1
+
+		keep = (empt != 0) | (ocp != 0)
+		return idx[keep], empt[keep], ocp[keep]
+
+	def getKernel(self, distance: float, beamAngle: float) -> Tuple:
+		"""
+		Returns the kernel of a reading from the cache, computing it on a miss. The reading is quantized to the range and
+		angle resolutions first.
+
+		:param distance: The reading, in cm.
+		:type distance: float
+		:param beamAngle: The absolute angle of the beam bisector, in deg.
+		:type beamAngle: float
+		:return: The flat indexes of the cells, their emptiness and their occupancy.
+		"""
+
+		range_bin = int(round(distance / self._cellSize / self._rangeResolution))
+		angle_bin = int(round((beamAngle % 360) / self._angleResolution))
+		key = (range_bin, angle_bin, self._epsilon, self._omega, self._cellSize)
+		kernel = self._kernelCache.get(key)
+		if kernel is None:
+			kernel = self.computeKernel(range_bin * self._rangeResolution, angle_bin * self._angleResolution)
+			self._kernelCache.put(key, kernel)
+
+		return kernel
+
+	def getLogOddsKernel(self, distance: float, beamAngle: float) -> Tuple:
+		"""
+		Returns the log-odds kernel of a reading from the cache, computing it on a miss. Each cell of the kernel holds the
+		log-odds of its occupancy minus the log-odds of its emptiness.
+
+		:param distance: The reading, in cm.
+		:type distance: float
+		:param beamAngle: The absolute angle of the beam bisector, in deg.
+		:type beamAngle: float
+		:return: The flat indexes of the cells and their log-odds.
+		"""
+
+		range_bin = int(round(distance / self._cellSize / self._rangeResolution))
+		angle_bin = int(round((beamAngle % 360) / self._angleResolution))
+		key = (range_bin, angle_bin, self._epsilon, self._omega, self._cellSize, self._logOdds.dtype, self._logOddsScale)
+		kernel = self._kernelCache.get(key)
+		if kernel is None:
+			idx, empt, ocp = self.computeKernel(range_bin * self._rangeResolution, angle_bin * self._angleResolution)
+			delta = LogOdds.toLogOdds(ocp, np.int32, self._logOddsScale) - \
+				LogOdds.toLogOdds(empt, np.int32, self._logOddsScale)
+			keep = delta != 0
+			kernel = (idx[keep], delta[keep])
+			self._kernelCache.put(key, kernel)
+
+		return kernel
+
+	def stampLogOdds(self, droneHeading: int) -> np.ndarray:
+		"""
+		Updates the log-odds window adding the cached log-odds kernel of every reading, as saturating integer adds.
+
+		:param droneHeading: Heading of the drone.
+		:type droneHeading: int
+		:return: The log-odds window.
+		"""
+
+		for angle, distance in self.getSensorsMeasurements().items():
+			idx, delta = self.getLogOddsKernel(distance, droneHeading + angle)
+			idx = self.toBufferIndexes(idx)
+			LogOdds.updateLogOdds(self._logOdds, idx, delta)
+			self.markTouchedCells(idx)
+
+		return self._logOdds
+
+	def stampReadings(self, droneHeading: int) -> (np.ndarray, np.ndarray):
+		"""
+		Updates emptiness and occupancy stamping the cached kernel of every reading into the active window. Every
+		emptiness patch is fused before the occupancy ones, as *computeMap* does.
+
+		:param droneHeading: Heading of the drone.
+		:type droneHeading: int
+		:return: The emptiness and the occupancy windows.
+		"""
+
+		kernels = []
+		for angle, distance in self.getSensorsMeasurements().items():
+			idx, empt, ocp = self.getKernel(distance, droneHeading + angle)
+			kernels.append((self.toBufferIndexes(idx), empt, ocp))
+		emptiness = self._emptiness.reshape(-1)
+		occupiness = self._occupiness.reshape(-1)
+		for idx, empt, _ in kernels:
+			emptiness[idx] += empt - emptiness[idx] * empt
+		for idx, _, ocp in kernels:
+			ocp = ocp * (1 - emptiness[idx])
+			occupiness[idx] += ocp - occupiness[idx] * ocp
+			self.markTouchedCells(idx)
+
+		return self._emptiness, self._occupiness
+
 	def computeMap(self, droneHeading: int, location: np.ndarray) -> np.ndarray:
 		"""
 		Computes the full Histogram Grid, making use of the active window, given by the drone's **location**
@@ -262,11 +1117,47 @@ class HistogramGrid:
 		:type droneHeading: int
 		:param location: The location of the drone on the Histogram Grid.
 		:type location: np.ndarray
-		:return: An numpy ndArray matrix representing the whole Histogram Grid.
+		:return: An numpy ndArray matrix representing the whole Histogram Grid. When scrolling, the area under the window
+		 is only written once it leaves the window or on *flushWindow*.
 		"""
 
-		tmp_empt = self.computeEmptiness(droneHeading)
-		tmp_ocp = self.computeOccupancy(droneHeading)
+		self.trackLocation(location)
+		self.decayWindow()
+		if self._scrolling:
+			self.scrollWindow(location)
+		self.updateBand()
+
+		if self._logOdds is not None:
+			tmp_window = self.stampLogOdds(droneHeading)
+		elif self._kernelCache is not None:
+			tmp_empt, tmp_ocp = self.stampReadings(droneHeading)
+		elif self._batched:
+			tmp_empt = self.computeBatchedEmptiness(droneHeading)
+			tmp_ocp = self.computeBatchedOccupancy(droneHeading)
+			self.markTouchedCells()
+		else:
+			tmp_empt = self.computeEmptiness(droneHeading)
+			tmp_ocp = self.computeOccupancy(droneHeading)
+			self.markTouchedCells()
+
+		if self._scrolling:
+			return self._fullMap
+
+		if self._logOdds is None:
+			tmp_window = np.where(tmp_ocp >= tmp_empt, tmp_ocp, -tmp_empt)
+
+		return self.writeWindow(tmp_window, location)
+
+	def writeWindow(self, window: np.ndarray, location: np.ndarray) -> np.ndarray:
+		"""
+		Writes a window on the full map, centered at the drone's **location**.
+
+		:param window: The window to write.
+		:type window: np.ndarray
+		:param location: The location of the drone on the Histogram Grid.
+		:type location: np.ndarray
+		:return: An numpy ndArray matrix representing the whole Histogram Grid.
+		"""
 
 		# Begin and End points on the fullMap to convolve the window
 		tmp_begin_map = location - self._windowSize // 2
@@ -286,22 +1177,152 @@ class HistogramGrid:
 		if np.any(over_idx):
 			end_window[over_idx] -= tmp_end_map[over_idx] - self._fullMap.shape[0]
 
-		# Finally the area of the map to be replaced by the computed occupancy/emptiness windows sits between begin_map
-		#  and end_map
-		ocp_idx = tmp_ocp[begin_window[0]:end_window[0], begin_window[1]:end_window[1]] >= \
-		          tmp_empt[begin_window[0]:end_window[0], begin_window[1]:end_window[1]]
+		# Finally the area of the map to be replaced by the window sits between begin_map and end_map.
+		#  It's written as a single region, so tiled maps can take it as well.
+		self._fullMap[begin_map[0]:end_map[0], begin_map[1]:end_map[1]] = \
+			window[begin_window[0]:end_window[0], begin_window[1]:end_window[1]]
+		self.markDirtyRegion(begin_map, end_map)
 
-		self._fullMap[begin_map[0]:end_map[0], begin_map[1]:end_map[1]][ocp_idx] = \
-			tmp_ocp[begin_window[0]:end_window[0], begin_window[1]:end_window[1]][ocp_idx]
+		return self._fullMap
 
-		self._fullMap[begin_map[0]:end_map[0], begin_map[1]:end_map[1]][np.logical_not(ocp_idx)] = \
-			-tmp_empt[begin_window[0]:end_window[0], begin_window[1]:end_window[1]][np.logical_not(ocp_idx)]
 
-		return self._fullMap
+class CertaintyGrid(HistogramGrid):
+	"""
+	A Cartesian Histogram Grid following the original VFH certainty values scheme.
+	"""
+
+	def __init__(self, sensorsMeasurements: Dict, Rmax: int, Rmin: int, Ru: int, fullMap: np.ndarray,
+	             windowSize: int = 141, cellSize: int = 5, increment: int = 3, decrement: int = 1):
+		"""
+		Constructor method for the Certainty Grid. Each cell holds a saturating uint8 certainty value. Every reading
+		increments the cell laying at the beam's axis and at the given distance, and decrements the cells laying on the
+		beam's axis between it and the drone. No floating-point maths are made per cell, so it fits long flights
+		where the probabilistic model is overkill.
+
+		:param sensorsMeasurements: contains all the measurements, as {angle: dst}, from the sensors as a dictionary.
+		:type sensorsMeasurements: Dict
+		:param Rmax: maximum distance for the sensors.
+		:type Rmax: int
+		:param Rmin: minimum distance for the sensors.
+		:type Rmin: int
+		:param Ru: measurement threshold. Under it, is considered safe to navigate.
+		:type Ru: int
+		:param fullMap: The map representing the full area. It should hold uint8 values.
+		:type fullMap: np.ndarray
+		:param windowSize: Size of the, square, window that *follows* the robot.
+		:type windowSize: int
+		:param cellSize: Side length of each cell in cm. Defaults to 5.
+		:type cellSize: int
+		:param increment: Optional, defaults to 3. Certainty added to the cell where the obstacle is.
+		:type increment: int
+		:param decrement: Optional, defaults to 1. Certainty taken from the cells between the drone and the obstacle.
+		:type decrement: int
+		"""
+		super().__init__(sensorsMeasurements, Rmax, Rmin, Ru, fullMap, windowSize=windowSize, cellSize=cellSize)
+		self._increment = increment
+		self._decrement = decrement
+		self._emptiness = None
+		self._occupiness = None
+		self._certainty = np.zeros((self._windowSize, self._windowSize), dtype=np.uint8)
+		self._rays = self.computeRays()
+
+	def computeRays(self) -> np.ndarray:
+		"""
+		Computes, for every integer angle, the flat indexes of the cells laying on a ray from the center of the active
+		window, one per cell of distance.
+
+		:return: A (360 * (windowSize//2 + 1)) matrix of flat indexes.
+		"""
+
+		radius = self._windowSize // 2
+		angles = np.deg2rad(np.arange(360))[:, np.newaxis]
+		steps = np.arange(radius + 1)
+		rows = np.clip(np.round(radius + np.sin(angles) * steps), 0, self._windowSize - 1).astype(np.int32)
+		cols = np.clip(np.round(radius + np.cos(angles) * steps), 0, self._windowSize - 1).astype(np.int32)
+		return rows * self._windowSize + cols
+
+	def getCertaintyWindow(self) -> np.ndarray:
+		"""
+		Returns the certainty values window
+
+		:return: the certainty values window
+		"""
+		return self._certainty
+
+	def getOcpWindow(self) -> np.ndarray:
+		"""
+		Returns the certainty values as the occupancy window, widened so they can be operated without overflowing.
+
+		:return: the occupancy window
+		"""
+		return self._certainty.astype(np.int32)
+
+	def isOcpWindowShared(self) -> bool:
+		return False
+
+	def getOcpCells(self, idx: np.ndarray) -> np.ndarray:
+		"""
+		Returns the certainty values of some cells of the window, widened as *getOcpWindow* does.
+
+		:param idx: Flat indexes of the cells.
+		:type idx: np.ndarray
+		:return: the certainty values of the cells
+		"""
+		return self._certainty.reshape(-1)[idx].astype(np.int32)
+
+	def updateCertainty(self, droneHeading: int) -> np.ndarray:
+		"""
+		Updates the certainty values with every reading.
+
+		:param droneHeading: Heading of the drone.
+		:type droneHeading: int
+		:return: The certainty values window.
+		"""
+
+		cells = self._certainty.reshape(-1)
+		radius = self._windowSize // 2
+		limit = np.iinfo(np.uint8).max - self._increment
+		for angle, distance in self.getSensorsMeasurements().items():
+			ray = self._rays[int(round(droneHeading + angle)) % 360]
+			R = int(distance // self._cellSize)
+			free = ray[1:min(R, radius + 1)]
+			cells[free] = np.where(cells[free] > self._decrement, cells[free] - self._decrement, 0)
+			self.markTouchedCells(free)
+			if self._Rmin <= R < min(self._Rmax, radius + 1):
+				cells[ray[R]] = min(cells[ray[R]], limit) + self._increment
+				self.markTouchedCells(ray[R:R + 1])
+
+		return self._certainty
+
+	def computeMap(self, droneHeading: int, location: np.ndarray) -> np.ndarray:
+		"""
+		Computes the full Certainty Grid, making use of the active window, given by the drone's **location**
+
+		:param droneHeading: Heading of the drone.
+		:type droneHeading: int
+		:param location: The location of the drone on the Histogram Grid.
+		:type location: np.ndarray
+		:return: An numpy ndArray matrix representing the whole Certainty Grid.
+		"""
+
+		self.trackLocation(location)
+		return self.writeWindow(self.updateCertainty(droneHeading), location)
 
 
 class PolarHistogram:
-	def __init__(self, histogrid: HistogramGrid, alpha: int = 5):
+	# Sector of every cell of the active window, shared by every Polar Histogram and keyed by (windowSize, alpha)
+	_sectorTables = {}
+	# Cell at the beam's bisector for every beam angle and distance, keyed by (windowSize, epsilon, angleResolution)
+	_cellTables = {}
+	# Distances and sectors of downsampled windows, keyed by (windowSize, factor, alpha)
+	_coarseTables = {}
+	# Normalized Hann smoothing kernels, keyed by their length
+	_smoothingKernels = {}
+	# Kernel length from which the smoothing is made through FFT instead of directly
+	FFT_SMOOTHING_LENGTH = 32
+
+	def __init__(self, histogrid: HistogramGrid, alpha: int = 5, angleResolution: float = 1.0,
+	             incremental: bool = False, refreshPeriod: int = 50):
 		"""
 		A Polar Histogram. This class provides a description of the agent's environment divided by sectors with *⍺* width.
 
@@ -309,30 +1330,102 @@ class PolarHistogram:
 		:type histogrid: HistogramGrid
 		:param alpha: The width of the sectors.
 		:type alpha: int
+		:param angleResolution: Size, in deg, of the beam angle bins used to find the cells at the beam's bisector.
+		:type angleResolution: float
+		:param incremental: Keeps the Polar Obstacle Density as running sums, updated only on the cells the Histogram
+		 Grid touched since the last call.
+		:type incremental: bool
+		:param refreshPeriod: On incremental mode, calls between full recomputes, to keep the sums from drifting.
+		:type refreshPeriod: int
 		"""
 		self._histogrid = histogrid
 		self._alpha = alpha
+		self._angleResolution = angleResolution
+		self._incremental = incremental
+		self._refreshPeriod = refreshPeriod
+		self._ticks = 0
+		self._POD = None
+		self._magnitude = None
+		self._sectorLayout = None
+		self._lastHits = np.array([], dtype=np.intp)
+
+	def getHistogrid(self) -> HistogramGrid:
+		return self._histogrid
 
 	def computeOccupancy(self, droneHeading: int) -> np.ndarray:
 		"""
 		Computes the VFH simpler occupancy of an active Window. Everytime a reading comes from a sensor, only the cell
-		laying at the beam's bisector and at the given distance increases its value.
-		:param droneHeading:
-		:return:
+		laying at the beam's bisector and at the given distance increases its value. Every reading is looked up at once
+		on the cached cell table.
+
+		:param droneHeading: the heading of the drone.
+		:type droneHeading: int
+		:return: The occupancy window.
 		"""
 		ocp_window = self._histogrid.getOcpWindow()
-		for angle, distance in self._histogrid.getSensorsMeasurements().items():
-			R = distance // self._histogrid.getCellSize()
-			dst_indexes = (R - self._histogrid.getEpsilon() <= self._histogrid.getDistances()) &\
-			              (self._histogrid.getDistances() <= R + self._histogrid.getEpsilon())
+		angles, distances = self._histogrid.getSensorsArrays()
+		idx = self.lookupCells(droneHeading + angles, distances // self._histogrid.getCellSize())
+		np.add.at(ocp_window.reshape(-1), self._histogrid.toBufferIndexes(idx), 1)
 
-			theta = self._histogrid.getAngles() - np.deg2rad(droneHeading) - np.deg2rad(angle)
-			theta[theta >= np.pi] -= np.pi * 2
-			idx = np.unravel_index(np.argmin(np.abs(theta) + np.logical_not(dst_indexes) * 999), theta.shape)
+		return ocp_window
 
-			ocp_window[idx] += 1
+	def computeWindowOccupancy(self, droneHeading: int) -> np.ndarray:
+		"""
+		Computes the VFH simpler occupancy, as *computeOccupancy* does, laid out as the window even when the Histogram
+		Grid is held on a circular buffer.
 
-		return ocp_window
+		:param droneHeading: the heading of the drone.
+		:type droneHeading: int
+		:return: The occupancy window.
+		"""
+
+		return self._histogrid.getWindowLayout(self.computeOccupancy(droneHeading))
+
+	def lookupCells(self, beamAngles: np.ndarray, ranges: np.ndarray) -> np.ndarray:
+		"""
+		Finds, for every reading at once, the cell laying at the beam's bisector and at the given distance, making use
+		of the cached cell table. Readings out of the active window are left out.
+
+		:param beamAngles: The absolute angles of the beam bisectors, in deg.
+		:type beamAngles: np.ndarray
+		:param ranges: The readings, in cells.
+		:type ranges: np.ndarray
+		:return: The flat indexes of the cells on the window.
+		"""
+
+		table = self.getCellTable()
+		bins = np.round(np.asarray(beamAngles) / self._angleResolution).astype(np.intp) % table.shape[0]
+		ranges = np.asarray(ranges).astype(np.intp)
+		on_window = (ranges >= 0) & (ranges < table.shape[1])
+		idx = table[bins[on_window], ranges[on_window]]
+
+		return idx[idx >= 0]
+
+	def getCellTable(self) -> np.ndarray:
+		"""
+		Returns the cell table: for every beam angle bin and every integer distance, the flat index of the cell, among
+		the ones at that distance ± epsilon, closest to the beam's bisector. It's computed once per
+		(windowSize, epsilon, angleResolution) and shared by every Polar Histogram.
+
+		:return: A (bins * distances) matrix of flat indexes, -1 where no cell lays at that distance.
+		"""
+
+		epsilon = self._histogrid.getEpsilon()
+		key = (self._histogrid.getWindowSize(), epsilon, self._angleResolution)
+		table = PolarHistogram._cellTables.get(key)
+		if table is None:
+			deltas = self._histogrid.computeDistances().ravel()
+			angles = self._histogrid.computeAngles().ravel()
+			bins = np.deg2rad(np.arange(int(round(360 / self._angleResolution))) * self._angleResolution)
+			table = np.full((bins.shape[0], int(deltas.max() + epsilon) + 1), -1, dtype=np.intp)
+			for R in range(table.shape[1]):
+				cells = np.flatnonzero((R - epsilon <= deltas) & (deltas <= R + epsilon))
+				if cells.size:
+					theta = np.abs((angles[cells] - bins[:, np.newaxis] + np.pi) % (np.pi * 2) - np.pi)
+					table[:, R] = cells[np.argmin(theta, axis=1)]
+			PolarHistogram._cellTables[key] = table
+
+		return table
 
 	def computeObstacleMagnitude(self, droneHeading: int, a: int = 5) -> np.ndarray:
 		"""
@@ -351,10 +1444,25 @@ class PolarHistogram:
 		:return: A magnitude grid.
 		"""
 
+		return self.computeCellsMagnitude(self.computeOccupancy(droneHeading), self._histogrid.getDistances(), a)
+
+	def computeCellsMagnitude(self, occupancy: np.ndarray, distances: np.ndarray, a: int = 5) -> np.ndarray:
+		"""
+		Computes the obstacle magnitude of some cells, given their occupancy and their distance to the drone.
+
+		:param occupancy: occupancy of the cells.
+		:type occupancy: np.ndarray
+		:param distances: distances of the cells.
+		:type distances: np.ndarray
+		:param a: force strength of the obstacles.
+		:type a: int
+		:return: The magnitude of the cells.
+		"""
+
 		b = a/self._histogrid.getWindowSize()
-		obstacle_magnitude = self.computeOccupancy(droneHeading) ** 2 \
+		obstacle_magnitude = occupancy ** 2 \
 		       * \
-		       (a - b * self._histogrid.getDistances())
+		       (a - b * distances)
 
 		return obstacle_magnitude
 
@@ -369,16 +1477,208 @@ class PolarHistogram:
 		:return: The obstacle density.
 		"""
 
-		n = 360//self._alpha
-		sector = self._histogrid.computeAngles()
-		sector[sector < 0] += np.pi * 2
-		sector //= np.deg2rad(self._alpha)
-		mij = self.computeObstacleMagnitude(droneHeading)
-		polar_obstacle_density = np.array([
-			mij[sector == s].sum() for s in range(n)
-		])
+		if self._incremental:
+			return self.updateObstacleDensity(droneHeading)
+		return self.computeObstacleDensities(droneHeading, [self._alpha])[0]
 
-		return polar_obstacle_density
+	def updateObstacleDensity(self, droneHeading: int) -> np.ndarray:
+		"""
+		Updates the running Obstacle Density. Only the cells touched by the Histogram Grid, and the ones at the beams'
+		bisectors, have their magnitude recomputed: the difference with the magnitude they had is added to their sector.
+		Every *refreshPeriod* calls, or whenever the whole window may have changed, it's fully recomputed.
+
+		:param droneHeading: the heading of the drone.
+		:type droneHeading: int
+		:return: The obstacle density.
+		"""
+
+		angles, distances = self._histogrid.getSensorsArrays()
+		hits = self._histogrid.toBufferIndexes(
+			self.lookupCells(droneHeading + angles, distances // self._histogrid.getCellSize())
+		)
+		shared = self._histogrid.isOcpWindowShared()
+		touched = self._histogrid.popTouchedCells()
+		self._ticks += 1
+
+		if self._POD is None or touched is None or self._ticks >= self._refreshPeriod:
+			ocp_window = self._histogrid.getOcpWindow()
+			np.add.at(ocp_window.reshape(-1), hits, 1)
+			self._magnitude = self.computeCellsMagnitude(ocp_window, self._histogrid.getDistances()).ravel()
+			self._sectorLayout = self._histogrid.getBufferLayout(self.getSectorTable()).ravel()
+			n = 360//self._alpha
+			self._POD = np.bincount(self._sectorLayout, weights=self._magnitude, minlength=n)[:n]
+			self._ticks = 0
+		else:
+			if shared:
+				np.add.at(self._histogrid.getOcpWindow().reshape(-1), hits, 1)
+				cells = np.union1d(touched, hits)
+				ocp = self._histogrid.getOcpCells(cells)
+			else:
+				# Bisector increments are not kept by the grid: the ones from the last call must be undone
+				cells = np.union1d(np.union1d(touched, hits), self._lastHits)
+				ocp = self._histogrid.getOcpCells(cells) + \
+					np.bincount(np.searchsorted(cells, hits), minlength=cells.size)
+			distances = self._histogrid.getDistances()
+			magnitude = self.computeCellsMagnitude(ocp, distances[np.unravel_index(cells, distances.shape)])
+			self._POD += np.bincount(
+				self._sectorLayout[cells], weights=magnitude - self._magnitude[cells], minlength=self._POD.size
+			)[:self._POD.size]
+			self._magnitude[cells] = magnitude
+
+		self._lastHits = hits
+		return self._POD.copy()
+
+	def computeObstacleDensities(self, droneHeading: int, alphas: List[int]) -> List[np.ndarray]:
+		"""
+		Computes the Obstacle Density for several angular resolutions, sharing the obstacle magnitudes. Each density is
+		reduced with a single weighted bincount over the cached sector table.
+
+		:param droneHeading: the heading of the drone.
+		:type droneHeading: int
+		:param alphas: the angular resolutions.
+		:type alphas: List[int]
+		:return: The obstacle density for every resolution.
+		"""
+
+		mij = self.computeObstacleMagnitude(droneHeading).ravel()
+		densities = []
+		for alpha in alphas:
+			n = int(360//alpha)
+			sector = self._histogrid.getBufferLayout(self.getSectorTable(alpha)).ravel()
+			densities.append(np.bincount(sector, weights=mij, minlength=n)[:n])
+
+		return densities
+
+	def getCoarseTables(self, factor: int, alpha: int) -> (np.ndarray, np.ndarray):
+		"""
+		Returns the distance, in cells, and the sector of the center of every block of a downsampled window. They're
+		computed once per (windowSize, factor, alpha).
+
+		:param factor: the side length of the blocks, in cells.
+		:type factor: int
+		:param alpha: the angular resolution.
+		:type alpha: int
+		:return: The distances and the sectors of the blocks.
+		"""
+
+		window_size = self._histogrid.getWindowSize()
+		tables = PolarHistogram._coarseTables.get((window_size, factor, alpha))
+		if tables is None:
+			if factor == 1:
+				tables = (self._histogrid.computeDistances(), self.getSectorTable(alpha))
+			else:
+				centers = np.arange(-(-window_size // factor)) * factor + (factor - 1) / 2.0 - window_size // 2
+				rows, cols = np.meshgrid(centers, centers, indexing='ij')
+				angles = np.arctan2(rows, cols)
+				angles[angles < 0] += np.pi * 2
+				tables = (np.hypot(rows, cols), (angles // np.deg2rad(alpha)).astype(np.intp))
+			PolarHistogram._coarseTables[(window_size, factor, alpha)] = tables
+
+		return tables
+
+	def computeMultiResolutionDensity(self, occupancy: np.ndarray, factor: int, alpha: int) -> np.ndarray:
+		"""
+		Computes the Obstacle Density on a downsampled window. Squared occupancies are summed up by blocks of
+		*factor* cells, so densities keep the scale of the full resolution one, and weighted by the distance to the
+		center of each block.
+
+		:param occupancy: The occupancy window, laid out as the window.
+		:type occupancy: np.ndarray
+		:param factor: the side length of the blocks, in cells.
+		:type factor: int
+		:param alpha: the angular resolution.
+		:type alpha: int
+		:return: The obstacle density.
+		"""
+
+		return self.computeBlockDensity(self.computeBlockSquares(occupancy, factor), factor, alpha)
+
+	def computeBlockSquares(self, occupancy: np.ndarray, factor: int) -> np.ndarray:
+		"""
+		Sums up the squared occupancies by blocks of *factor* cells.
+
+		:param occupancy: The occupancy window, laid out as the window.
+		:type occupancy: np.ndarray
+		:param factor: the side length of the blocks, in cells.
+		:type factor: int
+		:return: The sums of every block.
+		"""
+
+		if factor == 1:
+			return occupancy ** 2
+		window_size = self._histogrid.getWindowSize()
+		size = -(-window_size // factor)
+		squares = np.zeros((size * factor, size * factor))
+		squares[:window_size, :window_size] = occupancy ** 2
+		return squares.reshape(size, factor, size, factor).sum(axis=(1, 3))
+
+	def addReadingSquares(self, squares: np.ndarray, droneHeading: int, factor: int) -> np.ndarray:
+		"""
+		Adds to the block sums of squared occupancies the readings at the beams' bisectors, as *computeOccupancy*
+		would, without changing the Histogram Grid. Only the cells hit are read, so it takes as long as the blocks do.
+
+		:param squares: The sums of every block, as given by *computeBlockSquares*.
+		:type squares: np.ndarray
+		:param droneHeading: the heading of the drone.
+		:type droneHeading: int
+		:param factor: the side length of the blocks, in cells.
+		:type factor: int
+		:return: A copy of the sums, with the readings added.
+		"""
+
+		angles, distances = self._histogrid.getSensorsArrays()
+		idx, counts = np.unique(self.lookupCells(droneHeading + angles, distances // self._histogrid.getCellSize()),
+		                        return_counts=True)
+		ocp = self._histogrid.getOcpCells(self._histogrid.toBufferIndexes(idx))
+		rows, cols = np.divmod(idx, self._histogrid.getWindowSize())
+		squares = squares.copy()
+		np.add.at(squares, (rows // factor, cols // factor), (ocp + counts) ** 2 - ocp ** 2)
+		return squares
+
+	def computeBlockDensity(self, squares: np.ndarray, factor: int, alpha: int) -> np.ndarray:
+		"""
+		Computes the Obstacle Density from the block sums of squared occupancies, weighting each block by the distance
+		to its center.
+
+		:param squares: The sums of every block, as given by *computeBlockSquares*.
+		:type squares: np.ndarray
+		:param factor: the side length of the blocks, in cells.
+		:type factor: int
+		:param alpha: the angular resolution.
+		:type alpha: int
+		:return: The obstacle density.
+		"""
+
+		distances, sectors = self.getCoarseTables(factor, alpha)
+		# The magnitude of a unit occupancy is the distance weight alone
+		magnitude = squares * self.computeCellsMagnitude(1, distances)
+
+		n = int(360 // alpha)
+		return np.bincount(sectors.ravel(), weights=magnitude.ravel(), minlength=n)[:n]
+
+	def getSectorTable(self, alpha: int = None) -> np.ndarray:
+		"""
+		Returns the sector each cell of the active window lays on. Tables are computed once per (windowSize, alpha), every
+		resolution being derived from a single cached table of angles over [0, 2π).
+
+		:param alpha: the angular resolution. Defaults to the one of the Polar Histogram.
+		:type alpha: int
+		:return: A (windowSize * windowSize) matrix of sectors.
+		"""
+
+		alpha = alpha or self._alpha
+		window_size = self._histogrid.getWindowSize()
+		table = PolarHistogram._sectorTables.get((window_size, alpha))
+		if table is None:
+			angles = PolarHistogram._sectorTables.get((window_size, None))
+			if angles is None:
+				angles = self._histogrid.computeAngles()
+				angles[angles < 0] += np.pi * 2
+				PolarHistogram._sectorTables[(window_size, None)] = angles
+			table = (angles // np.deg2rad(alpha)).astype(np.intp)
+			PolarHistogram._sectorTables[(window_size, alpha)] = table
+
+		return table
 
 	def getAlpha(self) -> int:
 		"""
@@ -388,42 +1688,108 @@ class PolarHistogram:
 		"""
 		return self._alpha
 
-	def computePODsmoothing(self, POD: np.ndarray, l: int = 5) -> np.ndarray:
+	def getSmoothingKernel(self, l: int = 5) -> np.ndarray:
+		"""
+		Returns the normalized Hann window used to smooth the POD, computed once per length.
+
+		:param l: the number of points in the smoothing function.
+		:type l: int
+		:return: the smoothing kernel.
 		"""
-		Smooths the POD readings.
 
-		:param POD: the POD to smooth.
+		smoother = PolarHistogram._smoothingKernels.get(l)
+		if smoother is None:
+			smoother = signal.windows.hann(l, sym=True)
+			smoother /= np.sum(smoother)
+			PolarHistogram._smoothingKernels[l] = smoother
+
+		return smoother
+
+	def computePODsmoothing(self, POD: np.ndarray, l: int = 5, circular: bool = True) -> np.ndarray:
+		"""
+		Smooths the POD readings. As the histogram is circular, the smoothing wraps around by default. Short kernels are
+		convolved directly, long ones, or ones longer than the histogram, through FFT.
+
+		:param POD: the POD to smooth, or a stack of them, one per row.
 		:type POD: np.ndarray
 		:param l: the number of points in the smoothing function. Increasing it lowers the resolution, but reduces noise.
 		:type l: int
-		:return: the smoothed Polar Obstacle Density sectors.
+		:param circular: whether the smoothing wraps around. Otherwise, the POD is zero-padded.
+		:type circular: bool
+		:return: the smoothed Polar Obstacle Density sectors, with the same shape as *POD*.
 		"""
 
-		smoother = signal.hann(l, sym=True)
-		sPOD = signal.convolve(POD, smoother, mode='same') / np.sum(smoother)
+		smoother = self.getSmoothingKernel(l)
+		POD = np.asarray(POD, dtype=float)
+		n = POD.shape[-1]
+		# Even kernels are centered as a 'same' mode convolution does
+		origin = -1 if l % 2 == 0 else 0
+
+		if not circular:
+			return ndimage.convolve1d(POD, smoother, axis=-1, mode='constant', origin=origin)
+
+		if l < self.FFT_SMOOTHING_LENGTH and l <= n:
+			return ndimage.convolve1d(POD, smoother, axis=-1, mode='wrap', origin=origin)
 
-		return sPOD
+		circular_smoother = np.zeros(n)
+		np.add.at(circular_smoother, (np.arange(l) - (l - 1) // 2) % n, smoother)
+		return np.fft.irfft(np.fft.rfft(POD, axis=-1) * np.fft.rfft(circular_smoother), n, axis=-1)
 
 
 class HeadingControl:
-	def __init__(self, threshold: int, polarHistog: PolarHistogram, wideValleyThreshold: int = 15):
+	def __init__(self, threshold: int, polarHistog: PolarHistogram, wideValleyThreshold: int = 15,
+	             adaptiveThresholds: List = None, minValleyWidth: int = 3, memoSize: int = 0,
+	             memoResolution: float = None):
 		"""
 		This class is in charge of computing the heading correction to avoid obstacles, making use of VFH.
 		:param threshold: Under which a sector is not considered dangerous.
 		:param polarHistog: The PolarHistogram to gather the info from.
 		:param wideValleyThreshold: Max width of a wide valley.
+		:param adaptiveThresholds: Optional. Thresholds to choose from on every heading computation, instead of
+		 *threshold*. See *computeAdaptativeThresold*.
+		:param minValleyWidth: Optional, defaults to 3. Width, in sectors, of the narrowest valley the agent fits in.
+		:param memoSize: Optional, defaults to 0 (disabled). Amount of heading decisions to memoize, so unchanged
+		 readings, heading, location and target return the previous decision instead of computing it again, as long as
+		 the map version of the Histogram Grid doesn't change.
+		:param memoResolution: Optional. Size, in cm, of the bins readings are quantized to on the memo. Defaults to the
+		 cell size of the Histogram Grid.
 		"""
 		self._threshold = threshold
 		self._polarHistog = polarHistog
 		self._wideValleyThreshold = wideValleyThreshold
-
-	def computeAdaptativeThresold(self):
+		self._adaptiveThresholds = None if adaptiveThresholds is None else np.sort(adaptiveThresholds)
+		self._minValleyWidth = minValleyWidth
+		self._anytimeLevel = None
+		self._blockSquares = {}
+		self._blockLocation = None
+		self._levelCosts = {}
+		self._unfusedTicks = 0
+		self._memo = HeadingMemo(memoSize, memoResolution or polarHistog.getHistogrid().getCellSize()) \
+			if memoSize > 0 else None
+
+	def getMemo(self) -> HeadingMemo:
+		return self._memo
+
+	def computeAdaptativeThresold(self, sPOD: np.ndarray, thresholds: np.ndarray = None) -> (float, np.ndarray):
 		"""
-		#TODO Would be great to have an adaptative threshold:
-		During normal travel the threshold is low, so the agent can freely travel. Once a cluttered path is set,
-		the threshold should be raised and speed lowered to avoid collision
+		Chooses the threshold to use. During normal travel the threshold is low, so the agent can freely travel. Once a
+		cluttered path is set, no valley wide enough for the agent opens under a low threshold, so it's raised:
+		the lowest threshold having a valley at least *minValleyWidth* wide is chosen, or the highest one if none has.
+		Every threshold is evaluated at once.
+
+		:param sPOD: a Smoothed Polar Obstacle Density
+		:type sPOD: np.ndarray
+		:param thresholds: The thresholds to choose from. Defaults to the ones given to the constructor.
+		:type thresholds: np.ndarray
+		:return: The chosen threshold and its valleys.
 		"""
-		pass
+		thresholds = self._adaptiveThresholds if thresholds is None else np.sort(thresholds)
+		valleys = self.computeMultiThresholdValleys(sPOD, thresholds)
+		for threshold, threshold_valleys in zip(thresholds, valleys):
+			if np.any(threshold_valleys[:, 1] - threshold_valleys[:, 0] >= self._minValleyWidth):
+				return threshold, threshold_valleys
+
+		return thresholds[-1], valleys[-1]
 
 	def computeCandidateValleys(self, sPOD: np.ndarray) -> np.ndarray:
 		"""
@@ -433,10 +1799,25 @@ class HeadingControl:
 		:param sPOD: a Smoothed Polar Obstacle Density
 		:return:
 		"""
-		valleys = np.concatenate(([0.], np.less_equal(sPOD, self._threshold), [0.]))
-		valleys = np.where(np.abs(np.diff(valleys)) == 1)[0].reshape(-1, 2)
+		return self.computeMultiThresholdValleys(sPOD, [self._threshold])[0]
 
-		return valleys
+	def computeMultiThresholdValleys(self, sPOD: np.ndarray, thresholds: np.ndarray) -> List[np.ndarray]:
+		"""
+		Computes candidate Valleys under every threshold on a single pass.
+
+		:param sPOD: a Smoothed Polar Obstacle Density
+		:type sPOD: np.ndarray
+		:param thresholds: The thresholds to evaluate.
+		:type thresholds: np.ndarray
+		:return: For every threshold, the beginning and the end of its valleys.
+		"""
+		thresholds = np.atleast_1d(thresholds)
+		under = np.zeros((thresholds.shape[0], sPOD.shape[-1] + 2), dtype=np.int8)
+		under[:, 1:-1] = np.less_equal(sPOD, thresholds[:, np.newaxis])
+		rows, edges = np.nonzero(np.diff(under, axis=1))
+		bounds = np.cumsum(np.bincount(rows, minlength=thresholds.shape[0]))[:-1]
+
+		return [valleys.reshape(-1, 2) for valleys in np.split(edges, bounds)]
 
 	def computeSpeed(self, sector_sPOD:int, hm:int, Vmax:int = 8) -> int:
 		"""
@@ -450,7 +1831,8 @@ class HeadingControl:
 		V = round(max(Vmax * (1 - hc/hm), 1))
 		return V
 
-	def computeHeading(self, droneHeading: int, target: np.ndarray, location: np.ndarray, hm: int = 8, Vmax:int = 8) -> (int, int):
+	def computeHeading(self, droneHeading: int, target: np.ndarray, location: np.ndarray, hm: int = 8, Vmax:int = 8,
+	                   updateMap: bool = False) -> (int, int):
 		"""
 		Computes the new heading the robot should take to avoid collision.
 
@@ -462,16 +1844,66 @@ class HeadingControl:
 		:type location: np.ndarray
 		:param Vmax: the maximum speed for the agent.
 		:type Vmax: int
+		:param updateMap: Optional, defaults to False. Fuses the readings into the Histogram Grid with *computeMap*
+		 first. With the memo enabled, it's skipped when the decision is memoized: the same quantized readings, at the
+		 same cell, fuse into nearly the same map, so hovering keeps hitting the memo.
+		:type updateMap: bool
 		:return: The new heading and the speed
 		"""
+		if self._memo is not None:
+			histogrid = self._polarHistog.getHistogrid()
+			self._memo.validate(histogrid.getMapVersion())
+			key = self._memo.computeKey(histogrid.getSensorsMeasurements(), droneHeading, location, target, hm, Vmax)
+			decision = self._memo.get(key)
+			if decision is None:
+				if updateMap:
+					histogrid.computeMap(droneHeading, location)
+					self._memo.validate(histogrid.getMapVersion())
+				decision = self.computeHeadingFromPOD(
+					self._polarHistog.computePODsmoothing(self._polarHistog.computeObstacleDensity(droneHeading)),
+					droneHeading, target, location, hm, Vmax
+				)
+				self._memo.put(key, decision)
+			return decision
+
+		if updateMap:
+			self._polarHistog.getHistogrid().computeMap(droneHeading, location)
+		sPOD = self._polarHistog.computePODsmoothing(self._polarHistog.computeObstacleDensity(droneHeading))
+		return self.computeHeadingFromPOD(sPOD, droneHeading, target, location, hm, Vmax)
+
+	def computeHeadingFromPOD(self, sPOD: np.ndarray, droneHeading: int, target: np.ndarray, location: np.ndarray,
+	                          hm: int = 8, Vmax: int = 8, alpha: int = None, wideValleyThreshold: int = None) -> (int, int):
+		"""
+		Computes the new heading the robot should take to avoid collision, given an already smoothed POD.
+
+		:param sPOD: a Smoothed Polar Obstacle Density
+		:type sPOD: np.ndarray
+		:param droneHeading: the heading of the drone.
+		:type droneHeading: int
+		:param target: the position of the target on the full map.
+		:type target: np.ndarray
+		:param location: the position of the drone on the full map.
+		:type location: np.ndarray
+		:param Vmax: the maximum speed for the agent.
+		:type Vmax: int
+		:param alpha: the angular resolution of *sPOD*. Defaults to the one of the Polar Histogram.
+		:type alpha: int
+		:param wideValleyThreshold: Max width of a wide valley, in sectors of *sPOD*. Defaults to the constructor one.
+		:type wideValleyThreshold: int
+		:return: The new heading and the speed
+		"""
+		alpha = alpha or self._polarHistog.getAlpha()
+		wideValleyThreshold = wideValleyThreshold or self._wideValleyThreshold
 		direction = target - location
 		target_sector = np.rad2deg(np.arctan2(direction[0], direction[1])) - 90
 		if target_sector < 0:
 			target_sector += 360
 
-		target_sector /= self._polarHistog.getAlpha()
-		sPOD = self._polarHistog.computePODsmoothing(self._polarHistog.computeObstacleDensity(droneHeading))
-		valleys = self.computeCandidateValleys(sPOD)
+		target_sector /= alpha
+		if self._adaptiveThresholds is None:
+			valleys = self.computeCandidateValleys(sPOD)
+		else:
+			valleys = self.computeAdaptativeThresold(sPOD)[1]
 
 		target_on_fov = np.where((valleys[:, 0] <= target_sector) & (valleys[:, 1] >= target_sector))[0]
 		if target_on_fov.size != 0:
@@ -481,17 +1913,219 @@ class HeadingControl:
 			kn = valleys.reshape(-1)[idx]
 			closest_valley = valleys[idx // 2]
 			valley_width = closest_valley[1] - closest_valley[0]
-			kf = min(360 / self._polarHistog.getAlpha() - 1, kn + self._wideValleyThreshold) \
-				if valley_width > self._wideValleyThreshold else closest_valley[1]
+			kf = min(360 / alpha - 1, kn + wideValleyThreshold) \
+				if valley_width > wideValleyThreshold else closest_valley[1]
 			theta = ((kn + kf) // 2)
 
-		V = self.computeSpeed(sPOD[int(round(theta))], hm, Vmax)
-		theta *= self._polarHistog.getAlpha()
+		# Targets past the middle of the last sector round up to the first one
+		V = self.computeSpeed(sPOD[int(round(theta)) % sPOD.size], hm, Vmax)
+		theta *= alpha
 		theta -= droneHeading
 		theta += 360 if theta < -180 else -360 if theta > 180 else 0
 		theta = int(round(theta))
 		return theta, V
 
+	def computeHeadingAnytime(self, droneHeading: int, target: np.ndarray, location: np.ndarray, deadline: float,
+	                          hm: int = 8, Vmax: int = 8, levels: List[Tuple] = None, updateMap: bool = True,
+	                          costDecay: float = 0.5, mapPeriod: int = 5) -> (int, int):
+		"""
+		Computes the new heading the robot should take to avoid collision, refining it while time remains. A coarse
+		decision is made first, from a downsampled window and a coarse angular resolution, and then every finer level
+		is computed as long as it's expected to end before the deadline, judging by the time it took the last time it
+		was computed. The first level is always computed. The expected time of every level skipped is shortened by
+		*costDecay*, so a single slow run doesn't keep a level out for good: it's tried again once it seems to fit.
+
+		Only the finest level updates the map and reads the whole window: it keeps the block sums of the squared
+		occupancy for the coarser levels, which take them, moved along with the window, and add the current readings
+		at the beams' bisectors. Their cost so only depends on the amount of blocks. While the finest level is not
+		reached, the readings are still fused every *mapPeriod* calls, before the first level.
+
+		:param droneHeading: the heading of the drone.
+		:type droneHeading: int
+		:param target: the position of the target on the full map.
+		:type target: np.ndarray
+		:param location: the position of the drone on the full map.
+		:type location: np.ndarray
+		:param deadline: the *time.perf_counter()* instant the decision must be ready by.
+		:type deadline: float
+		:param Vmax: the maximum speed for the agent.
+		:type Vmax: int
+		:param levels: the (downsampling factor, alpha) of every level, from coarse to fine. The last one must have a
+		 factor of 1. Defaults to ((4, 4⍺), (2, 2⍺), (1, ⍺)).
+		:type levels: List[Tuple]
+		:param updateMap: Optional, defaults to True. The finest level fuses the readings into the Histogram Grid with
+		 *computeMap*, so it's taken into account by the deadline. If it's not reached, the readings are not fused,
+		 unless *mapPeriod* calls went by without fusing them.
+		:type updateMap: bool
+		:param costDecay: Optional, defaults to 0.5. Factor the expected time of the levels skipped is multiplied by.
+		:type costDecay: float
+		:param mapPeriod: Optional, defaults to 5. Most calls the readings go without being fused into the map.
+		:type mapPeriod: int
+		:return: The new heading and the speed, from the finest level reached.
+		"""
+		alpha = self._polarHistog.getAlpha()
+		levels = levels or ((4, alpha * 4), (2, alpha * 2), (1, alpha))
+		histogrid = self._polarHistog.getHistogrid()
+
+		fused = False
+		if updateMap and self._unfusedTicks + 1 >= mapPeriod:
+			histogrid.computeMap(droneHeading, location)
+			fused = True
+
+		heading, predicted = None, 0.0
+		for level, (factor, level_alpha) in enumerate(levels):
+			start = time.perf_counter()
+			if heading is not None and start + predicted > deadline:
+				for skipped in levels[level:]:
+					if skipped in self._levelCosts:
+						self._levelCosts[skipped] *= costDecay
+				break
+
+			if factor == 1:
+				if updateMap and not fused:
+					histogrid.computeMap(droneHeading, location)
+					fused = True
+				occupancy = self._polarHistog.computeWindowOccupancy(droneHeading)
+				density = self._polarHistog.computeMultiResolutionDensity(occupancy, 1, level_alpha)
+				self._blockSquares = {
+					coarse: self._polarHistog.computeBlockSquares(occupancy, coarse) for coarse, _ in levels if coarse != 1
+				}
+				self._blockLocation = np.array(location, dtype=int)
+			else:
+				squares = self.getBlockSquares(factor, location)
+				density = self._polarHistog.computeBlockDensity(
+					self._polarHistog.addReadingSquares(squares, droneHeading, factor), factor, level_alpha
+				)
+
+			scale = alpha / level_alpha
+			sPOD = self._polarHistog.computePODsmoothing(
+				density,
+				# Hann windows shorter than 3 points vanish, and even ones shift the POD
+				max(3, 2 * int(round(2 * scale)) + 1)
+			)
+			heading = self.computeHeadingFromPOD(
+				sPOD, droneHeading, target, location, hm, Vmax,
+				alpha=level_alpha, wideValleyThreshold=max(1, int(round(self._wideValleyThreshold * scale)))
+			)
+			self._anytimeLevel = level
+			self._levelCosts[(factor, level_alpha)] = time.perf_counter() - start
+
+			if level + 1 < len(levels):
+				following = levels[level + 1]
+				predicted = self._levelCosts.get(
+					following, self._levelCosts[(factor, level_alpha)] * (factor / following[0]) ** 2
+				)
+
+		self._unfusedTicks = 0 if fused or not updateMap else self._unfusedTicks + 1
+		return heading
+
+	def getBlockSquares(self, factor: int, location: np.ndarray) -> np.ndarray:
+		"""
+		Returns the block sums of the squared occupancy kept by the last finest level of *computeHeadingAnytime*. When
+		the window scrolls, they're moved by the whole blocks the drone moved since, and the blocks entering are empty.
+		If there's none, they're computed from the window.
+
+		:param factor: the side length of the blocks, in cells.
+		:type factor: int
+		:param location: the position of the drone on the full map.
+		:type location: np.ndarray
+		:return: The sums of every block.
+		"""
+		histogrid = self._polarHistog.getHistogrid()
+		squares = self._blockSquares.get(factor)
+		if squares is None:
+			occupancy = histogrid.getWindowLayout(histogrid.getOcpWindow())
+			return self._polarHistog.computeBlockSquares(occupancy, factor)
+		if not histogrid.isScrolling():
+			return squares
+
+		shift = np.round((np.asarray(location) - self._blockLocation) / factor).astype(int)
+		if not np.any(shift):
+			return squares
+		moved = np.zeros_like(squares)
+		size = squares.shape[0]
+		if np.any(np.abs(shift) >= size):
+			return moved
+		src = [slice(max(d, 0), size + min(d, 0)) for d in shift]
+		dst = [slice(max(-d, 0), size + min(-d, 0)) for d in shift]
+		moved[dst[0], dst[1]] = squares[src[0], src[1]]
+		return moved
+
+	def getLevelCosts(self) -> Dict:
+		"""
+		Returns the time, in s, every level of *computeHeadingAnytime* took the last time it was computed.
+
+		:return: The costs, keyed by (factor, alpha).
+		"""
+		return self._levelCosts
+
+	def getAnytimeLevel(self) -> int:
+		"""
+		Returns the finest level reached by the last *computeHeadingAnytime*.
+
+		:return: the level index.
+		"""
+		return self._anytimeLevel
+
+	def computeHeadings(self, sPODs: np.ndarray, droneHeadings: np.ndarray, targets: np.ndarray,
+	                    locations: np.ndarray, hm: int = 8, Vmax: int = 8) -> (np.ndarray, np.ndarray):
+		"""
+		Computes, at once, the new heading and speed for a batch of (heading, target, location), each one with its own
+		smoothed POD, as *computeHeadingFromPOD* does. Valleys are found under the fixed threshold. Rows with no
+		valley at all keep the target direction.
+
+		:param sPODs: a stack of Smoothed Polar Obstacle Densities, one per row, or a single one shared by every row.
+		:type sPODs: np.ndarray
+		:param droneHeadings: the headings of the drones.
+		:type droneHeadings: np.ndarray
+		:param targets: the positions of the targets on the full map, one per row.
+		:type targets: np.ndarray
+		:param locations: the positions of the drones on the full map, one per row.
+		:type locations: np.ndarray
+		:param hm: The speed reducing factor
+		:type hm: int
+		:param Vmax: the maximum speed for the agent.
+		:type Vmax: int
+		:return: The new headings and the speeds
+		"""
+		alpha = self._polarHistog.getAlpha()
+		direction = np.atleast_2d(targets) - np.atleast_2d(locations)
+		target_sector = np.rad2deg(np.arctan2(direction[:, 0], direction[:, 1])) - 90
+		target_sector[target_sector < 0] += 360
+		target_sector /= alpha
+
+		batch = target_sector.shape[0]
+		sPODs = np.broadcast_to(sPODs, (batch, np.shape(sPODs)[-1]))
+		n = sPODs.shape[1]
+		under = np.zeros((batch, n + 2), dtype=np.int8)
+		under[:, 1:-1] = np.less_equal(sPODs, self._threshold)
+		edges = np.diff(under, axis=1)
+		starts, ends = edges == 1, edges == -1
+		pos = np.arange(n + 1)
+		ts = target_sector[:, np.newaxis]
+
+		# The target lays on a valley if more valleys began before it than ended
+		target_on_fov = np.sum(starts & (pos <= ts), axis=1) > np.sum(ends & (pos < ts), axis=1)
+
+		# Closest valley border, and the valley it belongs to
+		kn = pos[np.argmin(np.where(starts | ends, np.abs(pos - ts), np.inf), axis=1)]
+		kn_is_start = starts[np.arange(batch), kn]
+		kn_col = kn[:, np.newaxis]
+		valley_begin = np.where(kn_is_start, kn, np.max(np.where(starts & (pos < kn_col), pos, -1), axis=1))
+		valley_end = np.where(kn_is_start, np.min(np.where(ends & (pos > kn_col), pos, n + 1), axis=1), kn)
+		wide = valley_end - valley_begin > self._wideValleyThreshold
+		kf = np.where(wide, np.minimum(360 / alpha - 1, kn + self._wideValleyThreshold), valley_end)
+
+		has_valleys = np.any(starts, axis=1)
+		theta = np.where(target_on_fov | ~has_valleys, target_sector, (kn + kf) // 2)
+
+		hc = np.minimum(sPODs[np.arange(batch), np.round(theta).astype(np.intp) % n], hm)
+		V = np.round(np.maximum(Vmax * (1 - hc / hm), 1)).astype(int)
+		theta = theta * alpha - np.asarray(droneHeadings)
+		theta[theta < -180] += 360
+		theta[theta > 180] -= 360
+		return np.round(theta).astype(int), V
+
 
 if __name__ == '__main__':
 	sensor_pin = 10
@@ -0,0 +1,314 @@
+'''
+######
+
+This file provides a sparse 3-D occupancy map, so obstacles can be told apart by altitude while flying.
+
+Voxels are grouped on cubic blocks, and only the blocks ever written are stored, on a hash map keyed by the block
+coordinates. The map can be used as the full map of a Histogram Grid: it behaves as a 2-D map of the area, where writes
+go to the layer of voxels at the current altitude, and reads give either that layer or the maximum over a band of layers
+around it, so an obstacle anywhere on the band the agent flies through shows up on the planners reading the map. Voxels
+never sensed are left out of the maximum, so the emptiness of a layer isn't hidden by the unknown ones around it.
+
+The projection is read-only: a Histogram Grid loads and flushes its window on the current layer alone, with
+*readLayer*, and adds the occupancy of the rest of the band, from *readBandOccupancy*, to the one its Polar Histogram
+reads. Obstacles are so never copied from one layer to another.
+'''
+
+from typing import Tuple
+import numpy as np
+
+
+class VoxelMap:
+	def __init__(self,
+	             shape: Tuple,
+	             blockSize: int = 8,
+	             cellSize: int = 5,
+	             dtype=np.float32,
+	             fillValue: float = 0,
+	             band: Tuple = (0, 0),
+	             projection: str = 'max'
+	             ):
+		'''
+		Constructor method for the voxel map.
+
+		:param shape: The horizontal size of the map, in cells.
+		:type shape: Tuple
+		:param blockSize: Side length of each block, in voxels. Defaults to 8.
+		:type blockSize: int
+		:param cellSize: Side length of each voxel in cm. Defaults to 5.
+		:type cellSize: int
+		:param dtype: Type of the voxels. Defaults to float32.
+		:param fillValue: Value of the voxels never written. Defaults to 0.
+		:type fillValue: float
+		:param band: Distance, in cm, below and above the current altitude the reads project. Defaults to (0, 0).
+		:type band: Tuple
+		:param projection: 'max' to read the maximum over the band, 'slice' to read the current layer alone.
+		:type projection: str
+		'''
+
+		if projection not in ('max', 'slice'):
+			raise ValueError('Unknown projection {}, expected max or slice'.format(projection))
+		self._shape = (int(shape[0]), int(shape[1]))
+		self._blockSize = blockSize
+		self._cellSize = cellSize
+		self._dtype = np.dtype(dtype)
+		self._fillValue = fillValue
+		self._band = band
+		self._projection = projection
+		self._blocks = {}
+		self._layer = 0
+		self._layerVersions = {}
+
+	@property
+	def shape(self) -> Tuple:
+		return self._shape
+
+	@property
+	def dtype(self):
+		return self._dtype
+
+	@property
+	def ndim(self) -> int:
+		return 2
+
+	def getBlockSize(self) -> int:
+		return self._blockSize
+
+	def getBlocks(self) -> int:
+		return len(self._blocks)
+
+	def getLayer(self) -> int:
+		return self._layer
+
+	def getLayerAt(self, altitude: float) -> int:
+		'''
+		Returns the layer of voxels an altitude falls in.
+
+		:param altitude: The altitude, in cm.
+		:type altitude: float
+		:return: The layer.
+		'''
+
+		return int(altitude // self._cellSize)
+
+	def getLayerVersion(self, layer: int) -> int:
+		'''
+		Returns the amount of writes made on a layer, so reads of it can be cached.
+
+		:param layer: The layer.
+		:type layer: int
+		:return: The version of the layer.
+		'''
+
+		return self._layerVersions.get(layer, 0)
+
+	def setAltitude(self, altitude: float):
+		'''
+		Sets the altitude of the agent, picking the layer of voxels writes go to and reads are centered at.
+
+		:param altitude: The altitude, in cm.
+		:type altitude: float
+		'''
+
+		self._layer = self.getLayerAt(altitude)
+
+	def setBand(self, band: Tuple):
+		self._band = band
+
+	def getLayers(self) -> range:
+		'''
+		Returns the layers reads take into account.
+
+		:return: The range of layers.
+		'''
+
+		if self._projection == 'slice':
+			return range(self._layer, self._layer + 1)
+		below, above = int(self._band[0] // self._cellSize), int(self._band[1] // self._cellSize)
+		return range(self._layer - below, self._layer + above + 1)
+
+	def getBounds(self, key: Tuple) -> Tuple:
+		'''
+		Translates a pair of slices, or integers, to begin and end points on the map.
+
+		:param key: The pair of slices.
+		:type key: Tuple
+		:return: The begin and end points.
+		'''
+
+		begin, end = [], []
+		for k, size in zip(key, self._shape):
+			if isinstance(k, slice):
+				start, stop, step = k.indices(size)
+				if step != 1:
+					raise IndexError('VoxelMap only supports contiguous slices')
+				stop = max(start, stop)
+			else:
+				start = int(k) + size if k < 0 else int(k)
+				if not 0 <= start < size:
+					raise IndexError('index {} is out of bounds for size {}'.format(k, size))
+				stop = start + 1
+			begin.append(start)
+			end.append(stop)
+		return np.array(begin), np.array(end)
+
+	def getBlocksOn(self, begin: np.ndarray, end: np.ndarray):
+		'''
+		Iterates over the columns of blocks overlapping a horizontal region of the map.
+
+		:param begin: Begin point of the region.
+		:type begin: np.ndarray
+		:param end: End point of the region.
+		:type end: np.ndarray
+		:return: A generator of (block column, slices on the block, slices on the region)
+		'''
+
+		bs = self._blockSize
+		for br in range(begin[0] // bs, -(-end[0] // bs)):
+			r0, r1 = max(begin[0], br * bs), min(end[0], (br + 1) * bs)
+			for bc in range(begin[1] // bs, -(-end[1] // bs)):
+				c0, c1 = max(begin[1], bc * bs), min(end[1], (bc + 1) * bs)
+				yield (br, bc), \
+					(slice(r0 - br * bs, r1 - br * bs), slice(c0 - bc * bs, c1 - bc * bs)), \
+					(slice(r0 - begin[0], r1 - begin[0]), slice(c0 - begin[1], c1 - begin[1]))
+
+	def readRegion(self, begin: np.ndarray, end: np.ndarray, layers: range = None) -> np.ndarray:
+		'''
+		Reads a horizontal region, as the maximum over the known voxels of the layers read. Cells without known voxels
+		read as the fill value.
+
+		:param begin: Begin point of the region.
+		:type begin: np.ndarray
+		:param end: End point of the region.
+		:type end: np.ndarray
+		:param layers: The layers to read. Defaults to *getLayers()*.
+		:type layers: range
+		:return: The region.
+		'''
+
+		layers = layers or self.getLayers()
+		bs = self._blockSize
+		region = np.full(tuple(end - begin), -np.inf)
+		for column, block_slices, region_slices in self.getBlocksOn(begin, end):
+			for bz in range(layers.start // bs, -(-layers.stop // bs)):
+				block = self._blocks.get(column + (bz,))
+				if block is None:
+					continue
+				z0, z1 = max(layers.start, bz * bs) - bz * bs, min(layers.stop, (bz + 1) * bs) - bz * bs
+				voxels = block[block_slices + (slice(z0, z1),)]
+				layer_max = np.where(voxels == self._fillValue, -np.inf, voxels).max(axis=2)
+				region[region_slices] = np.maximum(region[region_slices], layer_max)
+
+		region[region == -np.inf] = self._fillValue
+		return region.astype(self._dtype)
+
+	def readLayer(self, begin: np.ndarray, end: np.ndarray) -> np.ndarray:
+		'''
+		Reads a horizontal region of the layer of the current altitude alone, the one writes go to.
+
+		:param begin: Begin point of the region.
+		:type begin: np.ndarray
+		:param end: End point of the region.
+		:type end: np.ndarray
+		:return: The region.
+		'''
+
+		return self.readRegion(begin, end, range(self._layer, self._layer + 1))
+
+	def readBandOccupancy(self, begin: np.ndarray, end: np.ndarray) -> np.ndarray:
+		'''
+		Reads the occupancy of a horizontal region over the layers of the band other than the current one, as the
+		maximum of their positive voxels.
+
+		:param begin: Begin point of the region.
+		:type begin: np.ndarray
+		:param end: End point of the region.
+		:type end: np.ndarray
+		:return: The occupancy of the region, 0 where no layer of the band holds an obstacle.
+		'''
+
+		layers = self.getLayers()
+		occupancy = np.zeros(tuple(end - begin), dtype=self._dtype)
+		for others in (range(layers.start, self._layer), range(self._layer + 1, layers.stop)):
+			if len(others):
+				occupancy = np.maximum(occupancy, self.readRegion(begin, end, others))
+		return occupancy
+
+	def writeRegion(self, begin: np.ndarray, end: np.ndarray, value: np.ndarray):
+		'''
+		Writes a horizontal region on the layer of the current altitude, creating the blocks never written before.
+
+		:param begin: Begin point of the region.
+		:type begin: np.ndarray
+		:param end: End point of the region.
+		:type end: np.ndarray
+		:param value: The values to write.
+		:type value: np.ndarray
+		'''
+
+		bz, z = divmod(self._layer, self._blockSize)
+		value = np.broadcast_to(value, tuple(end - begin))
+		self._layerVersions[self._layer] = self.getLayerVersion(self._layer) + 1
+		for column, block_slices, region_slices in self.getBlocksOn(begin, end):
+			block = self._blocks.get(column + (bz,))
+			if block is None:
+				block = np.full((self._blockSize,) * 3, self._fillValue, dtype=self._dtype)
+				self._blocks[column + (bz,)] = block
+			block[block_slices + (z,)] = value[region_slices]
+
+	def isGather(self, key: Tuple) -> bool:
+		return any(isinstance(k, (np.ndarray, list)) for k in key)
+
+	def getCellsBounds(self, key: Tuple) -> Tuple:
+		'''
+		Finds the region enclosing a set of cells.
+
+		:param key: The rows and the columns of the cells.
+		:type key: Tuple
+		:return: The broadcasted rows and columns, and the begin and end points of the region.
+		'''
+
+		rows, cols = np.broadcast_arrays(np.asarray(key[0], dtype=np.int64), np.asarray(key[1], dtype=np.int64))
+		if np.any((rows < 0) | (rows >= self._shape[0]) | (cols < 0) | (cols >= self._shape[1])):
+			raise IndexError('cells out of the map bounds')
+		if rows.size == 0:
+			return rows, cols, np.array([0, 0]), np.array([0, 0])
+		return rows, cols, np.array([rows.min(), cols.min()]), np.array([rows.max(), cols.max()]) + 1
+
+	def __getitem__(self, key: Tuple) -> np.ndarray:
+		'''
+		Reads a region of the map, given by a pair of slices, or a set of cells, given by a pair of index arrays.
+		'''
+
+		if not isinstance(key, tuple):
+			key = (key, slice(None))
+
+		if self.isGather(key):
+			rows, cols, begin, end = self.getCellsBounds(key)
+			return self.readRegion(begin, end)[rows - begin[0], cols - begin[1]]
+
+		region = self.readRegion(*self.getBounds(key))
+		if not isinstance(key[0], slice):
+			region = region[0]
+		if not isinstance(key[1], slice):
+			region = region[..., 0]
+		return region
+
+	def __setitem__(self, key: Tuple, value):
+		'''
+		Writes a region of the map, given by a pair of slices, or a set of cells, given by a pair of index arrays, on
+		the layer of the current altitude.
+		'''
+
+		if not isinstance(key, tuple):
+			key = (key, slice(None))
+
+		if self.isGather(key):
+			rows, cols, begin, end = self.getCellsBounds(key)
+			region = self.readRegion(begin, end, range(self._layer, self._layer + 1))
+			region[rows - begin[0], cols - begin[1]] = value
+			self.writeRegion(begin, end, region)
+			return
+
+		begin, end = self.getBounds(key)
+		self.writeRegion(begin, end, value)
@@ -0,0 +1,40 @@
+from unittest import TestCase
+from backend.algorithms.VFH import HistogramGrid
+from backend.algorithms.DistanceField import DistanceField
+from backend.algorithms.MapStore import TiledMap
+from scipy import ndimage
+import numpy as np
+
+full_map = np.zeros((120, 120))
+full_map[10:20, 60] = 1
+full_map[90, 30:50] = 1
+
+
+def expectedDistances(occupied, maxDistance):
+	return np.minimum(ndimage.distance_transform_edt(np.logical_not(occupied)), maxDistance)
+
+
+class TestDistanceField(TestCase):
+	def test_build(self):
+		field = DistanceField(HistogramGrid({}, 375, 0, 0, full_map.copy(), windowSize=41), maxDistance=15)
+		self.assertTrue(np.allclose(field.getDistances(), expectedDistances(full_map > 0, 15)))
+		self.assertEqual(field.getClearance(15, 64), 4)
+		self.assertTrue(np.allclose(field.getClearance(np.array([0, 90]), np.array([0, 40])), [15, 0]))
+
+	def test_update(self):
+		for fullMap in (full_map.copy(), TiledMap(full_map.shape, tileSize=32)):
+			if isinstance(fullMap, TiledMap):
+				fullMap[:, :] = full_map
+			grid = HistogramGrid({}, 375, 0, 0, fullMap, windowSize=41)
+			field = DistanceField(grid, maxDistance=15)
+			for tick, location in enumerate(([30, 30], [30, 60], [80, 40], [100, 100])):
+				grid.setSensorsMeasurements({-30: 40.0 + tick * 10, 0: 60.0, 45: 30.0})
+				grid.computeMap(tick * 20, np.array(location))
+				self.assertTrue(np.allclose(field.getDistances(), expectedDistances(fullMap[:, :] > 0, 15)))
+			self.assertTrue(field.getUpdates() > 0)
+			self.assertFalse(field.update())
+
+	def test_getGradient(self):
+		field = DistanceField(HistogramGrid({}, 375, 0, 0, full_map.copy(), windowSize=41))
+		gradient_rows, gradient_cols = field.getGradient(np.array([15, 85]), np.array([65, 40]))
+		self.assertTrue(np.allclose(gradient_cols, [1, 0]) and np.allclose(gradient_rows, [0, -1]))
@@ -0,0 +1,57 @@
+from unittest import TestCase
+from backend.algorithms.VFH import HistogramGrid, PolarHistogram, HeadingControl
+from backend.algorithms.DWA import DynamicWindowControl
+import numpy as np
+
+location = np.array([30, 30])
+corridor = np.zeros((60, 60))
+corridor[:, :26] = 1
+corridor[:, 35:] = 1
+corridor[38, 30:35] = 1
+
+
+class TestDynamicWindowControl(TestCase):
+	def test_computeWindow(self):
+		dwa = DynamicWindowControl(HistogramGrid({}, 375, 0, 0, corridor, windowSize=41))
+		turns, speeds = dwa.computeWindow()
+		self.assertTrue(np.all(turns == np.arange(-30, 31, 5)))
+		self.assertTrue(np.all(speeds == [0, 1, 2]))
+		dwa.setVelocity(7, 40)
+		turns, speeds = dwa.computeWindow()
+		self.assertTrue(np.all(turns == np.arange(10, 46, 5)))
+		self.assertTrue(np.all(speeds == [5, 6, 7, 8]))
+
+	def test_computeHeading(self):
+		grid = HistogramGrid({}, 375, 0, 0, np.zeros((60, 60)), windowSize=41)
+		vfh = HeadingControl(1, PolarHistogram(grid))
+		for target in ([50, 30], [30, 50], [10, 30], [30, 10]):
+			# Speed and turn rate only change within the acceleration limits, until the VFH heading is reached
+			dwa, heading, commands = DynamicWindowControl(grid), 0, []
+			for _ in range(8):
+				theta, V = dwa.computeHeading(heading, np.array(target), location)
+				heading += theta
+				commands.append((theta, V))
+			expected = vfh.computeHeading(0, np.array(target), location)[0]
+			self.assertEqual((heading - expected) % 360, 0)
+			self.assertEqual([V for _, V in commands], [2, 4, 6, 8, 8, 8, 8, 8])
+			self.assertTrue(np.all(np.abs(np.diff([0] + [theta for theta, _ in commands])) <= 30))
+			self.assertEqual(commands[-1], (0, 8))
+
+	def test_computeHeadingCorridor(self):
+		dwa = DynamicWindowControl(HistogramGrid({}, 375, 0, 0, corridor, windowSize=41))
+		dwa.setVelocity(4, 0)
+		theta, V = dwa.computeHeading(0, np.array([55, 30]), location)
+		# The way down the corridor is half blocked, so the agent must keep left of it
+		self.assertTrue(0 < theta <= 30)
+		turns, speeds = np.array([theta]), np.array([V])
+		self.assertTrue(dwa.computeArcClearance(dwa.computeRollouts(0, turns, speeds, location))[0, 0] >= V * 2)
+		self.assertTrue(np.all(dwa.computeClearance(np.array([0, 90, -90]), location) == [7, 4, 4]))
+
+	def test_computeHeadingBlocked(self):
+		walls = np.ones((60, 60))
+		walls[29:32, 30] = 0
+		dwa = DynamicWindowControl(HistogramGrid({}, 375, 0, 0, walls, windowSize=41))
+		dwa.setVelocity(4, 0)
+		# Nothing is admissible, so the agent stops
+		self.assertEqual(dwa.computeHeading(0, np.array([55, 30]), location), (0, 0))
+		self.assertEqual(dwa.getVelocity(), (0, 0))
@@ -0,0 +1,39 @@
+from unittest import TestCase
+from backend.algorithms.VFH import HistogramGrid
+from backend.algorithms.Frontiers import FrontierMap
+from scipy import ndimage
+import numpy as np
+
+full_map = np.zeros((100, 100))
+full_map[10:30, 10:30] = -0.5
+full_map[15, 10:30] = 0.5
+full_map[60:70, 80:95] = -0.5
+
+
+def expectedFrontier(values):
+	unknown = ndimage.binary_dilation(values == 0, structure=np.ones((3, 3)))
+	return (values < 0) & unknown
+
+
+class TestFrontierMap(TestCase):
+	def test_update(self):
+		grid = HistogramGrid({}, 375, 0, 0, full_map.copy(), windowSize=21, cellSize=5)
+		frontiers = FrontierMap(grid)
+		self.assertTrue(np.all(frontiers.getFrontier() == expectedFrontier(full_map)))
+		for tick, location in enumerate(([20, 20], [40, 40], [65, 88], [99, 0])):
+			grid.setSensorsMeasurements({-45: 40.0, 0: 30.0 + tick * 10, 45: 20.0})
+			grid.computeMap(tick * 30, np.array(location))
+			self.assertTrue(np.all(frontiers.getFrontier() == expectedFrontier(grid.getFullMap())))
+		self.assertEqual(frontiers.update(), 0)
+
+	def test_getBestFrontier(self):
+		frontiers = FrontierMap(HistogramGrid({}, 375, 0, 0, full_map.copy(), windowSize=21))
+		clusters = frontiers.computeClusters()
+		self.assertEqual(sorted(size for size, _, _ in clusters), [46, 74])
+		for location in (np.array([0, 0]), np.array([90, 90])):
+			best = frontiers.getBestFrontier(location)
+			self.assertTrue(frontiers.getFrontier()[tuple(best)])
+			self.assertEqual(best[1] > 50, location[1] > 50)
+		self.assertIsNone(FrontierMap(HistogramGrid({}, 375, 0, 0, np.zeros((50, 50)), windowSize=21)).getBestFrontier(
+			np.array([0, 0])
+		))
@@ -59,3 +59,41 @@ class TestGeometry(TestCase):
 		)
 
 
+
+	def test_rayNearestHits(self):
+		rays = Geometry.getRays(particles, angles, np.array([3.0, 3.0]))
+		expected = np.array([[8 / 3.0, 1.5], [3.0, 3.0]])
+		self.assertTrue(np.allclose(Geometry.rayNearestHits(particles[:, :2], rays, obstacles), expected))
+
+		many_particles = np.c_[np.random.uniform(0, 10, (50, 2)), np.random.uniform(-np.pi, np.pi, 50)]
+		many_angles = many_particles[:, 2:] + np.linspace(-np.pi / 2.0, np.pi / 2.0, 7)
+		many_rays = Geometry.getRays(many_particles, many_angles, np.array([6.0, 6.0]))
+		intersections = Geometry.segIntersections(many_particles[:, :2], many_rays, obstacles)
+		hit = np.any(intersections != 0, axis=2)
+		lengths = np.linalg.norm(np.repeat(many_particles[:, :2], 7, axis=0)[:, np.newaxis] - intersections, axis=2)
+		ray_lengths = np.linalg.norm(many_rays - many_particles[:, np.newaxis, :2], axis=2)
+		expected = np.minimum(np.where(hit, lengths, np.inf).min(axis=1).reshape(50, 7), ray_lengths)
+		self.assertTrue(np.allclose(
+			Geometry.rayNearestHits(many_particles[:, :2], many_rays, obstacles, chunk_size=8), expected
+		))
+
+	def test_marchRays(self):
+		grid_map = np.zeros((20, 20))
+		grid_map[15, :] = 1
+		grid_map[5:8, 3:6] = 1
+		self.assertTrue(np.allclose(
+			Geometry.marchRays(grid_map, np.array([[10, 10]] * 4), np.array([0, np.pi, np.pi / 2.0, np.pi]), 30),
+			[4.5, 10.5, 9.5, 10.5]
+		))
+		self.assertTrue(np.allclose(Geometry.marchRays(grid_map, np.array([[10, 10]]), np.array([np.pi]), 5), [5]))
+
+		origins = np.random.uniform(0, 19, (200, 2))
+		angles = np.random.uniform(-np.pi, np.pi, 200)
+		samples = np.arange(0, 12, 0.001)
+		directions = np.stack([np.cos(angles), np.sin(angles)], axis=1)
+		points = origins[:, np.newaxis] + samples[:, np.newaxis] * directions[:, np.newaxis]
+		cells = np.floor(points + 0.5).astype(int)
+		outside = np.any((cells < 0) | (cells >= 20), axis=2)
+		blocked = outside | (grid_map[np.clip(cells[..., 0], 0, 19), np.clip(cells[..., 1], 0, 19)] > 0)
+		expected = np.where(blocked.any(axis=1), samples[blocked.argmax(axis=1)], 12)
+		self.assertTrue(np.allclose(Geometry.marchRays(grid_map, origins, angles, 12), expected, atol=2e-3))
@@ -0,0 +1,60 @@
+from unittest import TestCase
+from backend.algorithms.VFH import HistogramGrid
+from backend.algorithms.GlobalPlanner import DStarLite
+import numpy as np
+
+full_map = np.zeros((60, 60))
+full_map[30, 5:55] = 1
+start, goal = np.array([10, 30]), np.array([50, 30])
+
+
+class TestDStarLite(TestCase):
+	def test_plan(self):
+		planner = DStarLite(HistogramGrid({}, 375, 0, 0, full_map.copy(), windowSize=21), goal, start)
+		# Around the end of the wall, 25 cells sideways and 20 down, and back
+		self.assertAlmostEqual(planner.plan(start), 10 + 40 * np.sqrt(2), places=2)
+		path = planner.getPath()
+		self.assertTrue(np.all(path[-1] == goal))
+		self.assertFalse(any(full_map[tuple(cell)] > 0 for cell in path))
+		self.assertTrue(np.all(planner.getWaypoint(start, 5) == path[4]))
+
+	def test_replan(self):
+		grid = HistogramGrid({}, 375, 0, 0, full_map.copy(), windowSize=21)
+		planner = DStarLite(grid, goal, start)
+		planner.plan(start)
+		path = planner.getPath()
+
+		# Drive a few cells along the path, then find the gap on the left of the wall closed
+		grid.getFullMap()[30, 0:5] = 1
+		grid.markDirtyRegion(np.array([30, 0]), np.array([31, 5]))
+		expanded = planner.getExpanded()
+		cost = planner.plan(path[5])
+		fresh = DStarLite(HistogramGrid({}, 375, 0, 0, grid.getFullMap().copy(), windowSize=21), goal, path[5])
+		self.assertEqual(cost, fresh.plan(path[5]))
+		self.assertTrue(planner.getExpanded() - expanded < fresh.getExpanded())
+
+		grid.getFullMap()[30, 55:] = 1
+		grid.markDirtyRegion(np.array([30, 55]), np.array([31, 60]))
+		self.assertEqual(planner.plan(path[5]), np.inf)
+		self.assertEqual(planner.getPath(), [])
+		self.assertTrue(np.all(planner.getWaypoint(path[5]) == goal))
+
+	def test_maxExpansions(self):
+		# The first plan is computed on construction
+		planner = DStarLite(HistogramGrid({}, 375, 0, 0, full_map.copy(), windowSize=21), goal, start)
+		self.assertTrue(planner.isComplete())
+		expanded = planner.getExpanded()
+		self.assertGreater(expanded, 0)
+		planner.plan(start)
+		self.assertEqual(planner.getExpanded(), expanded)
+
+		# Out of budget, the agent heads to the most promising cell searched, and the search goes on from there
+		partial = DStarLite(HistogramGrid({}, 375, 0, 0, full_map.copy(), windowSize=21), goal, start, maxExpansions=50)
+		self.assertFalse(partial.isComplete())
+		waypoint = partial.getWaypoint(start, maxExpansions=50)
+		self.assertFalse(partial.isComplete())
+		self.assertFalse(np.all(waypoint == goal))
+		self.assertEqual(full_map[tuple(waypoint)], 0)
+		self.assertEqual(partial.getExpanded(), 100)
+		self.assertEqual(partial.plan(start), planner.plan(start))
+		self.assertTrue(partial.isComplete())
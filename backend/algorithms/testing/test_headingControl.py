@@ -1,8 +1,9 @@
 from unittest import TestCase
 from backend.algorithms.testing.test_histogramGrid import histog
-from backend.algorithms.VFH import PolarHistogram
+from backend.algorithms.VFH import HistogramGrid, CertaintyGrid, PolarHistogram
 from backend.algorithms.VFH import HeadingControl
 import numpy as np
+import time
 
 polar_histog = PolarHistogram(histog)
 head_control = HeadingControl(0, polar_histog)
@@ -17,7 +18,7 @@ class TestHeadingControl(TestCase):
 				polar_histog.computePODsmoothing(
 					polar_histog.computeObstacleDensity(0)
 				)
-			) == np.array([2, 72]))
+			) == np.array([2, 71]))
 		)
 
 	def test_computeSpeed(self):
@@ -25,3 +26,182 @@ class TestHeadingControl(TestCase):
 
 	def test_computeHeading(self):
 		self.assertTrue(head_control.computeHeading(0, goal, drone_global_location, Vmax=v_max)[0] == 180)
+
+	def test_computeObstacleDensities(self):
+		pod_5, pod_10 = polar_histog.computeObstacleDensities(0, [5, 10])
+		self.assertTrue(np.allclose(pod_10, pod_5.reshape(-1, 2).sum(axis=1)))
+		self.assertTrue(polar_histog.getSectorTable(5) is polar_histog.getSectorTable(5))
+
+	def test_computeOccupancy(self):
+		readings = {-60: 40.0, 0: 120.0, 25: 80.0}
+		grid = HistogramGrid(readings, 375, 0, 0, np.zeros((60, 60)), windowSize=41)
+		expected = np.zeros((41, 41))
+		for angle, distance in readings.items():
+			R = distance // grid.getCellSize()
+			on_range = (R - grid.getEpsilon() <= grid.getDistances()) & (grid.getDistances() <= R + grid.getEpsilon())
+			theta = grid.getAngles() - np.deg2rad(12) - np.deg2rad(angle)
+			theta[theta >= np.pi] -= np.pi * 2
+			expected[np.unravel_index(np.argmin(np.abs(theta) + np.logical_not(on_range) * 999), theta.shape)] += 1
+
+		self.assertTrue(np.all(PolarHistogram(grid).computeOccupancy(12) == expected))
+
+	def test_updateObstacleDensity(self):
+		for grid_class, kwargs in ((HistogramGrid, {'kernelCacheSize': 16}), (CertaintyGrid, {})):
+			grids = [grid_class({}, 375, 0, 0, np.zeros((60, 60)), windowSize=41, **kwargs) for _ in range(2)]
+			full, incremental = PolarHistogram(grids[0]), PolarHistogram(grids[1], incremental=True, refreshPeriod=100)
+			for tick in range(10):
+				readings = {-45: 60.0 + tick * 5, 0: 100.0 - tick * 3, 45: 80.0}
+				for grid in grids:
+					grid.setSensorsMeasurements(readings)
+					grid.computeMap(tick, np.array([30, 30]))
+				self.assertTrue(np.allclose(
+					incremental.computeObstacleDensity(tick), full.computeObstacleDensity(tick)
+				))
+
+	def test_computePODsmoothing(self):
+		pods = np.random.uniform(0, 10, (3, 72))
+		for l in (4, 5, 40, 80):
+			smoothed = polar_histog.computePODsmoothing(pods, l)
+			self.assertTrue(np.allclose(smoothed.sum(axis=1), pods.sum(axis=1)))
+			self.assertTrue(np.allclose(smoothed[1], polar_histog.computePODsmoothing(pods[1], l)))
+			self.assertTrue(np.allclose(
+				polar_histog.computePODsmoothing(np.roll(pods, 7, axis=1), l), np.roll(smoothed, 7, axis=1)
+			))
+
+	def test_computeMultiThresholdValleys(self):
+		sPOD = np.random.uniform(0, 10, 72)
+		thresholds = np.array([0, 2.5, 5, 7.5, 10])
+		valleys = head_control.computeMultiThresholdValleys(sPOD, thresholds)
+		for threshold, threshold_valleys in zip(thresholds, valleys):
+			self.assertTrue(np.all(
+				threshold_valleys == HeadingControl(threshold, polar_histog).computeCandidateValleys(sPOD)
+			))
+
+	def test_computeAdaptativeThresold(self):
+		sPOD = np.full(72, 6.0)
+		sPOD[10:12] = 1
+		sPOD[40:45] = 3
+		adaptive_control = HeadingControl(0, polar_histog, adaptiveThresholds=[4, 2, 8], minValleyWidth=3)
+		threshold, valleys = adaptive_control.computeAdaptativeThresold(sPOD)
+		self.assertEqual(threshold, 4)
+		self.assertTrue(np.all(valleys == [[10, 12], [40, 45]]))
+
+	def test_computeHeadings(self):
+		batch = 50
+		sPODs = np.random.uniform(0, 3, (batch, 72)) * (np.random.uniform(0, 1, (batch, 72)) > 0.4)
+		sPODs[:, 0] = 0
+		headings = np.random.randint(-180, 180, batch)
+		targets = np.random.randint(0, 100, (batch, 2))
+		locations = np.random.randint(0, 100, (batch, 2))
+		thetas, speeds = head_control.computeHeadings(sPODs, headings, targets, locations, Vmax=6)
+		for i in range(batch):
+			self.assertEqual(
+				(thetas[i], speeds[i]),
+				head_control.computeHeadingFromPOD(sPODs[i], headings[i], targets[i], locations[i], Vmax=6)
+			)
+
+	def test_computeHeadingAnytime(self):
+		readings = {-30: 40.0, 0: 35.0, 30: 45.0}
+		grids = [HistogramGrid(readings, 375, 0, 0, np.zeros((60, 60)), windowSize=41) for _ in range(3)]
+		controls = [HeadingControl(1, PolarHistogram(grid)) for grid in grids]
+		target, location = np.array([50, 30]), np.array([30, 30])
+		grids[1].computeMap(90, location)
+		self.assertEqual(
+			controls[0].computeHeadingAnytime(90, target, location, time.perf_counter() + 60),
+			controls[1].computeHeading(90, target, location)
+		)
+		self.assertEqual(controls[0].getAnytimeLevel(), 2)
+
+		# Past the deadline only the coarsest level is computed, and the readings are not fused
+		version = grids[2].getMapVersion()
+		controls[2].computeHeadingAnytime(90, target, location, 0)
+		self.assertEqual(controls[2].getAnytimeLevel(), 0)
+		self.assertEqual(grids[2].getMapVersion(), version)
+
+	def test_anytimeLevelCosts(self):
+		readings = {angle: 150.0 + angle for angle in range(-90, 91, 30)}
+		grid = HistogramGrid(readings, 375, 0, 0, np.zeros((400, 400)), windowSize=141, scrolling=True)
+		control = HeadingControl(1, PolarHistogram(grid))
+		target = np.array([350, 200])
+		costs = []
+		for step in range(5):
+			control.computeHeadingAnytime(90, target, np.array([200, 200 + step]), time.perf_counter() + 60)
+			costs.append([control.getLevelCosts()[level] for level in ((4, 20), (2, 10), (1, 5))])
+		# Coarse levels don't read the whole window nor update the map
+		coarse, middle, fine = np.median(costs, axis=0)
+		self.assertLess(coarse, fine / 4)
+		self.assertLess(middle, fine / 4)
+
+		# The finest level is skipped once it's known not to fit
+		start = time.perf_counter()
+		control.computeHeadingAnytime(90, target, np.array([200, 205]), start + fine / 4)
+		self.assertLess(control.getAnytimeLevel(), 2)
+
+	def test_anytimeSlowSample(self):
+		grid = HistogramGrid({-30: 40.0, 0: 35.0, 30: 45.0}, 375, 0, 0, np.zeros((60, 60)), windowSize=41)
+		control = HeadingControl(1, PolarHistogram(grid))
+		target, location = np.array([50, 30]), np.array([30, 30])
+		control.computeHeadingAnytime(90, target, location, time.perf_counter() + 60)
+
+		# A single slow run of the finest level keeps it out only until its expected time fits again
+		control.getLevelCosts()[(1, 5)] = 60.0
+		reached = []
+		for _ in range(12):
+			control.computeHeadingAnytime(90, target, location, time.perf_counter() + 1)
+			reached.append(control.getAnytimeLevel())
+		self.assertEqual(reached[0], 1)
+		self.assertEqual(reached[-1], 2)
+
+		# Readings are fused every mapPeriod calls even if the finest level is never reached
+		versions = []
+		for _ in range(6):
+			control.computeHeadingAnytime(90, target, location, 0, mapPeriod=3)
+			versions.append(grid.getMapVersion())
+		self.assertEqual(np.count_nonzero(np.diff(versions)), 2)
+
+	def test_computeHeadingMemoHovering(self):
+		readings = {-30: 40.0, 0: 35.0, 30: 45.0}
+		grid = HistogramGrid(dict(readings), 375, 0, 0, np.zeros((60, 60)), windowSize=41)
+		control = HeadingControl(1, PolarHistogram(grid), memoSize=4)
+		target, location = np.array([50, 30]), np.array([30, 30])
+		versions = []
+		for step in range(10):
+			# Readings jitter within the bins of the memo while hovering
+			grid.setSensorsMeasurements({angle: distance + step / 10 for angle, distance in readings.items()})
+			control.computeHeading(90, target, location, updateMap=True)
+			versions.append(grid.getMapVersion())
+		self.assertEqual((control.getMemo().getHits(), control.getMemo().getMisses()), (9, 1))
+		self.assertEqual(len(set(versions)), 1)
+
+		# New readings are fused, and decided on the new map
+		grid.setSensorsMeasurements({-30: 40.0, 0: 20.0, 30: 45.0})
+		control.computeHeading(90, target, location, updateMap=True)
+		self.assertEqual(control.getMemo().getMisses(), 2)
+		self.assertGreater(grid.getMapVersion(), versions[-1])
+
+	def test_computeHeadingMemo(self):
+		grid = HistogramGrid({-30: 40.0, 0: 35.0, 30: 45.0}, 375, 0, 0, np.zeros((60, 60)), windowSize=41)
+		control = HeadingControl(1, PolarHistogram(grid), memoSize=4)
+		target, location = np.array([50, 30]), np.array([30, 30])
+		grid.computeMap(90, location)
+		decision = control.computeHeading(90, target, location)
+		grid.setSensorsMeasurements({-30: 41.0, 0: 36.0, 30: 46.0})
+		self.assertEqual(control.computeHeading(90, target, location), decision)
+		self.assertEqual((control.getMemo().getHits(), control.getMemo().getMisses()), (1, 1))
+
+		grid.computeMap(90, location + 1)
+		control.computeHeading(90, target, location)
+		grid.notifyMapChange()
+		control.computeHeading(90, target, location)
+		self.assertEqual((control.getMemo().getHits(), control.getMemo().getMisses()), (1, 3))
+
+		# Readings fused at the same location change the map as well
+		version = grid.getMapVersion()
+		grid.computeMap(90, location + 1)
+		self.assertGreater(grid.getMapVersion(), version)
+		control.computeHeading(90, target, location)
+		self.assertEqual((control.getMemo().getHits(), control.getMemo().getMisses()), (1, 4))
+		grid.setSensorsMeasurements({})
+		version = grid.getMapVersion()
+		grid.computeMap(90, location + 1)
+		self.assertEqual(grid.getMapVersion(), version)
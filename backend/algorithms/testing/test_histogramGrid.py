@@ -1,5 +1,5 @@
 from unittest import TestCase
-from backend.algorithms.VFH import HistogramGrid
+from backend.algorithms.VFH import HistogramGrid, CertaintyGrid, PolarHistogram, HeadingControl
 import numpy as np
 
 sensor_angle = 15
@@ -32,4 +32,79 @@ class TestHistogramGrid(TestCase):
 	def test_getSensorsMeasurements(self):
 		self.assertTrue(histog.getSensorsMeasurements() is sensor)
 
+	def test_computeBatchedMatchesSequential(self):
+		readings = {-45: 90.0, 0: 120.0, 45: 60.0}
+		batched = HistogramGrid(readings, max_sensor_dst, min_sensor_dst, threshold, np.zeros((60, 60)),
+		                        windowSize=41, batched=True)
+		sequential = HistogramGrid({}, max_sensor_dst, min_sensor_dst, threshold, np.zeros((60, 60)), windowSize=41)
+		for angle, distance in readings.items():
+			sequential.setSensorsMeasurements({angle: distance})
+			sequential.computeEmptiness(30)
+		for angle, distance in readings.items():
+			sequential.setSensorsMeasurements({angle: distance})
+			sequential.computeOccupancy(30)
 
+		self.assertTrue(np.allclose(batched.computeBatchedEmptiness(30), sequential.getEmptWindow()))
+		self.assertTrue(np.allclose(batched.computeBatchedOccupancy(30), sequential.getOcpWindow()))
+
+
+	def test_stampReadings(self):
+		readings = {-45: 90.0, 0: 120.0, 45: 60.0}
+		batched = HistogramGrid(readings, max_sensor_dst, min_sensor_dst, threshold, np.zeros((60, 60)),
+		                        windowSize=41, batched=True)
+		stamped = HistogramGrid(readings, max_sensor_dst, min_sensor_dst, threshold, np.zeros((60, 60)),
+		                        windowSize=41, kernelCacheSize=8)
+		stamped.stampReadings(32)
+		stamped.stampReadings(32)
+		batched.computeBatchedEmptiness(32)
+		batched.computeBatchedOccupancy(32)
+		batched.computeBatchedEmptiness(32)
+		batched.computeBatchedOccupancy(32)
+
+		self.assertTrue(np.allclose(stamped.getEmptWindow(), batched.getEmptWindow()))
+		self.assertTrue(np.allclose(stamped.getOcpWindow(), batched.getOcpWindow()))
+		self.assertEqual(stamped.getKernelCache().getMisses(), 3)
+		self.assertEqual(stamped.getKernelCache().getHitRate(), 0.5)
+
+	def test_scrollWindow(self):
+		full_map = np.random.uniform(-1, 1, (50, 50))
+		stored_map = full_map.copy()
+		scrolling = HistogramGrid({}, max_sensor_dst, min_sensor_dst, threshold, full_map, windowSize=11,
+		                          scrolling=True)
+		scrolling.scrollWindow(np.array([20, 20]))
+		scrolling.scrollWindow(np.array([23, 18]))
+		offset = scrolling.getScrollOffset()
+
+		self.assertTrue(np.all(offset == [3, 9]))
+		self.assertTrue(np.allclose(
+			np.roll(scrolling.getOcpWindow(), -offset, axis=(0, 1)),
+			np.maximum(stored_map[18:29, 13:24], 0)
+		))
+		self.assertTrue(np.allclose(
+			np.roll(scrolling.getDistances(), -offset, axis=(0, 1)),
+			scrolling.computeDistances()
+		))
+		scrolling.flushWindow()
+		self.assertTrue(np.allclose(full_map, stored_map))
+
+
+class TestCertaintyGrid(TestCase):
+	def test_updateCertainty(self):
+		certainty_map = np.zeros((30, 30), dtype=np.uint8)
+		certainty = CertaintyGrid({0: 50.0}, max_sensor_dst, min_sensor_dst, threshold, certainty_map, windowSize=21)
+		for _ in range(100):
+			certainty.computeMap(90, np.array([15, 15]))
+		self.assertEqual(certainty.getCertaintyWindow()[20, 10], 255)
+		self.assertEqual(certainty_map[25, 15], 255)
+
+		certainty.setSensorsMeasurements({0: 100.0})
+		certainty.updateCertainty(90)
+		self.assertEqual(certainty.getCertaintyWindow()[20, 10], 254)
+		self.assertEqual(certainty.getCertaintyWindow().sum(), 254)
+
+	def test_computeHeading(self):
+		certainty = CertaintyGrid({0: 50.0}, max_sensor_dst, min_sensor_dst, threshold, np.zeros((30, 30), np.uint8),
+		                          windowSize=21)
+		certainty.computeMap(90, np.array([15, 15]))
+		heading, speed = HeadingControl(1, PolarHistogram(certainty)).computeHeading(90, np.array([25, 15]), np.array([15, 15]))
+		self.assertNotEqual(heading, 0)
@@ -0,0 +1,36 @@
+from unittest import TestCase
+from backend.algorithms import LogOdds
+from backend.algorithms.VFH import HistogramGrid, PolarHistogram
+import numpy as np
+
+readings = {10: 80.0}
+
+
+class TestLogOdds(TestCase):
+	def test_readLogOdds(self):
+		certainty = np.linspace(-0.99, 0.99, 21)
+		log_odds = LogOdds.toLogOdds(certainty, np.int16)
+		self.assertTrue(np.allclose(
+			LogOdds.readLogOdds(log_odds, LogOdds.getReadoutTable(np.int16)), certainty, atol=1e-3
+		))
+
+	def test_updateLogOdds(self):
+		log_odds = np.array([100, -100, 0], dtype=np.int8)
+		LogOdds.updateLogOdds(log_odds, np.array([0, 1, 2]), np.array([100, -100, 5]))
+		self.assertTrue(np.all(log_odds == [127, -128, 5]))
+
+	def test_computeMap(self):
+		float_grid = HistogramGrid(readings, 375, 0, 0, np.zeros((60, 60)), windowSize=41, kernelCacheSize=4)
+		log_odds_map = np.zeros((60, 60), dtype=np.int16)
+		log_odds_grid = HistogramGrid(readings, 375, 0, 0, log_odds_map, windowSize=41, logOdds=np.int16)
+		float_grid.computeMap(12, np.array([30, 30]))
+		log_odds_grid.computeMap(12, np.array([30, 30]))
+
+		self.assertTrue(np.allclose(log_odds_grid.getEmptWindow(), float_grid.getEmptWindow(), atol=1e-3))
+		self.assertTrue(np.allclose(log_odds_grid.getOcpWindow(), float_grid.getOcpWindow(), atol=1e-3))
+		self.assertTrue(np.all(log_odds_map[10:51, 10:51] == log_odds_grid.getLogOddsWindow()))
+		self.assertTrue(np.allclose(
+			PolarHistogram(log_odds_grid).computeObstacleDensity(12),
+			PolarHistogram(float_grid).computeObstacleDensity(12),
+			atol=1e-2
+		))
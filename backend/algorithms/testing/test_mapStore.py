@@ -0,0 +1,83 @@
+from unittest import TestCase
+from backend.algorithms.MapStore import TiledMap
+from backend.algorithms.VFH import HistogramGrid
+import numpy as np
+
+map_shape = (100, 70)
+tile_size = 16
+
+
+class TestTiledMap(TestCase):
+	def test_lazyTiles(self):
+		tiled_map = TiledMap(map_shape, tileSize=tile_size, cachedTiles=2)
+		self.assertTrue(np.all(tiled_map[10:40, 5:9] == 0))
+		self.assertEqual(tiled_map.getCreatedTiles(), 0)
+		tiled_map[20, 20] = 1
+		self.assertEqual(tiled_map.getCreatedTiles(), 1)
+
+	def test_regionsAndCells(self):
+		dense_map = np.zeros(map_shape, dtype=np.float32)
+		tiled_map = TiledMap(map_shape, tileSize=tile_size, cachedTiles=2)
+		values = np.random.uniform(-1, 1, (45, 33)).astype(np.float32)
+		dense_map[30:75, 2:35] = values
+		tiled_map[30:75, 2:35] = values
+		rows, cols = np.random.randint(0, 70, (2, 50))
+		dense_map[rows, cols] = 2
+		tiled_map[rows, cols] = 2
+
+		self.assertTrue(np.all(tiled_map[:, :] == dense_map))
+		self.assertTrue(np.all(tiled_map[rows, cols] == dense_map[rows, cols]))
+		self.assertTrue(np.all(np.array(tiled_map.findValue(0)) == np.array(np.where(dense_map == 0))))
+
+	def test_computeMap(self):
+		readings = {-45: 90.0, 0: 120.0, 45: 60.0}
+		dense_map = np.zeros(map_shape)
+		tiled_map = TiledMap(map_shape, tileSize=tile_size, dtype=np.float64, cachedTiles=4)
+		HistogramGrid(readings, 375, 0, 0, dense_map, windowSize=41).computeMap(30, np.array([90, 20]))
+		HistogramGrid(readings, 375, 0, 0, tiled_map, windowSize=41).computeMap(30, np.array([90, 20]))
+		tiled_map.flush()
+
+		self.assertTrue(np.allclose(tiled_map[:, :], dense_map))
+
+	def test_decay(self):
+		now = [0.0]
+		for dtype in (np.float32, np.int16):
+			now[0] = 0.0
+			tiled_map = TiledMap(map_shape, tileSize=tile_size, cachedTiles=2, dtype=dtype, decayFactor=0.5,
+			                     decayPeriod=2.0, clock=lambda: now[0])
+			tiled_map[10:20, 10:20] = 64
+			tiled_map[50, 50] = -64
+			for _ in range(5):
+				now[0] += 0.5
+				self.assertTrue(np.all(tiled_map[10:20, 10:20] == 64 * 0.5 ** int(now[0] // 2)))
+			now[0] = 7.0
+			self.assertTrue(np.all(tiled_map[10:20, 10:20] == 8))
+			self.assertEqual(tiled_map[50, 50], -64)
+			# Tiles written back to the file and loaded again keep decaying from where they were left
+			tiled_map[90:100, 60:70] = 1
+			now[0] = 9.0
+			self.assertTrue(np.all(tiled_map[10:20, 10:20] == 4))
+
+	def test_decayWindow(self):
+		now = [0.0]
+		for scrolling in (False, True):
+			now[0] = 0.0
+			tiled_map = TiledMap(map_shape, tileSize=tile_size, dtype=np.float64, decayFactor=0.5, decayPeriod=2.0,
+			                     clock=lambda: now[0])
+			grid = HistogramGrid({0: 60.0}, 375, 0, 0, tiled_map, windowSize=41, scrolling=scrolling)
+			location = np.array([50, 35])
+			grid.computeMap(0, location)
+			grid.setSensorsMeasurements({})
+			grid.computeMap(0, location)
+			if scrolling:
+				grid.flushWindow()
+			occupied = tiled_map[:, :] > 0
+			fused = tiled_map[:, :][occupied]
+			self.assertTrue(np.any(occupied))
+
+			# Hovering over the same cells, the window decays as the map would
+			now[0] = 4.5
+			grid.computeMap(0, location)
+			if scrolling:
+				grid.flushWindow()
+			self.assertTrue(np.allclose(tiled_map[:, :][occupied], fused * 0.25))
@@ -1,5 +1,6 @@
 from unittest import TestCase
 from backend.algorithms.ParticleFilter import ParticleFilter
+from backend.algorithms import Geometry
 import numpy as np
 
 
@@ -19,3 +20,102 @@ class TestParticleFilter(TestCase):
 	def test_generateParticles(self):
 		self.assertTrue(np.all(pFilter.generateParticles().shape == (3, (diag_size**2 - diag_size) * heading_coverage)))
 
+
+	def test_computeExpectedRanges(self):
+		offsets = np.array([-np.pi / 2.0, 0, np.pi / 2.0])
+		ranges = pFilter.computeExpectedRanges(offsets, 20)
+		self.assertEqual(ranges.shape, (pFilter.getParticleMap().shape[1], 3))
+		particle = pFilter.getParticleMap()[:, 7]
+		self.assertTrue(np.allclose(
+			ranges[7], Geometry.marchRays(world_map, np.tile(particle[:2], (3, 1)), particle[2] + offsets, 20)
+		))
+		self.assertTrue(np.all(ranges > 0) and np.all(ranges <= 20))
+
+	def test_computeFieldProbabilities(self):
+		area = np.zeros((12, 16))
+		area[0, :] = area[-1, :] = area[:, 0] = area[:, -1] = 1
+		area[3:6, 9:11] = 1
+		fieldFilter = ParticleFilter(area, 0.02, 0.02, 0.5, 4, sensor_model='likelihood_field')
+		self.assertEqual(fieldFilter.getLikelihoodField().shape, area.shape)
+		self.assertAlmostEqual(fieldFilter.getLikelihoodField()[0, 0], 0)
+
+		offsets = np.linspace(-np.pi, np.pi, 8, endpoint=False)
+		particles = fieldFilter.getParticleMap()
+		pose = particles[:, 329]
+		readings = Geometry.marchRays(area, np.tile(pose[:2], (8, 1)), pose[2] + offsets, 20)
+		probs = fieldFilter.computeWeights(readings, offsets, 20)
+		self.assertEqual(probs.shape, (particles.shape[1],))
+		self.assertAlmostEqual(np.sum(probs), 1)
+		# Readings end on the cell boundaries, so the best particle may be a neighbour of the pose
+		best = particles[:, np.argmax(probs)]
+		self.assertLessEqual(np.linalg.norm(best[:2] - pose[:2]), 1.5)
+		self.assertEqual(best[2], pose[2])
+
+	def test_sensorModel(self):
+		self.assertEqual(pFilter.getSensorModel(), 'beam')
+		self.assertIsNone(pFilter.getLikelihoodField())
+		with self.assertRaises(ValueError):
+			ParticleFilter(world_map, 0.02, 0.02, 0.02, heading_coverage, sensor_model='unknown')
+
+	def test_maxParticles(self):
+		area = np.zeros((100, 100))
+		cappedFilter = ParticleFilter(area, 0.02, 0.02, 0.02, 12, max_particles=5000)
+		particles = cappedFilter.getParticleMap()
+		self.assertEqual(cappedFilter.getParticleNumber(), (10000, 12))
+		self.assertEqual(particles.shape, (3, 5000))
+		# One particle per stratum, so every band of rows gets its share
+		self.assertTrue(np.all(np.bincount(particles[0].astype(int) // 10, minlength=10) == 500))
+		self.assertTrue(np.all(np.isin(particles[2], ParticleFilter.computeHeadings(12))))
+		cappedFilter.move(1, 0)
+		self.assertEqual(cappedFilter.getParticleCount(), 5000)
+
+	def test_computeKLDBound(self):
+		bounds = ParticleFilter.computeKLDBound(np.array([1, 2, 10, 100]), 0.05, 0.01)
+		self.assertEqual(bounds[0], 0)
+		self.assertTrue(np.all(np.diff(bounds) > 0))
+		self.assertAlmostEqual(bounds[3], 1344, delta=5)
+
+	def test_resampleKLD(self):
+		area = np.zeros((60, 60))
+		kldFilter = ParticleFilter(area, 0.02, 0.02, 0.02, 4, max_particles=8000, min_particles=50)
+		count = kldFilter.getParticleCount()
+		spread = kldFilter.resampleKLD(np.full(count, 1.0 / count))
+		self.assertEqual(kldFilter.getParticleCount(), spread.shape[0])
+		self.assertGreater(spread.shape[0], 3000)
+
+		count = kldFilter.getParticleCount()
+		probabilities = np.zeros(count)
+		probabilities[:3] = 1.0 / 3
+		concentrated = kldFilter.resampleKLD(probabilities)
+		self.assertGreaterEqual(concentrated.shape[0], 50)
+		self.assertLessEqual(concentrated.shape[0], ParticleFilter.computeKLDBound(3, 0.05, 0.01))
+		self.assertTrue(np.all(concentrated < 3))
+
+	def test_scoreMissedRays(self):
+		obstacles = np.array([[[6.0, 9.0], [3.0, 6.0]], [[8.0, 3.0], [6.0, 7.0]]])
+		particles = pFilter.getParticleMap().T
+		angles = particles[:, 2:] + np.linspace(-np.pi / 2.0, np.pi / 2.0, 5)
+		rays = Geometry.getRays(particles, angles, np.array([5.0, 5.0]))
+		measurements = Geometry.rayNearestHits(particles[:, :2], rays, obstacles)
+		# Most particles miss every obstacle on some ray
+		self.assertTrue(np.all(np.isfinite(measurements)))
+		probabilities = pFilter.computeProbabilities(measurements, np.array([2.5, 5.0, 5.0, 5.0, 5.0]))
+		self.assertTrue(np.all(np.isfinite(probabilities)))
+		self.assertAlmostEqual(np.sum(probabilities), 1)
+		self.assertEqual(pFilter.resample(probabilities, 10).shape, (10,))
+
+	def test_resampleKLDRecovers(self):
+		kldFilter = ParticleFilter(np.zeros((30, 30)), 0.02, 0.02, 0.02, 4, min_particles=50)
+		count = kldFilter.getParticleCount()
+		probabilities = np.zeros(count)
+		probabilities[0] = 1
+		kldFilter.resampleKLD(probabilities)
+		concentrated = kldFilter.getParticleCount()
+		self.assertEqual(concentrated, 50)
+
+		# Once the drone is lost the belief spreads again, and the population grows back
+		kldFilter.move(0, 0)
+		kldFilter.getParticleMap()[:2] = np.random.uniform(0, 29, (2, concentrated))
+		kldFilter.getParticleMap()[2] = np.random.uniform(-np.pi, np.pi, concentrated)
+		kldFilter.resampleKLD(np.full(concentrated, 1.0 / concentrated))
+		self.assertGreater(kldFilter.getParticleCount(), concentrated)
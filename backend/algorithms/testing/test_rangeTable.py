@@ -0,0 +1,101 @@
+from unittest import TestCase
+import os
+import tempfile
+from backend.algorithms.ParticleFilter import ParticleFilter
+from backend.algorithms.RangeTable import RangeTable, RANGE_STEPS
+from backend.algorithms import Geometry
+import numpy as np
+
+
+world_map = np.zeros((12, 16))
+world_map[0, :] = world_map[-1, :] = world_map[:, 0] = world_map[:, -1] = 1
+world_map[4:8, 7] = 1
+heading_coverage = 4
+offsets = np.array([-np.pi / 2.0, 0, np.pi / 2.0])
+max_range = 20
+
+headings = ParticleFilter.computeHeadings(heading_coverage)
+table = RangeTable(world_map, headings, offsets, max_range, chunk_size=16)
+tolerance = max_range / RANGE_STEPS
+
+
+class TestRangeTable(TestCase):
+	def test_getTable(self):
+		free = np.sum(world_map == 0)
+		self.assertEqual(table.getTable().shape, (free, heading_coverage, 3))
+		self.assertEqual(table.getTable().dtype, np.uint16)
+
+	def test_particleLayout(self):
+		pFilter = ParticleFilter(world_map, 0.02, 0.02, 0.02, heading_coverage)
+		particles = pFilter.getParticleMap()
+		expected = Geometry.marchRays(
+			world_map, np.repeat(particles[:2].T, 3, axis=0), (particles[2][:, np.newaxis] + offsets).ravel(), max_range
+		).reshape(-1, 3)
+		self.assertTrue(np.allclose(table.getTable().reshape(-1, 3) * tolerance, expected, atol=tolerance))
+
+	def test_lookup(self):
+		positions = np.array([[2.2, 3.1], [9.0, 12.0], [5.0, 7.0], [-3.0, 2.0]])
+		orientations = np.array([headings[1] + 0.05, headings[3], headings[0], headings[2]])
+		ranges = table.lookup(positions, orientations)
+		nearest = np.array([[2, 3], [9, 12], [5, 7], [-3, 2]], dtype=float)
+		snapped = headings[[1, 3, 0, 2]]
+		expected = Geometry.marchRays(
+			world_map, np.repeat(nearest[:2], 3, axis=0), (snapped[:2, np.newaxis] + offsets).ravel(), max_range
+		).reshape(-1, 3)
+		self.assertTrue(np.allclose(ranges[:2], expected, atol=tolerance))
+		# Poses off the free cells are cast instead
+		cast = Geometry.marchRays(
+			world_map, np.repeat(positions[2:], 3, axis=0), (orientations[2:, np.newaxis] + offsets).ravel(), max_range
+		).reshape(-1, 3)
+		self.assertTrue(np.allclose(ranges[2:], cast))
+
+	def test_persistence(self):
+		with tempfile.TemporaryDirectory() as folder:
+			path = os.path.join(folder, 'ranges.npy')
+			built = RangeTable(world_map, headings, offsets, max_range, path=path, processes=2, chunk_size=16)
+			self.assertTrue(np.array_equal(built.getTable(), table.getTable()))
+			loaded = RangeTable(world_map, headings, offsets, max_range, path=path)
+			self.assertIsInstance(loaded.getTable(), np.memmap)
+			self.assertTrue(np.array_equal(loaded.getTable(), table.getTable()))
+			del built, loaded
+
+	def test_persistenceMismatch(self):
+		with tempfile.TemporaryDirectory() as folder:
+			path = os.path.join(folder, 'ranges.npy')
+			RangeTable(world_map, headings, offsets, max_range, path=path)
+			# Same shape, other sensors
+			other_offsets = np.array([-2.0, 0, 2.0])
+			other = RangeTable(world_map, headings, other_offsets, 5, path=path)
+			expected = RangeTable(world_map, headings, other_offsets, 5)
+			self.assertTrue(np.array_equal(other.getTable(), expected.getTable()))
+			# Same shape, other map
+			moved = world_map.copy()
+			moved[4:8, 7], moved[4:8, 8] = 0, 1
+			other = RangeTable(moved, headings, other_offsets, 5, path=path)
+			expected = RangeTable(moved, headings, other_offsets, 5)
+			self.assertTrue(np.array_equal(other.getTable(), expected.getTable()))
+			self.assertIsInstance(RangeTable(moved, headings, other_offsets, 5, path=path).getTable(), np.memmap)
+			del other
+
+	def test_particleFilter(self):
+		pFilter = ParticleFilter(world_map, 0.02, 0.02, 0.02, heading_coverage, range_table=table)
+		cast = ParticleFilter(world_map, 0.02, 0.02, 0.02, heading_coverage)
+		self.assertTrue(np.allclose(
+			pFilter.computeExpectedRanges(offsets, max_range), cast.computeExpectedRanges(offsets, max_range),
+			atol=tolerance
+		))
+
+	def test_particleFilterMismatch(self):
+		cast = ParticleFilter(world_map, 0.02, 0.02, 0.02, heading_coverage).computeExpectedRanges(offsets, max_range)
+
+		# Tables built from another map, other headings or another threshold are not looked up
+		moved = world_map.copy()
+		moved[4:8, 7], moved[4:8, 9] = 0, 1
+		mismatches = [
+			RangeTable(moved, headings, offsets, max_range),
+			RangeTable(world_map, ParticleFilter.computeHeadings(heading_coverage * 2), offsets, max_range),
+			RangeTable(world_map, headings, offsets, max_range, threshold=2)
+		]
+		for mismatch in mismatches:
+			pFilter = ParticleFilter(world_map, 0.02, 0.02, 0.02, heading_coverage, range_table=mismatch)
+			self.assertTrue(np.array_equal(pFilter.computeExpectedRanges(offsets, max_range), cast))
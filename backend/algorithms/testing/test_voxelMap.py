@@ -0,0 +1,74 @@
+from unittest import TestCase
+from backend.algorithms.VoxelMap import VoxelMap
+from backend.algorithms.VFH import HistogramGrid, PolarHistogram
+import numpy as np
+
+map_shape = (100, 70)
+
+
+class TestVoxelMap(TestCase):
+	def test_layers(self):
+		voxel_map = VoxelMap(map_shape, blockSize=8, cellSize=5, band=(20, 20))
+		voxel_map.setAltitude(100)
+		voxel_map[10:30, 5:9] = 0.5
+		voxel_map.setAltitude(200)
+		voxel_map[20:40, 5:9] = -0.5
+		self.assertEqual(voxel_map.getBlocks(), 3 * 2 + 3 * 2)
+
+		self.assertTrue(np.all(voxel_map[20:40, 5:9] == -0.5))
+		voxel_map.setAltitude(115)
+		self.assertTrue(np.all(voxel_map[10:30, 5:9] == 0.5))
+		self.assertTrue(np.all(voxel_map[30:40, 5:9] == 0))
+		# Unknown voxels don't hide the emptiness of the ones above, nor does it hide the obstacles
+		voxel_map.setBand((20, 200))
+		self.assertTrue(np.all(voxel_map[30:40, 5:9] == -0.5))
+		self.assertTrue(np.all(voxel_map[np.array([10, 25, 45]), np.array([5, 6, 6])] == [0.5, 0.5, 0]))
+
+		slice_map = VoxelMap(map_shape, projection='slice')
+		slice_map[np.array([3, 50]), np.array([60, 2])] = 1
+		self.assertTrue(np.all(slice_map[:, :][[3, 50], [60, 2]] == 1))
+		slice_map.setAltitude(50)
+		self.assertTrue(np.all(slice_map[:, :] == 0))
+
+	def test_histogramGrid(self):
+		readings = {-30: 40.0, 0: 35.0, 30: 45.0}
+		voxel_map = VoxelMap(map_shape, band=(10, 10))
+		voxel_grid = HistogramGrid(readings, 375, 0, 0, voxel_map, windowSize=41, scrolling=True)
+		grid = HistogramGrid(readings, 375, 0, 0, np.zeros(map_shape), windowSize=41, scrolling=True)
+		voxel_map.setAltitude(120)
+		for location in (np.array([40, 30]), np.array([45, 32])):
+			for histogram_grid in (voxel_grid, grid):
+				histogram_grid.computeMap(0, location)
+		voxel_grid.flushWindow()
+		grid.flushWindow()
+		self.assertTrue(np.allclose(voxel_map[:, :], grid.getFullMap()))
+		self.assertTrue(np.allclose(PolarHistogram(voxel_grid).computeObstacleDensity(0),
+		                            PolarHistogram(grid).computeObstacleDensity(0)))
+
+		# Far above, the obstacles are out of the band
+		voxel_map.setAltitude(400)
+		self.assertTrue(np.all(voxel_map[:, :] == 0))
+
+	def test_altitudeChanges(self):
+		for scrolling in (True, False):
+			voxel_map = VoxelMap(map_shape, band=(20, 20))
+			grid = HistogramGrid({}, 375, 0, 0, voxel_map, windowSize=41, scrolling=scrolling)
+			location = np.array([40, 30])
+			grid.setAltitude(100)
+			voxel_map[25:28, 40:43] = 0.9
+
+			# Climbing through the band, the obstacle reaches the Polar Histogram but stays on its own layer
+			for altitude in range(115, 220, 15):
+				grid.setAltitude(altitude)
+				grid.computeMap(0, location)
+				grid.computeMap(0, location + [1, 0])
+				if altitude == 115:
+					self.assertGreater(PolarHistogram(grid).computeObstacleDensity(0).max(), 0)
+			grid.flushWindow()
+			for layer in range(10, 45):
+				expected = 0.9 if layer == 20 else 0
+				self.assertTrue(np.all(voxel_map.readRegion(np.array([25, 40]), np.array([28, 43]),
+				                                            range(layer, layer + 1)) == expected))
+
+			self.assertEqual(grid.getFullMap().getLayer(), 41)
+			self.assertTrue(np.all(PolarHistogram(grid).computeObstacleDensity(0) == 0))
@@ -1,5 +1,8 @@
 from backend.autoControllers.yawController import YawController
 from backend.algorithms.VFH import HistogramGrid, PolarHistogram, HeadingControl
+from backend.algorithms.DWA import DynamicWindowControl
+from backend.algorithms.GlobalPlanner import DStarLite
+from backend.algorithms.Frontiers import FrontierMap
 from backend.algorithms.ParticleFilter import ParticleFilter
 from backend.algorithms import Geometry
 import numpy as np
@@ -23,7 +26,14 @@ class ObstacleAvoidanceWrapper:
 			VFHPF_epsilon: float = 0.05,
 			VFH_omega: int = 30,
 			VFH_safetyThreshold: int = 2,
-			VFH_MaxSpeed: int = 8
+			VFH_MaxSpeed: int = 8,
+			VFH_memoSize: int = 0,
+			engine: str = 'vfh',
+			globalPlanner: bool = False,
+			exploration: bool = False,
+			PF_sensorModel: str = 'beam',
+			PF_maxParticles: int = None,
+			GP_maxExpansions: int = None
 	):
 		"""
 		Creates an wrapper for the obstacle avoidance controller.
@@ -37,7 +47,8 @@ class ObstacleAvoidanceWrapper:
 		:type VFH_Rmax: int
 		:param VFH_Rmin: Minimum distance for the sensors.
 		:type VFH_Rmin: int
-		:param VFHPF_fullMap: The map representing the area.
+		:param VFHPF_fullMap: The map representing the area. A *VoxelMap* keeps obstacles apart by altitude, taken from
+		 the 'altitude' of the measurements.
 		:type VFHPF_fullMap: np.ndarray
 		:param PF_turn_noise: Error when turning.
 		:type PF_turn_noise: float
@@ -57,6 +68,25 @@ class ObstacleAvoidanceWrapper:
 		:type VFH_safetyThreshold: int
 		:param VFH_MaxSpeed: Maximum speed for the agent. Defaults to 8.
 		:type VFH_MaxSpeed: int
+		:param VFH_memoSize: Amount of heading decisions to memoize, so hovering with unchanged readings doesn't update
+		 the map nor compute the VFH again. Defaults to 0 (disabled).
+		:type VFH_memoSize: int
+		:param engine: Local planner computing the heading, 'vfh' or 'dwa' (Dynamic Window Approach). Defaults to 'vfh'.
+		:type engine: str
+		:param globalPlanner: Plans a path to the goal over the full map, with D* Lite, and steers towards waypoints along
+		 it instead of straight to the goal. Defaults to False.
+		:type globalPlanner: bool
+		:param exploration: Keeps track of the frontiers of the map, so *exploreFrontier* can set the goal to the best
+		 one. Defaults to False.
+		:type exploration: bool
+		:param PF_sensorModel: Sensor model weighing the particles, 'beam' or 'likelihood_field'. Defaults to 'beam'.
+		:type PF_sensorModel: str
+		:param PF_maxParticles: Most particles the Particle Filter holds at once. When given, the population is resampled
+		 with KLD-sampling, between the Particle Filter's minimum and it. Defaults to None, no limit and fixed resampling.
+		:type PF_maxParticles: int
+		:param GP_maxExpansions: Most cells the global planner expands per step. When it runs out, the agent heads to the
+		 best partial plan and the search goes on the next step. Defaults to None, every plan is completed.
+		:type GP_maxExpansions: int
 		"""
 
 		self._yawController = YawController()
@@ -78,18 +108,31 @@ class ObstacleAvoidanceWrapper:
 		                             omega=VFH_omega
 		                             )
 		self._polarHistog = PolarHistogram(self._histog)
-		self._headingController = HeadingControl(VFH_safetyThreshold, self._polarHistog)
+		if engine == 'vfh':
+			self._headingController = HeadingControl(VFH_safetyThreshold, self._polarHistog, memoSize=VFH_memoSize)
+		elif engine == 'dwa':
+			self._headingController = DynamicWindowControl(self._histog)
+		else:
+			raise ValueError('Unknown engine {}, expected vfh or dwa'.format(engine))
 		self._agent_position = np.array([0, 0])
 		self._goal = np.array([10, 10])
+		self._planner = DStarLite(self._histog, self._goal, self._agent_position, maxExpansions=GP_maxExpansions) \
+			if globalPlanner else None
+		self._plannerExpansions = GP_maxExpansions
+		self._frontiers = FrontierMap(self._histog) if exploration else None
 		# TODO: Maybe the PF should run on a separate thread... so it will make all its math while ctrlWrapper is busy
 		# TODO: consider blocking access to sensor readings and agent_position to achieve it
-		self._pf = ParticleFilter(VFHPF_fullMap, PF_turn_noise, PF_forward_noise, VFHPF_epsilon, PF_heading_coverage)
+		self._pf = ParticleFilter(VFHPF_fullMap, PF_turn_noise, PF_forward_noise, VFHPF_epsilon, PF_heading_coverage,
+		                          sensor_model=PF_sensorModel, max_particles=PF_maxParticles)
 		# TODO: Make PF to compute the obstacles given the map
 		self._obstacles = self._pf.computeObstacles()
 		self._particles = self._pf.getParticleMap().T
+		self._maxParticles = PF_maxParticles
 		self._world_size = VFHPF_fullMap.shape
 		self._speed = 0
 		self._max_speed = VFH_MaxSpeed
+		self._cellSize = VFH_cellSize
+		self._Rmax = VFH_Rmax
 
 	def getPriority(self):
 		return self._yawC_priority
@@ -126,37 +169,73 @@ class ObstacleAvoidanceWrapper:
 		:type goal: np.ndarray
 		"""
 		self._goal = goal
+		if self._planner is not None:
+			self._planner.setGoal(goal, self._agent_position[:2], self._plannerExpansions)
+
+	def exploreFrontier(self) -> np.ndarray:
+		"""
+		Sets the goal to the best frontier of the map, the known free cells next to unknown ones.
+
+		:return: The new goal, or None if there are no frontiers left, keeping the current goal.
+		"""
+		goal = self._frontiers.getBestFrontier(self._agent_position[:2])
+		if goal is not None:
+			self.setGoal(goal)
+		return goal
 
 	def setMeasurement(self, measurements: List[Dict, Dict]):
 
 		# TODO: UNDER DEVELOPMENT AND TESTING!!!
 		distances = measurements[0]
 		heading = measurements[1]['heading']
+		if 'altitude' in measurements[1]:
+			self._histog.setAltitude(measurements[1]['altitude'])
 		self._yawController.setMeasurement(heading)
 
 		self._histog.setSensorsMeasurements(distances)
 
-		sensor_number = len(distances)
-		angles = np.array(distances.keys())
-
-		particles_rays = Geometry.getRays(self._particles, angles, np.array(self._world_size))
-
-		intersections = Geometry.segIntersections(self._pf.getPositions().T, particles_rays, self._obstacles)
-		particles_measurements = np.linalg.norm(
-			np.repeat(self._particles[:, :2], sensor_number * self._obstacles.shape[1], axis=0).reshape(
-				intersections.shape) - intersections, axis=2)
-
-		agent_measurements = np.array(distances.keys())
-		particles_probabilities = self._pf.computeProbabilities(particles_measurements, agent_measurements)
-
-		next_gen_sample = self._pf.resample(particles_probabilities, int(self._particles.shape[0] * 0.25))
-		self._agent_position = self._particles[np.argmax(particles_probabilities[next_gen_sample])]
-
-
-		desired_heading, desired_speed = self._headingController.computeHeading(heading,
-		                                                                        self._goal,
-		                                                                        self._agent_position,
-		                                                                        Vmax=self._max_speed
-		                                                                        )
+		agent_measurements = np.array(list(distances.values()))
+
+		if self._pf.getSensorModel() == 'likelihood_field':
+			particles_probabilities = self._pf.computeFieldProbabilities(agent_measurements / self._cellSize,
+			                                                             np.deg2rad(list(distances.keys())),
+			                                                             self._Rmax / self._cellSize
+			                                                             )
+		else:
+			angles = np.array(distances.keys())
+			particles_rays = Geometry.getRays(self._particles, angles, np.array(self._world_size))
+
+			particles_measurements = Geometry.rayNearestHits(self._pf.getPositions().T, particles_rays, self._obstacles)
+
+			particles_probabilities = self._pf.computeProbabilities(particles_measurements, agent_measurements)
+
+		if self._maxParticles is not None:
+			next_gen_sample = self._pf.resampleKLD(particles_probabilities)
+			self._agent_position = self._particles[next_gen_sample[np.argmax(particles_probabilities[next_gen_sample])]]
+			self._particles = self._pf.getParticleMap().T
+		else:
+			next_gen_sample = self._pf.resample(particles_probabilities, int(self._particles.shape[0] * 0.25))
+			self._agent_position = self._particles[np.argmax(particles_probabilities[next_gen_sample])]
+
+
+		target = self._goal if self._planner is None else self._planner.getWaypoint(
+			self._agent_position[:2], maxExpansions=self._plannerExpansions
+		)
+		location = np.round(self._agent_position[:2]).astype(int)
+		if isinstance(self._headingController, HeadingControl):
+			# Readings are fused along with the decision, so hovering on memoized ones doesn't update the map
+			desired_heading, desired_speed = self._headingController.computeHeading(heading,
+			                                                                        target,
+			                                                                        location,
+			                                                                        Vmax=self._max_speed,
+			                                                                        updateMap=True
+			                                                                        )
+		else:
+			self._histog.computeMap(heading, location)
+			desired_heading, desired_speed = self._headingController.computeHeading(heading,
+			                                                                        target,
+			                                                                        location,
+			                                                                        Vmax=self._max_speed
+			                                                                        )
 		self.setSpeed(desired_speed)
 		self._yawController.setTarget(desired_heading)